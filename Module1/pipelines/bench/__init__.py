@@ -0,0 +1,7 @@
+"""Loader benchmark suite: synthetic TLC trip files and timed load strategies.
+
+    uv run python -m bench generate --taxi green --rows 1000000
+    uv run python -m bench run --rows 1000000 --output bench_results.jsonl
+    uv run python -m bench engines --path yellow_tripdata_2021-01.csv.gz
+    uv run python -m bench methods --rows 200000
+"""
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import click
+
+from bench.suite import load_methods, measure, measure_engine, strategies
+from bench.synth import FORMATS, TAXIS, generate
+from ingest_data_ import ENGINES
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def db_options(f):
+    """The PostgreSQL connection options shared by the commands that load."""
+    for option in reversed([
+        click.option('--user', default='root', help='PostgreSQL user'),
+        click.option('--password', default='root', help='PostgreSQL password'),
+        click.option('--host', default='localhost', help='PostgreSQL host'),
+        click.option('--port', default=5432, type=int, help='PostgreSQL port'),
+        click.option('--db', default='ny_taxi', help='PostgreSQL database name'),
+    ]):
+        f = option(f)
+    return f
+
+
+def conn_string(user, password, host, port, db) -> str:
+    return f'postgresql://{user}:{password}@{host}:{port}/{db}'
+
+
+@click.group()
+def cli():
+    """Benchmark the Module1 loaders on synthetic TLC data."""
+
+
+@cli.command('generate')
+@click.option('--taxi', 'taxis', multiple=True, default=TAXIS, type=click.Choice(TAXIS), help='Taxi type (repeatable)')
+@click.option('--format', 'formats', multiple=True, default=FORMATS, type=click.Choice(FORMATS), help='File format (repeatable)')
+@click.option('--rows', default=1_000_000, type=int, help='Rows per file')
+@click.option('--year', default=2024, type=int, help='Pickup year')
+@click.option('--month', default=1, type=int, help='Pickup month (1-12)')
+@click.option('--seed', default=0, type=int, help='Random seed')
+@click.option('--null-rate', default=0.02, type=float, help='Share of empty values in nullable columns')
+@click.option('--data-dir', default='bench_data', help='Output directory')
+def generate_cmd(taxis, formats, rows, year, month, seed, null_rate, data_dir):
+    """Write synthetic green/yellow trip files (Parquet and CSV.gz)."""
+    for taxi in taxis:
+        for fmt in formats:
+            path = generate(taxi, fmt, rows, year, month, data_dir, seed, null_rate)
+            print(f"{taxi:>6} {fmt:<7} {path} ({path.stat().st_size / 1024**2:,.1f} MiB)")
+
+
+@cli.command('run')
+@db_options
+@click.option('--taxi', 'taxis', multiple=True, default=TAXIS, type=click.Choice(TAXIS), help='Taxi type (repeatable)')
+@click.option('--format', 'formats', multiple=True, default=FORMATS, type=click.Choice(FORMATS), help='Input format (repeatable)')
+@click.option('--rows', default=1_000_000, type=int, help='Rows per input file')
+@click.option('--year', default=2024, type=int, help='Pickup year')
+@click.option('--month', default=1, type=int, help='Pickup month (1-12)')
+@click.option('--seed', default=0, type=int, help='Random seed')
+@click.option('--null-rate', default=0.02, type=float, help='Share of empty values in nullable columns')
+@click.option('--chunk-size', default=100_000, type=int, help='Chunk size (rows)')
+@click.option('--workers', default=4, type=int, help='Connections for the parallel COPY strategy')
+@click.option('--data-dir', default='bench_data', help='Where synthetic inputs are kept')
+@click.option('--output', default='bench_results.jsonl', help='JSON Lines file results are appended to')
+def run_cmd(user, password, host, port, db, taxis, formats, rows, year, month, seed, null_rate, chunk_size, workers,
+            data_dir, output):
+    """Run every load strategy on synthetic inputs and append results as JSON Lines."""
+    conn = conn_string(user, password, host, port, db)
+    run_info = {
+        "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "chunk_size": chunk_size,
+        "null_rate": null_rate,
+    }
+
+    print(f"{'taxi':>6} {'input':<7} {'strategy':<16} {'rows/s':>10} {'wall':>7} {'peak RSS':>9} {'table':>9} {'WAL':>9}")
+    with open(output, "a") as out:
+        for taxi in taxis:
+            for fmt in formats:
+                path = generate(taxi, fmt, rows, year, month, data_dir, seed, null_rate)
+                for name, reader, method, n in strategies(fmt, workers):
+                    result = measure(conn, taxi, path, year, month, reader, method, n, chunk_size)
+                    record = {
+                        **run_info,
+                        "taxi": taxi,
+                        "input": fmt,
+                        "strategy": name,
+                        "reader": reader,
+                        "load_method": method,
+                        "workers": n,
+                        **result,
+                    }
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    print(
+                        f"{taxi:>6} {fmt:<7} {name:<16} {result['rows_per_s']:>10,.0f} "
+                        f"{result['wall_s']:>6.1f}s {result['peak_rss_bytes'] / 1024**2:>6,.0f} MiB "
+                        f"{result['table_bytes'] / 1024**2:>5,.0f} MiB {result['wal_bytes'] / 1024**2:>5,.0f} MiB"
+                    )
+    print(f"\nResults appended to {output}")
+
+
+@cli.command('engines')
+@click.option('--taxi', default='yellow', type=click.Choice(TAXIS), help='Taxi type of the input')
+@click.option('--path', default=None, help='CSV.gz to parse (default: a synthetic file of --rows rows)')
+@click.option('--rows', default=1_000_000, type=int, help='Rows in the synthetic input')
+@click.option('--seed', default=0, type=int, help='Random seed')
+@click.option('--null-rate', default=0.02, type=float, help='Share of empty values in nullable columns')
+@click.option('--chunk-size', default=100_000, type=int, help='Chunk size (rows)')
+@click.option('--data-dir', default='bench_data', help='Where synthetic inputs are kept')
+def engines_cmd(taxi, path, rows, seed, null_rate, chunk_size, data_dir):
+    """Compare the pandas and arrow CSV engines: rows/s and peak RSS.
+
+    Each engine runs in a fresh process so peak RSS is not shared. The
+    database is left out; chunks are parsed and serialized for COPY only.
+    """
+    path = path or generate(taxi, "csv.gz", rows, 2024, 1, data_dir, seed, null_rate)
+    results = {}
+    for engine in ENGINES:
+        result = measure_engine(taxi, path, engine, chunk_size)
+        results[engine] = result["rows_per_s"]
+        print(
+            f"{engine:>7}: {result['rows']:,} rows in {result['wall_s']:6.2f}s  "
+            f"{result['rows_per_s']:>12,.0f} rows/s  peak RSS {result['peak_rss_bytes'] / 1024**2:,.0f} MiB  "
+            f"COPY bytes {result['copy_bytes'] / 1024**2:,.0f} MiB"
+        )
+
+    print(f"\narrow speedup over pandas: {results['arrow'] / results['pandas']:.1f}x")
+
+
+@cli.command('methods')
+@db_options
+@click.option('--table', default='bench_load', help='Scratch table (replaced on every run)')
+@click.option('--taxi', default='green', type=click.Choice(TAXIS), help='Taxi type of the input')
+@click.option('--path', default=None, help='Parquet file to load (default: a synthetic file of --rows rows)')
+@click.option('--rows', default=200_000, type=int, help='Rows to load per method')
+@click.option('--seed', default=0, type=int, help='Random seed')
+@click.option('--null-rate', default=0.02, type=float, help='Share of empty values in nullable columns')
+@click.option('--chunk-size', default=100_000, type=int, help='Chunk size (rows)')
+@click.option('--data-dir', default='bench_data', help='Where synthetic inputs are kept')
+def methods_cmd(user, password, host, port, db, table, taxi, path, rows, seed, null_rate, chunk_size, data_dir):
+    """Compare throughput of the to_sql INSERT path against COPY into a plain table."""
+    path = path or generate(taxi, "parquet", rows, 2024, 1, data_dir, seed, null_rate)
+    print(f"Benchmark input: {path}")
+
+    results = {}
+    for method, n, elapsed in load_methods(conn_string(user, password, host, port, db), path, rows, chunk_size, table):
+        results[method] = n / max(elapsed, 1e-9)
+        print(f"{method:>7}: {n:,} rows in {elapsed:8.2f}s  {results[method]:>12,.0f} rows/s")
+
+    print(f"\nCOPY speedup over to_sql: {results['copy'] / results['insert']:.1f}x")
+
+
+if __name__ == '__main__':
+    cli()
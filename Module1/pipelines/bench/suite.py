@@ -0,0 +1,239 @@
+"""Timed load strategies run against a local Postgres, one fresh process each.
+
+Also the two narrower comparisons: CSV engines without the database
+(measure_engine) and to_sql vs COPY into a plain table (load_methods).
+"""
+
+import gzip
+import multiprocessing as mp
+import queue
+import resource
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine, text
+
+import ingest_data_
+import ingest_green
+from csv_pipeline import rebatch
+from pg_load import (
+    LOAD_METHODS,
+    create_staging_table,
+    ensure_partitioned_table,
+    filter_month,
+    frame_to_csv,
+    partition_name,
+    quote_ident,
+    swap_in_partition,
+    write_chunk,
+    write_chunks,
+)
+from bench.synth import SCHEMAS
+
+PICKUP = {"green": ingest_green.PICKUP_COLUMN, "yellow": ingest_data_.partition_column}
+INDEXES = {"green": ingest_green.INDEX_COLUMNS, "yellow": ingest_data_.index_columns}
+
+# How often the parent checks that a benchmark process is still alive
+POLL_S = 1.0
+
+
+def strategies(fmt: str, workers: int) -> list:
+    """(name, reader, load_method, workers) combinations that apply to `fmt`.
+
+    "insert" is the original to_sql path; CSV input is parsed with the same
+    engines ingest_data_.py offers, Parquet input is read per row group like
+    ingest_green.py.
+    """
+    readers = ["parquet"] if fmt == "parquet" else ingest_data_.ENGINES
+    runs = []
+    for reader in readers:
+        runs.append((f"{reader}/insert", reader, "insert", 1))
+        runs.append((f"{reader}/copy", reader, "copy", 1))
+        if workers > 1:
+            runs.append((f"{reader}/copy x{workers}", reader, "copy", workers))
+    return runs
+
+
+def csv_reader(taxi: str, engine: str, chunk_size: int):
+    """ingest_data_.csv_reader for yellow; the same two engines typed from the schema for green."""
+    if taxi == "yellow":
+        return ingest_data_.csv_reader(engine, chunk_size)
+
+    schema = SCHEMAS[taxi]
+    dates = [f.name for f in schema if pa.types.is_timestamp(f.type)]
+    if engine == "pandas":
+        dtypes = ingest_green.batch_to_frame(schema.empty_table()).dtypes.drop(dates).to_dict()
+
+        def parse(f):
+            return pd.read_csv(f, dtype=dtypes, parse_dates=dates, iterator=True, chunksize=chunk_size)
+    else:
+        column_types = {f.name: pa.timestamp("s") if f.name in dates else f.type for f in schema}
+
+        def parse(f):
+            reader = pacsv.open_csv(
+                f,
+                read_options=pacsv.ReadOptions(use_threads=True, block_size=16 * 1024 * 1024),
+                convert_options=pacsv.ConvertOptions(column_types=column_types, strings_can_be_null=True),
+            )
+            return rebatch(reader, chunk_size)
+    return parse
+
+
+def read_chunks(taxi: str, path, reader: str, chunk_size: int):
+    """(chunk_index, chunk) pairs from a synthetic file, the way the loaders read it."""
+    if reader == "parquet":
+        yield from ingest_green.iter_chunks(pq.ParquetFile(path), chunk_size)
+        return
+    with gzip.open(path, "rb") as f:
+        yield from enumerate(csv_reader(taxi, reader, chunk_size)(f))
+
+
+def wal_lsn(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT pg_current_wal_lsn()")).scalar()
+
+
+def run_strategy(conn_string, taxi, path, year, month, reader, method, workers, chunk_size, out):
+    """Load `path` into a scratch partitioned table and report what it cost.
+
+    Covers the whole loader path: staging table, chunked writes, index build
+    and partition attach. Peak RSS is this (client) process only.
+    """
+    engine = create_engine(conn_string, pool_size=max(5, workers))
+    table = f"bench_{taxi}_taxi_data"
+    pickup = PICKUP[taxi]
+    df_empty = ingest_green.batch_to_frame(SCHEMAS[taxi].empty_table())
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {quote_ident(table)} CASCADE"))
+    ensure_partitioned_table(df_empty, table, engine, pickup, INDEXES[taxi])
+    partition = partition_name(table, year, month)
+    staging = create_staging_table(table, partition, engine)
+
+    lsn0 = wal_lsn(engine)
+    t0 = time.perf_counter()
+    chunks = (
+        (chunk_index, filter_month(chunk, pickup, year, month))
+        for chunk_index, chunk in read_chunks(taxi, path, reader, chunk_size)
+    )
+    rows = sum(write_chunks(chunks, staging, engine, method, workers))
+    swap_in_partition(table, pickup, year, month, engine, INDEXES[taxi])
+    wall = time.perf_counter() - t0
+
+    with engine.begin() as conn:
+        wal_bytes = conn.execute(
+            text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), :lsn)"), {"lsn": lsn0}
+        ).scalar()
+        table_bytes = conn.execute(
+            text("SELECT pg_total_relation_size(to_regclass(:name))"),
+            {"name": quote_ident(partition)},
+        ).scalar()
+        loaded = conn.execute(text(f"SELECT count(*) FROM {quote_ident(table)}")).scalar()
+        conn.execute(text(f"DROP TABLE {quote_ident(table)} CASCADE"))
+    if loaded != rows:
+        raise RuntimeError(f"expected {rows:,} rows in {table}, found {loaded:,}")
+
+    out.put({
+        "rows": rows,
+        "wall_s": wall,
+        "rows_per_s": rows / max(wall, 1e-9),
+        "peak_rss_bytes": peak_rss(),
+        "table_bytes": int(table_bytes),
+        "wal_bytes": int(wal_bytes),
+    })
+
+
+def peak_rss() -> int:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def in_fresh_process(target, args: tuple, what: str):
+    """Run target(*args, out) in a fresh spawned process and return what it puts on `out`.
+
+    A fresh process keeps peak RSS per run. A child that dies without a
+    result (crash, OOM kill) raises RuntimeError instead of hanging the parent.
+    """
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    proc = ctx.Process(target=target, args=(*args, out))
+    proc.start()
+    # The result is read before joining: a child blocks on exit until its queue is drained
+    try:
+        while True:
+            try:
+                result = out.get(timeout=POLL_S)
+                break
+            except queue.Empty:
+                if not proc.is_alive():
+                    raise RuntimeError(f"{what} failed (exit code {proc.exitcode})")
+    except BaseException:
+        proc.terminate()
+        raise
+    finally:
+        proc.join()
+    if proc.exitcode != 0:
+        raise RuntimeError(f"{what} failed (exit code {proc.exitcode})")
+    return result
+
+
+def measure(conn_string, taxi, path, year, month, reader, method, workers, chunk_size) -> dict:
+    """Run one strategy in a fresh spawned process so peak RSS is not shared."""
+    return in_fresh_process(
+        run_strategy,
+        (conn_string, taxi, str(path), year, month, reader, method, workers, chunk_size),
+        f"{taxi} {reader}/{method} x{workers}",
+    )
+
+
+def run_engine(taxi, path, engine, chunk_size, out):
+    """Parse `path` with one CSV engine and serialize every chunk to a COPY buffer; no database."""
+    t0 = time.perf_counter()
+    rows = 0
+    copy_bytes = 0
+    with gzip.open(path, "rb") as f:
+        for chunk in csv_reader(taxi, engine, chunk_size)(f):
+            rows += len(chunk)
+            copy_bytes += frame_to_csv(chunk).getbuffer().nbytes
+    wall = time.perf_counter() - t0
+    out.put({
+        "rows": rows,
+        "wall_s": wall,
+        "rows_per_s": rows / max(wall, 1e-9),
+        "peak_rss_bytes": peak_rss(),
+        "copy_bytes": copy_bytes,
+    })
+
+
+def measure_engine(taxi, path, engine, chunk_size) -> dict:
+    """Run one CSV engine in a fresh spawned process so peak RSS is not shared."""
+    return in_fresh_process(run_engine, (taxi, str(path), engine, chunk_size), f"{taxi} {engine} engine")
+
+
+def load_methods(conn_string, path, rows: int, chunk_size: int, table: str):
+    """Yield (method, rows, seconds) loading the first `rows` of a Parquet file with each load method.
+
+    Every method starts from an empty `table`, which is dropped at the end.
+    """
+    engine = create_engine(conn_string)
+    df = pd.read_parquet(path).head(rows)
+    try:
+        for method in LOAD_METHODS:
+            df.head(0).to_sql(name=table, con=engine, if_exists="replace", index=False)
+
+            t0 = time.perf_counter()
+            for start in range(0, len(df), chunk_size):
+                write_chunk(df.iloc[start:start + chunk_size], table, engine, method)
+            elapsed = time.perf_counter() - t0
+
+            with engine.connect() as conn:
+                loaded = conn.execute(text(f"SELECT count(*) FROM {quote_ident(table)}")).scalar()
+            if loaded != len(df):
+                raise RuntimeError(f"{method}: expected {len(df):,} rows, found {loaded:,}")
+            yield method, len(df), elapsed
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {quote_ident(table)}"))
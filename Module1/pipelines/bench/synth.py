@@ -0,0 +1,148 @@
+"""Synthetic green/yellow trip data with the loaders' column sets and dtypes."""
+
+import gzip
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+import ingest_data_
+from pg_load import month_bounds
+
+TAXIS = ["green", "yellow"]
+FORMATS = ["parquet", "csv.gz"]
+
+# Column set and types of the TLC green Parquet files read by ingest_green.py
+GREEN_SCHEMA = pa.schema([
+    ("VendorID", pa.int32()),
+    ("lpep_pickup_datetime", pa.timestamp("us")),
+    ("lpep_dropoff_datetime", pa.timestamp("us")),
+    ("store_and_fwd_flag", pa.string()),
+    ("RatecodeID", pa.int64()),
+    ("PULocationID", pa.int32()),
+    ("DOLocationID", pa.int32()),
+    ("passenger_count", pa.int64()),
+    ("trip_distance", pa.float64()),
+    ("fare_amount", pa.float64()),
+    ("extra", pa.float64()),
+    ("mta_tax", pa.float64()),
+    ("tip_amount", pa.float64()),
+    ("tolls_amount", pa.float64()),
+    ("ehail_fee", pa.float64()),
+    ("improvement_surcharge", pa.float64()),
+    ("total_amount", pa.float64()),
+    ("payment_type", pa.int64()),
+    ("trip_type", pa.int64()),
+    ("congestion_surcharge", pa.float64()),
+    ("cbd_congestion_fee", pa.float64()),
+])
+
+# Column order of the DataTalksClub yellow CSVs; types from ingest_data_.py
+YELLOW_COLUMNS = [
+    "VendorID", "tpep_pickup_datetime", "tpep_dropoff_datetime", "passenger_count",
+    "trip_distance", "RatecodeID", "store_and_fwd_flag", "PULocationID", "DOLocationID",
+    "payment_type", "fare_amount", "extra", "mta_tax", "tip_amount", "tolls_amount",
+    "improvement_surcharge", "total_amount", "congestion_surcharge",
+]
+YELLOW_SCHEMA = pa.schema([(name, ingest_data_.arrow_schema()[name]) for name in YELLOW_COLUMNS])
+
+SCHEMAS = {"green": GREEN_SCHEMA, "yellow": YELLOW_SCHEMA}
+
+# Columns that are sometimes empty in the real files
+NULLABLE = {"VendorID", "passenger_count", "RatecodeID", "store_and_fwd_flag", "payment_type", "congestion_surcharge"}
+
+
+def _with_nulls(rng, values, null_rate: float, type_):
+    mask = rng.random(len(values)) < null_rate if null_rate else None
+    return pa.array(values, type=type_, mask=mask)
+
+
+def trip_batches(taxi: str, rows: int, year: int, month: int, seed: int = 0, null_rate: float = 0.02, batch_rows: int = 100_000):
+    """Yield Arrow tables of synthetic trips with pickups spread over one month."""
+    schema = SCHEMAS[taxi]
+    prefix = "lpep" if taxi == "green" else "tpep"
+    start, end = month_bounds(year, month)
+    month_s = int((end - start).total_seconds())
+    rng = np.random.default_rng(seed)
+
+    for offset in range(0, rows, batch_rows):
+        n = min(batch_rows, rows - offset)
+        pickup = np.datetime64(start, "s") + rng.integers(0, month_s, n).astype("timedelta64[s]")
+        dropoff = pickup + rng.exponential(900, n).astype("timedelta64[s]")
+        distance = np.round(rng.gamma(1.5, 2.0, n), 2)
+        fare = np.round(3.0 + 2.5 * distance + rng.normal(0, 1, n), 2)
+        extra = rng.choice([0.0, 0.5, 1.0, 2.5], n)
+        tip = np.round(np.where(rng.random(n) < 0.6, fare * rng.uniform(0.1, 0.25, n), 0.0), 2)
+        tolls = np.where(rng.random(n) < 0.05, 6.55, 0.0)
+        congestion = rng.choice([0.0, 2.5], n)
+        values = {
+            "VendorID": rng.choice([1, 2], n),
+            f"{prefix}_pickup_datetime": pickup,
+            f"{prefix}_dropoff_datetime": dropoff,
+            "store_and_fwd_flag": rng.choice(["N", "Y"], n, p=[0.99, 0.01]),
+            "RatecodeID": rng.choice([1, 2, 3, 4, 5, 6], n, p=[0.9, 0.04, 0.01, 0.01, 0.03, 0.01]),
+            "PULocationID": rng.integers(1, 266, n),
+            "DOLocationID": rng.integers(1, 266, n),
+            "passenger_count": rng.integers(0, 7, n),
+            "trip_distance": distance,
+            "fare_amount": fare,
+            "extra": extra,
+            "mta_tax": np.full(n, 0.5),
+            "tip_amount": tip,
+            "tolls_amount": tolls,
+            "ehail_fee": np.full(n, np.nan),
+            "improvement_surcharge": np.full(n, 1.0),
+            "total_amount": np.round(fare + extra + 0.5 + tip + tolls + 1.0 + congestion, 2),
+            "payment_type": rng.choice([1, 2, 3, 4, 5], n, p=[0.7, 0.26, 0.02, 0.01, 0.01]),
+            "trip_type": rng.choice([1, 2], n, p=[0.97, 0.03]),
+            "congestion_surcharge": congestion,
+            "cbd_congestion_fee": rng.choice([0.0, 0.75], n),
+        }
+
+        columns = []
+        for field in schema:
+            if field.name == "ehail_fee":
+                columns.append(pa.nulls(n, field.type))
+            else:
+                rate = null_rate if field.name in NULLABLE else 0.0
+                columns.append(_with_nulls(rng, values[field.name], rate, field.type))
+        yield pa.Table.from_arrays(columns, schema=schema)
+
+
+def write_parquet(batches, path, schema):
+    """One row group per batch, snappy-compressed like the TLC files."""
+    with pq.ParquetWriter(path, schema, compression="snappy") as writer:
+        for table in batches:
+            writer.write_table(table)
+
+
+def write_csv_gz(batches, path, schema):
+    """Gzipped CSV with second-resolution timestamps and empty fields for nulls."""
+    csv_schema = pa.schema([
+        f.with_type(pa.timestamp("s")) if pa.types.is_timestamp(f.type) else f
+        for f in schema
+    ])
+    options = pacsv.WriteOptions(quoting_style="needed")
+    with gzip.open(path, "wb", compresslevel=6) as f, pacsv.CSVWriter(f, csv_schema, write_options=options) as writer:
+        for table in batches:
+            writer.write_table(table.cast(csv_schema))
+
+
+def generate(taxi: str, fmt: str, rows: int, year: int, month: int, data_dir, seed: int = 0, null_rate: float = 0.02) -> Path:
+    """Write a synthetic file (reused if one with the same parameters exists) and return its path."""
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / f"{taxi}_tripdata_{year}-{month:02d}_{rows}_s{seed}_n{null_rate:g}.{fmt}"
+    if path.exists():
+        return path
+
+    tmp = path.with_name(path.name + ".tmp")
+    batches = trip_batches(taxi, rows, year, month, seed, null_rate)
+    if fmt == "parquet":
+        write_parquet(batches, tmp, SCHEMAS[taxi])
+    else:
+        write_csv_gz(batches, tmp, SCHEMAS[taxi])
+    tmp.rename(path)
+    return path
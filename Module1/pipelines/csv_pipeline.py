@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Pipelined fetch -> parse -> write stages for the yellow CSV.gz loader.
+
+Each stage runs in its own thread and hands work to the next through a
+bounded queue, so the download, the CSV parser and the database writers
+overlap while a slow stage applies backpressure to the ones before it.
+"""
+
+import io
+import queue
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from itertools import count
+from pathlib import Path
+
+import pyarrow as pa
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.tlc_cache import default_cache
+
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    """Raised in a stage when another stage has failed."""
+
+
+class StageStats:
+    """Wall-clock accounting for one stage: working, starved for input, blocked on output."""
+
+    def __init__(self, name: str, parallelism: int = 1):
+        self.name = name
+        self.parallelism = parallelism
+        self.busy_s = 0.0
+        self.starved_s = 0.0
+        self.blocked_s = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self, field: str, seconds: float):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + seconds)
+        if field == "starved_s":
+            self._local.starved = getattr(self._local, "starved", 0.0) + seconds
+
+    @contextmanager
+    def busy(self):
+        """Time a unit of work, excluding input starvation this thread accrued inside it."""
+        t0 = time.perf_counter()
+        starved0 = getattr(self._local, "starved", 0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            starved = getattr(self._local, "starved", 0.0) - starved0
+            self.add("busy_s", elapsed - starved)
+
+    def utilization(self, wall: float) -> dict:
+        capacity = max(wall * self.parallelism, 1e-9)
+        return {
+            "stage": self.name,
+            "workers": self.parallelism,
+            "busy": self.busy_s / capacity,
+            "starved": self.starved_s / capacity,
+            "blocked": self.blocked_s / capacity,
+        }
+
+
+class StageQueue:
+    """Bounded queue that charges waiting time to the producing/consuming stage."""
+
+    def __init__(self, maxsize: int, stop: threading.Event):
+        self._q = queue.Queue(maxsize=maxsize)
+        self._stop = stop
+
+    def put(self, item, stats: StageStats):
+        t0 = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise PipelineStopped()
+            try:
+                self._q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stats.add("blocked_s", time.perf_counter() - t0)
+
+    def get(self, stats: StageStats):
+        t0 = time.perf_counter()
+        while True:
+            if self._stop.is_set():
+                raise PipelineStopped()
+            try:
+                item = self._q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        stats.add("starved_s", time.perf_counter() - t0)
+        return item
+
+
+class QueueReader(io.RawIOBase):
+    """Binary file-like view over byte blocks arriving on a StageQueue."""
+
+    def __init__(self, source: StageQueue, stats: StageStats):
+        self._source = source
+        self._stats = stats
+        self._buf = memoryview(b"")
+        self._pos = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos == len(self._buf) and not self._eof:
+            block = self._source.get(self._stats)
+            if block is _DONE:
+                self._eof = True
+            else:
+                self._buf, self._pos = memoryview(block), 0
+        # Advance an offset instead of re-slicing, so small reads copy nothing extra
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def rebatch(batches, rows: int):
+    """Regroup Arrow record batches into tables of exactly `rows` rows (last may be short).
+
+    Keeps chunk boundaries independent of the reader's block size, so chunk
+    indexes mean the same thing for every engine.
+    """
+    pending = []
+    pending_rows = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= rows:
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, rows)
+            rest = table.slice(rows)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending)
+
+
+def _file_blocks(path, block_size: int):
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            yield block
+
+
+class CsvPipeline:
+    """Stream a remote CSV.gz into typed (chunk_index, chunk) pairs.
+
+    `parse` turns a binary file object of decompressed CSV into an iterator of
+    chunks (pandas DataFrames or Arrow tables). raw_blocks bounds decompressed
+    bytes in flight (in `block_size` units), frames bounds parsed chunks
+    waiting for a writer. `path`, if given, is a local copy of `url` (such as
+    a cache entry the caller holds pinned) read instead of the cache.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        parse,
+        first_index: int = 0,
+        done=(),
+        raw_blocks: int = 16,
+        frames: int = 2,
+        block_size: int = 1024 * 1024,
+        writers: int = 1,
+        path=None,
+    ):
+        self.url = url
+        self.path = path
+        self.parse = parse
+        self.first_index = first_index
+        self.done = done
+        self.block_size = block_size
+
+        self._stop = threading.Event()
+        self._errors = []
+        self._raw = StageQueue(raw_blocks, self._stop)
+        self._frames = StageQueue(frames, self._stop)
+
+        self.fetch_stats = StageStats("fetch")
+        self.parse_stats = StageStats("parse")
+        self.write_stats = StageStats("write", writers)
+        self._t0 = None
+
+    def _fetch(self):
+        """Download (or read from the local cache) and gunzip the source into byte blocks."""
+        stats = self.fetch_stats
+        decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.path is not None:
+            blocks = _file_blocks(self.path, self.block_size)
+        else:
+            blocks = default_cache().iter_content(self.url, self.block_size)
+        try:
+            while True:
+                with stats.busy():
+                    block = next(blocks, None)
+                    if block is None:
+                        data = decomp.flush()
+                    else:
+                        data = decomp.decompress(block)
+                        # Concatenated gzip members
+                        while decomp.eof and decomp.unused_data:
+                            rest = decomp.unused_data
+                            decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                            data += decomp.decompress(rest)
+                if data:
+                    self._raw.put(data, stats)
+                if block is None:
+                    break
+        finally:
+            blocks.close()
+        self._raw.put(_DONE, stats)
+
+    def _parse(self):
+        """Parse decompressed bytes into typed chunks."""
+        stats = self.parse_stats
+        reader = io.BufferedReader(QueueReader(self._raw, stats), buffer_size=self.block_size)
+        with stats.busy():
+            df_iter = iter(self.parse(reader))
+        for chunk_index in count(self.first_index):
+            with stats.busy():
+                df_chunk = next(df_iter, None)
+            if df_chunk is None:
+                break
+            if chunk_index not in self.done:
+                self._frames.put((chunk_index, df_chunk), stats)
+        self._frames.put(_DONE, stats)
+
+    def _run(self, target):
+        try:
+            target()
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def chunks(self):
+        """Start the fetch and parse stages and yield (chunk_index, frame) pairs."""
+        self._t0 = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._run, args=(self._fetch,), name="fetch", daemon=True),
+            threading.Thread(target=self._run, args=(self._parse,), name="parse", daemon=True),
+        ]
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                try:
+                    item = self._frames.get(self.write_stats)
+                except PipelineStopped:
+                    raise self._errors[0]
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # Unblock the producers if the writer stops early or fails
+            self._stop.set()
+            for t in threads:
+                t.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def report(self):
+        """Print per-stage utilization and name the likely bottleneck."""
+        wall = time.perf_counter() - self._t0
+        rows = [
+            s.utilization(wall)
+            for s in (self.fetch_stats, self.parse_stats, self.write_stats)
+        ]
+        print(f"\nPipeline utilization over {wall:.1f}s:")
+        print(f"{'stage':<6} {'workers':>7} {'busy':>6} {'starved':>8} {'blocked':>8}")
+        for r in rows:
+            print(
+                f"{r['stage']:<6} {r['workers']:>7} {r['busy']:>6.0%} "
+                f"{r['starved']:>8.0%} {r['blocked']:>8.0%}"
+            )
+        bottleneck = max(rows, key=lambda r: r["busy"])
+        print(f"Bottleneck: {bottleneck['stage']} ({bottleneck['busy']:.0%} busy)")
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+import click
+import requests
+from sqlalchemy import create_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.tlc_cache import default_cache
+
+from csv_pipeline import CsvPipeline
+import ingest_data_
+import ingest_green
+from load_profile import month_profile, save_profile
+from pg_load import (
+    LOAD_METHODS,
+    create_staging_table,
+    ensure_partitioned_table,
+    filter_month,
+    partition_name,
+    swap_in_partition,
+    write_chunks,
+)
+
+# One month-partitioned table per taxi type, shaped like the single-month loaders'
+TAXIS = {
+    "green": {
+        "table": "green_taxi_data",
+        "pickup": ingest_green.PICKUP_COLUMN,
+        "indexes": ingest_green.INDEX_COLUMNS,
+        "url": ingest_green.GREEN_URL,
+    },
+    "yellow": {
+        "table": "yellow_taxi_data",
+        "pickup": ingest_data_.partition_column,
+        "indexes": ingest_data_.index_columns,
+        "url": ingest_data_.YELLOW_URL,
+    },
+}
+
+
+def month_range(start: str, end: str) -> list:
+    """All (year, month) pairs from YYYY-MM `start` to `end`, inclusive."""
+    first = pd.Period(start, freq="M")
+    last = pd.Period(end, freq="M")
+    return [(p.year, p.month) for p in pd.period_range(first, last, freq="M")]
+
+
+def open_month(taxi: str, url: str, path, chunk_size: int, csv_engine: str):
+    """Return (empty schema frame, (chunk_index, chunk) iterator) for a cached source file."""
+    if taxi == "green":
+        pf = pq.ParquetFile(path)
+        df_empty = ingest_green.batch_to_frame(pf.schema_arrow.empty_table())
+        return df_empty, ingest_green.iter_chunks(pf, chunk_size)
+
+    df_empty = pd.read_csv(
+        path, nrows=100, dtype=ingest_data_.dtype, parse_dates=ingest_data_.parse_dates
+    ).head(0)
+    pipeline = CsvPipeline(url, ingest_data_.csv_reader(csv_engine, chunk_size), path=path)
+    return df_empty, pipeline.chunks()
+
+
+def load_month(taxi, year, month, engine, net_slots, db_slots, ddl_lock, options):
+    """Download one month (network slot), then load it into its partition (DB slot).
+
+    The cache entry stays pinned from the download to the end of the load,
+    so eviction for another month cannot remove it in between.
+    """
+    spec = TAXIS[taxi]
+    url = spec["url"].format(year=year, month=month)
+    result = {"taxi": taxi, "year": year, "month": month, "rows": 0, "dropped": 0, "bytes": 0}
+
+    with ExitStack() as pin:
+        t0 = time.perf_counter()
+        with net_slots:
+            try:
+                path = pin.enter_context(default_cache().get(url))
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status in (403, 404):
+                    result["status"] = "missing"
+                    return result
+                raise
+            result["bytes"] = path.stat().st_size
+        result["fetch_s"] = time.perf_counter() - t0
+
+        t1 = time.perf_counter()
+        with db_slots:
+            _load_pinned(taxi, year, month, url, path, engine, ddl_lock, options, result)
+        result["load_s"] = time.perf_counter() - t1
+    result["status"] = "loaded"
+    return result
+
+
+def _load_pinned(taxi, year, month, url, path, engine, ddl_lock, options, result):
+    """Load one month from its local file into a staging table and swap it in as the partition."""
+    spec = TAXIS[taxi]
+    df_empty, chunks = open_month(taxi, url, path, options["chunk_size"], options["csv_engine"])
+
+    with ddl_lock:
+        ensure_partitioned_table(df_empty, spec["table"], engine, spec["pickup"], spec["indexes"])
+    staging = create_staging_table(spec["table"], partition_name(spec["table"], year, month), engine)
+
+    profile = month_profile(spec["pickup"], year, month)
+
+    def in_month(chunks):
+        # TLC files contain a few rows from other months; they have no partition here
+        for chunk_index, chunk in chunks:
+            profile.update(chunk)
+            kept = filter_month(chunk, spec["pickup"], year, month)
+            result["dropped"] += len(chunk) - len(kept)
+            yield chunk_index, kept
+
+    for rows in write_chunks(
+        in_month(chunks),
+        staging,
+        engine,
+        options["load_method"],
+        options["workers"],
+    ):
+        result["rows"] += rows
+
+    # Re-running a month replaces just that month's partition
+    swap_in_partition(spec["table"], spec["pickup"], year, month, engine, spec["indexes"])
+    save_profile(engine, partition_name(spec["table"], year, month), url, profile)
+    result["failed_checks"] = profile.failed_checks(not_null=[spec["pickup"]])
+
+
+def print_summary(results, failures, wall):
+    print("\n=== Batch summary ===")
+    loaded = [r for r in results if r["status"] == "loaded"]
+    missing = [r for r in results if r["status"] == "missing"]
+
+    for taxi in sorted({r["taxi"] for r in loaded}):
+        rs = [r for r in loaded if r["taxi"] == taxi]
+        rows = sum(r["rows"] for r in rs)
+        print(
+            f"{taxi:>7}: {len(rs)} month(s), {rows:,} rows, "
+            f"{sum(r['bytes'] for r in rs) / 1024**2:,.0f} MiB source, "
+            f"{sum(r['dropped'] for r in rs):,} out-of-month rows skipped"
+        )
+
+    rows = sum(r["rows"] for r in loaded)
+    mib = sum(r["bytes"] for r in loaded) / 1024**2
+    print(
+        f"  total: {rows:,} rows in {wall:.1f}s "
+        f"({rows / max(wall, 1e-9):,.0f} rows/s, {mib / max(wall, 1e-9):,.1f} MiB/s)"
+    )
+    print(
+        f"  time in stages: fetch {sum(r['fetch_s'] for r in loaded):.1f}s, "
+        f"load {sum(r['load_s'] for r in loaded):.1f}s (summed over months)"
+    )
+    if missing:
+        print("  missing upstream: " + ", ".join(
+            f"{r['taxi']} {r['year']}-{r['month']:02d}" for r in missing
+        ))
+    for r in loaded:
+        for failure in r["failed_checks"]:
+            print(f"  check failed {r['taxi']} {r['year']}-{r['month']:02d}: {failure}")
+    for (taxi, year, month), e in failures:
+        print(f"  FAILED {taxi} {year}-{month:02d}: {e}")
+
+
+@click.command()
+@click.option('--user', default='root', help='PostgreSQL user')
+@click.option('--password', default='root', help='PostgreSQL password')
+@click.option('--host', default='localhost', help='PostgreSQL host')
+@click.option('--port', default=5432, type=int, help='PostgreSQL port')
+@click.option('--db', default='ny_taxi', help='PostgreSQL database name')
+@click.option(
+    '--taxi',
+    'taxis',
+    multiple=True,
+    default=['yellow', 'green'],
+    type=click.Choice(list(TAXIS)),
+    help='Taxi type (repeatable)'
+)
+@click.option('--start', required=True, help='First month, YYYY-MM')
+@click.option('--end', required=True, help='Last month, YYYY-MM')
+@click.option('--net-slots', default=4, type=int, help='Months downloading at once')
+@click.option('--db-slots', default=2, type=int, help='Months loading into Postgres at once')
+@click.option('--workers', default=1, type=int, help='DB connections per loading month')
+@click.option('--chunk-size', default=100_000, type=int, help='Chunk size (rows)')
+@click.option(
+    '--load-method',
+    default='copy',
+    type=click.Choice(LOAD_METHODS),
+    help='copy = COPY FROM STDIN (fast), insert = DataFrame.to_sql INSERTs'
+)
+@click.option(
+    '--engine',
+    'csv_engine',
+    default='pandas',
+    type=click.Choice(ingest_data_.ENGINES),
+    help='CSV parser for yellow months'
+)
+def ingest_batch(user, password, host, port, db, taxis, start, end, net_slots, db_slots, workers, chunk_size, load_method, csv_engine):
+    """Backfill many months of several taxi types into month-partitioned tables."""
+
+    conn_string = f'postgresql://{user}:{password}@{host}:{port}/{db}'
+    engine = create_engine(conn_string, pool_size=max(5, db_slots * workers + 1))
+
+    months = month_range(start, end)
+    tasks = [(taxi, year, month) for taxi in taxis for year, month in months]
+    print(
+        f"Scheduling {len(tasks)} month(s) of {', '.join(taxis)} "
+        f"({net_slots} network slot(s), {db_slots} DB slot(s))"
+    )
+
+    net = threading.BoundedSemaphore(net_slots)
+    dbs = threading.BoundedSemaphore(db_slots)
+    ddl_lock = threading.Lock()
+    options = {
+        "chunk_size": chunk_size,
+        "load_method": load_method,
+        "workers": workers,
+        "csv_engine": csv_engine,
+    }
+
+    results = []
+    failures = []
+    t0 = time.perf_counter()
+    # Enough threads that every slot can be busy; the semaphores do the limiting
+    with ThreadPoolExecutor(max_workers=net_slots + db_slots) as pool:
+        futures = {
+            pool.submit(load_month, *task, engine, net, dbs, ddl_lock, options): task
+            for task in tasks
+        }
+        for future in as_completed(futures):
+            taxi, year, month = futures[future]
+            try:
+                r = future.result()
+            except Exception as e:
+                failures.append((futures[future], e))
+                print(f"❌ {taxi} {year}-{month:02d} failed: {e}")
+                continue
+            results.append(r)
+            if r["status"] == "loaded":
+                print(
+                    f"✅ {taxi} {year}-{month:02d}: {r['rows']:,} rows "
+                    f"(fetch {r['fetch_s']:.1f}s, load {r['load_s']:.1f}s)"
+                )
+            else:
+                print(f"⚠️  {taxi} {year}-{month:02d}: not published upstream, skipped")
+
+    print_summary(results, failures, time.perf_counter() - t0)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    ingest_batch()
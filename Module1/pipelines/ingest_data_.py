@@ -1,11 +1,43 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import sys
+import time
+from itertools import count
+from pathlib import Path
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import click
 from sqlalchemy import create_engine
 from tqdm.auto import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.tlc_cache import default_cache
+
+from csv_pipeline import CsvPipeline, rebatch
+from load_profile import month_profile, profile_chunks, save_profile
+from load_manifest import (
+    chunk_recorder,
+    completed_chunks,
+    ensure_manifest,
+    mark_published,
+    reset_manifest,
+    source_fingerprint,
+)
+from pg_load import (
+    LOAD_METHODS,
+    create_staging_table,
+    ensure_partitioned_table,
+    filter_month,
+    partition_name,
+    staging_name,
+    swap_in_partition,
+    table_exists,
+    write_chunks,
+)
+
 # Dtypes and parse_dates (unchanged)
 dtype = {
     "VendorID": "Int64",
@@ -31,6 +63,72 @@ parse_dates = [
     "tpep_dropoff_datetime"
 ]
 
+YELLOW_URL = (
+    "https://github.com/DataTalksClub/nyc-tlc-data/releases/download/yellow/"
+    "yellow_tripdata_{year}-{month:02d}.csv.gz"
+)
+
+# The target table is RANGE-partitioned by month on this column
+partition_column = "tpep_pickup_datetime"
+
+# Indexes built once per loaded partition, not maintained during the load
+index_columns = ["tpep_pickup_datetime", "PULocationID", "DOLocationID"]
+
+# Arrow equivalents of the pandas dtypes above, for --engine arrow
+arrow_types = {
+    "Int64": pa.int64(),
+    "float64": pa.float64(),
+    "string": pa.string(),
+}
+
+ENGINES = ["pandas", "arrow"]
+
+
+def arrow_schema() -> dict:
+    """Explicit Arrow column types built from `dtype` and `parse_dates`."""
+    column_types = {name: arrow_types[t] for name, t in dtype.items()}
+    for name in parse_dates:
+        column_types[name] = pa.timestamp("s")
+    return column_types
+
+
+def csv_reader(engine: str, chunk_size: int, skip_rows: int = 0):
+    """Return a parse(f) callable yielding chunks of `chunk_size` rows.
+
+    pandas: the C parser with the nullable dtypes, yielding DataFrames.
+    arrow: pyarrow's multithreaded streaming reader, yielding Arrow tables
+    that go to the COPY writer without a pandas round trip.
+    """
+    if engine == "pandas":
+        def parse(f):
+            return pd.read_csv(
+                f,
+                dtype=dtype,
+                parse_dates=parse_dates,
+                skiprows=range(1, skip_rows + 1) if skip_rows else None,
+                iterator=True,
+                chunksize=chunk_size,
+            )
+    elif engine == "arrow":
+        def parse(f):
+            reader = pacsv.open_csv(
+                f,
+                read_options=pacsv.ReadOptions(
+                    use_threads=True,
+                    block_size=16 * 1024 * 1024,
+                    skip_rows_after_names=skip_rows,
+                ),
+                convert_options=pacsv.ConvertOptions(
+                    column_types=arrow_schema(),
+                    strings_can_be_null=True,
+                ),
+            )
+            return rebatch(reader, chunk_size)
+    else:
+        raise ValueError(f"Unknown engine: {engine!r} (expected one of {ENGINES})")
+    return parse
+
+
 @click.command()
 @click.option('--user', default='root', help='PostgreSQL user')
 @click.option('--password', default='root', help='PostgreSQL password')
@@ -41,22 +139,43 @@ parse_dates = [
 @click.option('--year', default=2021, type=int, help='Data year')
 @click.option('--month', default=1, type=int, help='Data month (1-12)')
 @click.option('--chunk-size', default=100000, type=int, help='CSV chunk size')
-def ingest_data(user, password, host, port, db, table, year, month, chunk_size):
+@click.option(
+    '--load-method',
+    default='copy',
+    type=click.Choice(LOAD_METHODS),
+    help='copy = COPY FROM STDIN (fast), insert = DataFrame.to_sql INSERTs'
+)
+@click.option('--workers', default=1, type=int, help='Parallel DB connections writing chunks')
+@click.option(
+    '--engine',
+    'csv_engine',
+    default='pandas',
+    type=click.Choice(ENGINES),
+    help='CSV parser: pandas C parser or pyarrow streaming reader'
+)
+@click.option(
+    '--resume',
+    is_flag=True,
+    help='Continue an interrupted load, skipping chunks recorded in the manifest'
+)
+def ingest_data(user, password, host, port, db, table, year, month, chunk_size, load_method, workers, csv_engine, resume):
     """Ingest NYC yellow taxi data into PostgreSQL."""
     
     # Build connection string
     conn_string = f'postgresql://{user}:{password}@{host}:{port}/{db}'
-    engine = create_engine(conn_string)
+    engine = create_engine(conn_string, pool_size=max(5, workers))
     
     # Data URL
-    prefix = 'https://github.com/DataTalksClub/nyc-tlc-data/releases/download/yellow/'
-    url = prefix + f'yellow_tripdata_{year}-{month:02d}.csv.gz'
+    url = YELLOW_URL.format(year=year, month=month)
+    
+    partition = partition_name(table, year, month)
     
     print(f"Loading from: {url}")
-    print(f"Target: {table} in {db}@{host}:{port}")
+    print(f"Target: {table} (partition {partition}) in {db}@{host}:{port}")
     
-    # Test schema
-    df_test = pd.read_csv(url, nrows=100, dtype=dtype, parse_dates=parse_dates)
+    # Test schema on the cached file; the pipeline below then reads the same copy
+    with default_cache().get(url) as path:
+        df_test = pd.read_csv(path, nrows=100, dtype=dtype, parse_dates=parse_dates)
     print("Test schema OK")
     
     try:
@@ -64,41 +183,67 @@ def ingest_data(user, password, host, port, db, table, year, month, chunk_size):
     except Exception as e:
         print(f"Schema preview failed (normal if DB busy): {e}")
     
-    # Main ingestion
-    df_iter = pd.read_csv(
+    fingerprint = source_fingerprint(url)
+    ensure_manifest(engine)
+    ensure_partitioned_table(df_test.head(0), table, engine, partition_column, index_columns)
+    
+    # Resume only into a staging table left behind by the same source
+    done = {}
+    if resume and table_exists(engine, staging_name(partition)):
+        done = completed_chunks(engine, partition, fingerprint, chunk_size)
+    if done:
+        staging = staging_name(partition)
+        print(f"Resuming into '{staging}': {len(done)} chunk(s), {sum(done.values()):,} rows already loaded")
+    else:
+        # Load into an UNLOGGED staging table; the live partition stays readable
+        reset_manifest(engine, partition)
+        staging = create_staging_table(table, partition, engine)
+        print(f"Staging table '{staging}' created")
+    
+    # gzip CSV cannot seek, but the leading run of loaded chunks is skipped
+    # without type conversion; later gaps (parallel runs) are filtered below
+    first_missing = next(i for i in count() if i not in done)
+    skip_rows = first_missing * chunk_size
+    
+    # Main ingestion: fetch/gunzip, parse and write run as overlapping stages
+    pipeline = CsvPipeline(
         url,
-        dtype=dtype,
-        parse_dates=parse_dates,
-        iterator=True,
-        chunksize=chunk_size
+        csv_reader(csv_engine, chunk_size, skip_rows),
+        first_index=first_missing,
+        done=done,
+        writers=workers,
     )
+    record = chunk_recorder(partition, fingerprint, chunk_size)
+    profile = month_profile(partition_column, year, month)
     
-    first = True
-    total_rows = 0
+    total_rows = sum(done.values())
+    loaded_rows = 0
+    t0 = time.perf_counter()
     
-    for df_chunk in tqdm(df_iter, desc="Loading chunks"):
-        if first:
-            df_chunk.head(0).to_sql(
-                name=table,
-                con=engine,
-                if_exists="replace",
-                index=False
-            )
-            first = False
-            print(f"Table '{table}' created")
-        
-        df_chunk.to_sql(
-            name=table,
-            con=engine,
-            if_exists="append",
-            index=False
+    with tqdm(desc="Loading rows", unit="rows", initial=total_rows) as pbar:
+        # Rows dated outside the month have no place in this partition
+        chunks = (
+            (chunk_index, filter_month(chunk, partition_column, year, month))
+            for chunk_index, chunk in profile_chunks(pipeline.chunks(), profile)
         )
-        
-        rows = len(df_chunk)
-        total_rows += rows
-        print(f"Inserted {rows:,} rows (total: {total_rows:,})")
+        for rows in write_chunks(chunks, staging, engine, load_method, workers, record, pipeline.write_stats):
+            total_rows += rows
+            loaded_rows += rows
+            pbar.update(rows)
+            print(f"Inserted {rows:,} rows (total: {total_rows:,})")
+    pipeline.report()
+    
+    print(f"Building indexes and attaching '{staging}' as '{partition}'...")
+    swap_in_partition(table, partition_column, year, month, engine, index_columns)
+    mark_published(engine, partition)
+    run_id = save_profile(engine, partition, url, profile)
     
-    print(f"\n✅ Load complete! {total_rows:,} rows in '{table}'")
+    elapsed = time.perf_counter() - t0
+    print(f"\n✅ Load complete! {total_rows:,} rows in '{partition}'")
+    print(f"Engine '{csv_engine}', load method '{load_method}' x{workers}: {elapsed:.1f}s ({loaded_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    print(f"\n{profile.summary()}\n(saved as run {run_id})")
+    for failure in profile.failed_checks(not_null=[partition_column]):
+        print(f"⚠️  Check failed: {failure}")
 
 if __name__ == '__main__':
     ingest_data()
@@ -1,12 +1,47 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import click
 import requests
 from sqlalchemy import create_engine
 from tqdm.auto import tqdm
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.remote_parquet import RemoteParquet
+from common.tlc_cache import default_cache
+
+from load_profile import month_profile, profile_chunks, save_profile
+from load_manifest import (
+    chunk_recorder,
+    completed_chunks,
+    ensure_manifest,
+    mark_published,
+    reset_manifest,
+    source_fingerprint,
+)
+from pg_load import (
+    LOAD_METHODS,
+    create_staging_table,
+    ensure_partitioned_table,
+    as_frame,
+    filter_month,
+    partition_name,
+    staging_name,
+    swap_in_partition,
+    table_exists,
+    write_chunks,
+)
+
 
 def ensure_parquet_available(url: str):
     """Check remote Parquet is reachable and non-empty before reading."""
@@ -20,6 +55,78 @@ def ensure_parquet_available(url: str):
         )
 
 
+GREEN_URL = (
+    "https://d37ci6vzurychx.cloudfront.net/trip-data/"
+    "green_tripdata_{year}-{month:02d}.parquet"
+)
+
+# Remote month loaded when neither --path nor --year/--month is given
+DEFAULT_YEAR, DEFAULT_MONTH = 2025, 11
+
+# The target table is RANGE-partitioned by month on this column
+PICKUP_COLUMN = "lpep_pickup_datetime"
+
+# Indexes built once per loaded partition, not maintained during the load
+INDEX_COLUMNS = ["lpep_pickup_datetime", "PULocationID", "DOLocationID"]
+
+def batch_to_frame(batch) -> pd.DataFrame:
+    """Convert an Arrow record batch (or empty table) to a pandas frame, e.g. for the table DDL."""
+    return as_frame(batch)
+
+
+def iter_chunks(pf, chunk_size: int, done=()):
+    """Yield (chunk_index, Arrow table) pairs, reading one row group at a time.
+
+    Chunks stay in Arrow through profiling, month filtering and COPY; only
+    the insert method converts them to pandas.
+
+    Chunk indexes are numbered per row group from the footer, so they are
+    stable across runs. Row groups whose chunks are all in `done` are not read.
+    """
+    chunk_index = 0
+    for rg in range(pf.metadata.num_row_groups):
+        rg_rows = pf.metadata.row_group(rg).num_rows
+        indexes = range(chunk_index, chunk_index + -(-rg_rows // chunk_size))
+        chunk_index = indexes.stop
+
+        if all(i in done for i in indexes):
+            continue
+
+        for i, batch in zip(indexes, pf.iter_batches(batch_size=chunk_size, row_groups=[rg])):
+            if i not in done:
+                yield i, pa.Table.from_batches([batch])
+
+
+def infer_month(pf, column: str):
+    """(year, month) most values of `column` fall in, reading only that column."""
+    counts = Counter()
+    for batch in pf.iter_batches(columns=[column]):
+        values = batch.column(0)
+        keys = pc.add(pc.multiply(pc.year(values), 100), pc.month(values))
+        for item in pc.value_counts(keys).to_pylist():
+            if item["values"] is not None:
+                counts[item["values"]] += item["counts"]
+    if not counts:
+        raise click.UsageError(f"No {column} values to infer the month from; pass --year and --month")
+    return divmod(counts.most_common(1)[0][0], 100)
+
+
+def month_chunks(chunks, column: str, year: int, month: int):
+    """filter_month each chunk; fail on a chunk with rows but none in the month.
+
+    A whole chunk outside the month means the file is not that month's,
+    which would otherwise load 0 rows and report success.
+    """
+    for chunk_index, chunk in chunks:
+        kept = filter_month(chunk, column, year, month)
+        if len(chunk) and not len(kept):
+            raise click.ClickException(
+                f"Chunk {chunk_index}: none of its {len(chunk):,} rows fall in {year}-{month:02d}; "
+                "does --year/--month match the file?"
+            )
+        yield chunk_index, kept
+
+
 @click.command()
 @click.option('--user', default='root', help='PostgreSQL user')
 @click.option('--password', default='root', help='PostgreSQL password')
@@ -27,20 +134,40 @@ def ensure_parquet_available(url: str):
 @click.option('--port', default=5432, type=int, help='PostgreSQL port')
 @click.option('--db', default='ny_taxi', help='PostgreSQL database name')
 @click.option('--table', default='green_taxi_data', help='Target table name')
-@click.option('--year', default=2025, type=int, help='Data year (for remote URL)')
-@click.option('--month', default=11, type=int, help='Data month (1-12, for remote URL)')
+@click.option('--year', type=int, help=f'Data year (default {DEFAULT_YEAR}; with --path, inferred from the file)')
+@click.option('--month', type=int, help=f'Data month 1-12 (default {DEFAULT_MONTH}; with --path, inferred from the file)')
 @click.option('--chunk-size', default=100_000, type=int, help='Chunk size (rows)')
 @click.option(
     '--path',
     default='',
     help='Local Parquet path (if set, overrides remote URL)'
 )
-def ingest_data(user, password, host, port, db, table, year, month, chunk_size, path):
+@click.option(
+    '--load-method',
+    default='copy',
+    type=click.Choice(LOAD_METHODS),
+    help='copy = COPY FROM STDIN (fast), insert = DataFrame.to_sql INSERTs'
+)
+@click.option('--workers', default=1, type=int, help='Parallel DB connections writing chunks')
+@click.option(
+    '--resume',
+    is_flag=True,
+    help='Continue an interrupted load, skipping chunks recorded in the manifest'
+)
+@click.option(
+    '--range-reads',
+    is_flag=True,
+    help='Read the remote file with HTTP range requests instead of downloading it'
+)
+def ingest_data(user, password, host, port, db, table, year, month, chunk_size, path, load_method, workers, resume, range_reads):
     """Ingest NYC green taxi Parquet data into PostgreSQL."""
 
     # Build connection string
     conn_string = f'postgresql://{user}:{password}@{host}:{port}/{db}'
-    engine = create_engine(conn_string)
+    engine = create_engine(conn_string, pool_size=max(5, workers))
+
+    if (year is None) != (month is None):
+        raise click.UsageError("Pass both --year and --month, or neither")
 
     # Decide source: local file or remote URL
     if path:
@@ -48,66 +175,97 @@ def ingest_data(user, password, host, port, db, table, year, month, chunk_size,
         print(f"Loading local Parquet file: {source}")
         # No HEAD check for local files
     else:
-        source = (
-            f"https://d37ci6vzurychx.cloudfront.net/trip-data/"
-            f"green_tripdata_{year}-{month:02d}.parquet"
-        )
+        if year is None:
+            year, month = DEFAULT_YEAR, DEFAULT_MONTH
+        source = GREEN_URL.format(year=year, month=month)
         print(f"Loading from remote URL: {source}")
         print("Checking remote Parquet availability...")
         ensure_parquet_available(source)
         print("Remote Parquet OK (HTTP 200 and non-zero size)")
 
-    print(f"Target: {table} in {db}@{host}:{port}")
-
-    # Read a small sample to inspect schema
-    print("Reading sample for schema...")
-    df_sample = pd.read_parquet(source)
-    df_sample = df_sample.head(100)
-    print("Sample schema:")
-    df_sample.info()
-
-    print("\nGenerated schema (from sample):")
-    try:
-        print(pd.io.sql.get_schema(df_sample, name=table, con=engine))
-    except Exception as e:
-        print(f"Schema preview failed (will still continue): {e}")
-
-    # Read full Parquet file
-    print("\nReading full Parquet file into memory...")
-    df = pd.read_parquet(source)
-    total_rows = len(df)
-    print(f"Total rows in file: {total_rows:,}")
-
-    # Create table schema from empty head
-    df.head(0).to_sql(
-        name=table,
-        con=engine,
-        if_exists="replace",
-        index=False,
-    )
-    print(f"Table '{table}' created")
-
-    # Chunk in-memory DataFrame to avoid a single huge INSERT
-    start = 0
-    with tqdm(total=total_rows, desc="Inserting rows") as pbar:
-        while start < total_rows:
-            end = min(start + chunk_size, total_rows)
-            df_chunk = df.iloc[start:end]
-
-            df_chunk.to_sql(
-                name=table,
-                con=engine,
-                if_exists="append",
-                index=False,
-            )
+    fingerprint = source_fingerprint(source)
+    ensure_manifest(engine)
+
+    # Parquet is random access, so remote months are read from the shared
+    # local cache; from here on only the footer and one batch at a time are read
+    with ExitStack() as stack:
+        if path:
+            pf = pq.ParquetFile(path)
+        elif range_reads:
+            # Footer now, then one row group's column chunks at a time;
+            # row groups skipped on --resume are never fetched
+            print("Reading remote Parquet with range requests...")
+            pf = RemoteParquet(source)
+        else:
+            print("Fetching remote Parquet through the local cache...")
+            pf = pq.ParquetFile(stack.enter_context(default_cache().get(source)))
+        total_rows = pf.metadata.num_rows
+        print(
+            f"Parquet footer: {total_rows:,} rows in "
+            f"{pf.metadata.num_row_groups} row group(s)"
+        )
+        print("Schema (from footer):")
+        print(pf.schema_arrow)
+
+        if year is None:
+            year, month = infer_month(pf, PICKUP_COLUMN)
+            print(f"Month inferred from {PICKUP_COLUMN}: {year}-{month:02d}")
+        partition = partition_name(table, year, month)
+        print(f"Target: {table} (partition {partition}) in {db}@{host}:{port}")
 
-            inserted = len(df_chunk)
-            pbar.update(inserted)
-            print(f"Inserted {inserted:,} rows (rows {start:,}–{end-1:,})")
+        # Create table schema from the empty footer schema
+        df_empty = batch_to_frame(pf.schema_arrow.empty_table())
+
+        print("\nGenerated schema (from footer):")
+        try:
+            print(pd.io.sql.get_schema(df_empty, name=table, con=engine))
+        except Exception as e:
+            print(f"Schema preview failed (will still continue): {e}")
+
+        ensure_partitioned_table(df_empty, table, engine, PICKUP_COLUMN, INDEX_COLUMNS)
+
+        # Resume only into a staging table left behind by the same source
+        done = {}
+        if resume and table_exists(engine, staging_name(partition)):
+            done = completed_chunks(engine, partition, fingerprint, chunk_size)
+        if done:
+            staging = staging_name(partition)
+            print(f"Resuming into '{staging}': {len(done)} chunk(s), {sum(done.values()):,} rows already loaded")
+        else:
+            # Load into an UNLOGGED staging table; the live partition stays readable
+            reset_manifest(engine, partition)
+            staging = create_staging_table(table, partition, engine)
+            print(f"Staging table '{staging}' created")
+
+        # Stream fixed-size record batches; peak memory is one batch per worker
+        t0 = time.perf_counter()
+        loaded_rows = 0
+        # Rows dated outside the month have no place in this partition
+        profile = month_profile(PICKUP_COLUMN, year, month)
+        chunks = month_chunks(
+            profile_chunks(iter_chunks(pf, chunk_size, done), profile), PICKUP_COLUMN, year, month,
+        )
+        record = chunk_recorder(partition, fingerprint, chunk_size)
+        with tqdm(total=total_rows, initial=sum(done.values()), desc="Inserting rows") as pbar:
+            for inserted in write_chunks(chunks, staging, engine, load_method, workers, record):
+                loaded_rows += inserted
+                pbar.update(inserted)
+                print(f"Inserted {inserted:,} rows")
 
-            start = end
+        print(f"Building indexes and attaching '{staging}' as '{partition}'...")
+        swap_in_partition(table, PICKUP_COLUMN, year, month, engine, INDEX_COLUMNS)
+        mark_published(engine, partition)
+        run_id = save_profile(engine, partition, source, profile)
+        if isinstance(pf, RemoteParquet):
+            print(pf.summary())
 
-    print(f"\n✅ Load complete! {total_rows:,} rows in '{table}'")
+    elapsed = time.perf_counter() - t0
+    month_rows = loaded_rows + sum(done.values())
+    print(f"\n✅ Load complete! {month_rows:,} rows in '{partition}' ({total_rows - month_rows:,} out-of-month rows skipped)")
+    print(f"Load method '{load_method}' x{workers}: {elapsed:.1f}s ({loaded_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    print(f"\n{profile.summary()}\n(saved as run {run_id})")
+    for failure in profile.failed_checks(not_null=[PICKUP_COLUMN]):
+        print(f"⚠️  Check failed: {failure}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Per-chunk load manifest kept in the target database, used by --resume."""
+
+import os
+
+import requests
+from sqlalchemy import text
+
+MANIFEST_TABLE = "ingest_manifest"
+
+
+def source_fingerprint(source: str) -> dict:
+    """Identify a source file by path/URL, size and ETag (mtime for local files)."""
+    if source.startswith(("http://", "https://")):
+        resp = requests.head(source, allow_redirects=True, timeout=60)
+        resp.raise_for_status()
+        return {
+            "source": source,
+            "size": int(resp.headers.get("Content-Length", 0)),
+            "etag": resp.headers.get("ETag", ""),
+        }
+
+    stat = os.stat(source)
+    return {
+        "source": source,
+        "size": stat.st_size,
+        "etag": f"mtime:{int(stat.st_mtime)}",
+    }
+
+
+def ensure_manifest(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+                target_table text NOT NULL,
+                source text NOT NULL,
+                source_size bigint NOT NULL,
+                source_etag text NOT NULL,
+                chunk_size integer NOT NULL,
+                chunk_index integer NOT NULL,
+                row_count integer NOT NULL,
+                status text NOT NULL,
+                loaded_at timestamptz NOT NULL DEFAULT now(),
+                PRIMARY KEY (target_table, chunk_index)
+            )
+        """))
+
+
+def completed_chunks(engine, table: str, fingerprint: dict, chunk_size: int) -> dict:
+    """Return {chunk_index: row_count} already loaded into `table` from this exact source."""
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"""
+            SELECT chunk_index, row_count
+            FROM {MANIFEST_TABLE}
+            WHERE target_table = :table
+              AND source = :source
+              AND source_size = :size
+              AND source_etag = :etag
+              AND chunk_size = :chunk_size
+              AND status = 'loaded'
+        """), {"table": table, "chunk_size": chunk_size, **fingerprint})
+        return dict(rows.fetchall())
+
+
+def reset_manifest(engine, table: str):
+    """Forget every chunk recorded for `table` (a fresh load is starting)."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"DELETE FROM {MANIFEST_TABLE} WHERE target_table = :table"),
+            {"table": table},
+        )
+
+
+def chunk_recorder(table: str, fingerprint: dict, chunk_size: int):
+    """Build the callback that records a chunk inside the transaction that loaded it."""
+    def record(conn, chunk_index: int, row_count: int):
+        conn.execute(text(f"""
+            INSERT INTO {MANIFEST_TABLE} (
+                target_table, source, source_size, source_etag,
+                chunk_size, chunk_index, row_count, status
+            )
+            VALUES (:table, :source, :size, :etag, :chunk_size, :chunk_index, :row_count, 'loaded')
+        """), {
+            "table": table,
+            "chunk_size": chunk_size,
+            "chunk_index": chunk_index,
+            "row_count": row_count,
+            **fingerprint,
+        })
+    return record
+
+
+def mark_published(engine, table: str):
+    """Mark the recorded chunks as swapped into the live table."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"UPDATE {MANIFEST_TABLE} SET status = 'published' WHERE target_table = :table"),
+            {"table": table},
+        )
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Per-load quality profile kept in the target database next to the manifest."""
+
+import sys
+import uuid
+from pathlib import Path
+
+from sqlalchemy import text
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.quality_profile import PROFILE_COLUMNS, QualityProfile
+from pg_load import month_bounds
+
+PROFILE_TABLE = "load_profile"
+
+# Same names in the green and yellow files
+FARE_COLUMNS = ["fare_amount", "total_amount"]
+ZONE_COLUMNS = ["PULocationID", "DOLocationID"]
+
+
+def month_profile(pickup_column: str, year: int, month: int) -> QualityProfile:
+    """Profile for one month's load; pickups outside the month are out of window."""
+    return QualityProfile(pickup_column, [month_bounds(year, month)], FARE_COLUMNS, ZONE_COLUMNS)
+
+
+def profile_chunks(chunks, profile: QualityProfile):
+    """Pass (chunk_index, chunk) pairs through, folding each chunk into `profile` on the way."""
+    for chunk_index, chunk in chunks:
+        profile.update(chunk)
+        yield chunk_index, chunk
+
+
+def ensure_profile_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {PROFILE_TABLE} (
+                run_id text NOT NULL,
+                target_table text NOT NULL,
+                source text NOT NULL,
+                column_name text NOT NULL,
+                row_count bigint NOT NULL,
+                null_count bigint NOT NULL,
+                min_value text,
+                max_value text,
+                negative_count bigint,
+                out_of_window_count bigint,
+                unknown_zone_count bigint,
+                profiled_at timestamptz NOT NULL DEFAULT now(),
+                PRIMARY KEY (run_id, column_name)
+            )
+        """))
+
+
+def save_profile(engine, table: str, source: str, profile: QualityProfile) -> str:
+    """Store a run's profile (rows read this run, before out-of-month rows were dropped)."""
+    ensure_profile_table(engine)
+    run_id = uuid.uuid4().hex
+    columns = ", ".join(PROFILE_COLUMNS)
+    values = ", ".join(f":{c}" for c in PROFILE_COLUMNS)
+    records = profile.records()
+    if records:
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"""
+                    INSERT INTO {PROFILE_TABLE} (run_id, target_table, source, {columns})
+                    VALUES (:run_id, :table, :source, {values})
+                """),
+                [{"run_id": run_id, "table": table, "source": source, **r} for r in records],
+            )
+    return run_id
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""Helpers shared by the ingest scripts for writing chunks into PostgreSQL."""
+
+import io
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from sqlalchemy import inspect, text
+
+# "copy" streams each chunk with COPY ... FROM STDIN,
+# "insert" is the original DataFrame.to_sql path (parameterized INSERTs)
+LOAD_METHODS = ["copy", "insert"]
+
+
+def quote_ident(name: str) -> str:
+    """Quote a PostgreSQL identifier the same way to_sql names columns."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+# Arrow integer/string types as pandas nullable dtypes, so every chunk
+# converts to the same dtypes whether or not it happens to contain nulls
+NULLABLE_DTYPES = {
+    pa.int8(): pd.Int8Dtype(),
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+    pa.string(): pd.StringDtype(),
+    pa.large_string(): pd.StringDtype(),
+}
+
+
+def as_frame(chunk) -> pd.DataFrame:
+    """Return a chunk as a pandas DataFrame with nullable dtypes; frames pass through unchanged."""
+    if isinstance(chunk, (pa.Table, pa.RecordBatch)):
+        return chunk.to_pandas(types_mapper=NULLABLE_DTYPES.get)
+    return chunk
+
+
+def as_arrow(df):
+    """Return a chunk as an Arrow table; Arrow chunks pass through unchanged."""
+    if isinstance(df, (pa.Table, pa.RecordBatch)):
+        return df
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def column_names(df) -> list:
+    if isinstance(df, (pa.Table, pa.RecordBatch)):
+        return df.schema.names
+    return list(df.columns)
+
+
+def frame_to_csv(df) -> io.BytesIO:
+    """Serialize a chunk into an in-memory, headerless CSV buffer for COPY.
+
+    Going through Arrow keeps nullable Int64 columns integral (no "1.0"),
+    writes NA/NaT as unquoted empty fields (NULL for COPY csv) and always
+    quotes strings, so an empty store_and_fwd_flag stays distinct from NULL.
+    Arrow chunks (from the arrow CSV engine) are written without any pandas
+    conversion.
+    """
+    table = as_arrow(df)
+    buf = io.BytesIO()
+    pacsv.write_csv(
+        table,
+        buf,
+        write_options=pacsv.WriteOptions(include_header=False),
+    )
+    buf.seek(0)
+    return buf
+
+
+def copy_frame(df, table: str, conn):
+    """Load a chunk with COPY ... FROM STDIN (CSV format) inside `conn`'s transaction."""
+    buf = frame_to_csv(df)
+    columns = ", ".join(quote_ident(c) for c in column_names(df))
+    sql = f"COPY {quote_ident(table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+    cur = conn.connection.cursor()
+    try:
+        cur.copy_expert(sql, buf)
+    finally:
+        cur.close()
+
+
+def write_chunk(df, table: str, engine, method: str = "copy", record=None, chunk_index=None):
+    """Append one chunk to `table` using the selected load method.
+
+    If `record` is given it is called as record(conn, chunk_index, rows) in the
+    same transaction, so a chunk and its manifest entry commit together.
+    """
+    if method not in LOAD_METHODS:
+        raise ValueError(f"Unknown load method: {method!r} (expected one of {LOAD_METHODS})")
+
+    with engine.begin() as conn:
+        if method == "copy":
+            copy_frame(df, table, conn)
+        else:
+            # to_sql is the one path that needs pandas
+            df = as_frame(df)
+            df.to_sql(
+                name=table,
+                con=conn,
+                if_exists="append",
+                index=False,
+            )
+        if record is not None:
+            record(conn, chunk_index, len(df))
+
+
+def write_chunks(
+    chunks,
+    table: str,
+    engine,
+    method: str = "copy",
+    workers: int = 1,
+    record=None,
+    stats=None,
+):
+    """Write (chunk_index, frame) pairs to `table`, yielding each row count once committed.
+
+    With workers > 1 chunks are fanned out to that many connections. At most
+    2 * workers chunks are held in memory, so a fast reader cannot run ahead.
+    Chunks may complete out of order. `stats` (a csv_pipeline.StageStats) is
+    charged with the time spent writing.
+    """
+    def _write(chunk_index, df):
+        with stats.busy() if stats is not None else nullcontext():
+            write_chunk(df, table, engine, method, record, chunk_index)
+        return len(df)
+
+    if workers <= 1:
+        for chunk_index, df in chunks:
+            yield _write(chunk_index, df)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for chunk_index, df in chunks:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(_write, chunk_index, df))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def table_exists(engine, table: str) -> bool:
+    return inspect(engine).has_table(table)
+
+
+def month_bounds(year: int, month: int) -> tuple:
+    """[start, end) of a month, as datetimes."""
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+def partition_name(table: str, year: int, month: int) -> str:
+    return f"{table}_{year}_{month:02d}"
+
+
+def pg_type(dtype) -> str:
+    """PostgreSQL type for a pandas dtype, used when a later month adds a column."""
+    kind = getattr(dtype, "kind", "O")
+    if kind in "iu":
+        return "BIGINT"
+    if kind == "f":
+        return "DOUBLE PRECISION"
+    if kind == "M":
+        return "TIMESTAMP WITHOUT TIME ZONE"
+    if kind == "b":
+        return "BOOLEAN"
+    return "TEXT"
+
+
+def is_partitioned(engine, table: str) -> bool:
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": quote_ident(table)},
+        ).scalar() is True
+
+
+def index_name(table: str, column: str) -> str:
+    return f"{table}_{column}_idx"
+
+
+def ensure_partitioned_table(df_empty, table: str, engine, partition_column: str, index_columns=()):
+    """Create `table` RANGE-partitioned on `partition_column`, or add columns it lacks.
+
+    Indexes are declared on the parent only; each partition brings its own,
+    built after its bulk load, and they are attached when the partition is.
+    """
+    if not table_exists(engine, table):
+        ddl = pd.io.sql.get_schema(df_empty, table, con=engine).strip()
+        with engine.begin() as conn:
+            conn.execute(text(f"{ddl} PARTITION BY RANGE ({quote_ident(partition_column)})"))
+    elif not is_partitioned(engine, table):
+        raise ValueError(
+            f"Table {table} exists but is not partitioned by month; "
+            f"drop or rename it before loading months into it"
+        )
+
+    existing = {c["name"] for c in inspect(engine).get_columns(table)}
+    with engine.begin() as conn:
+        for column, dtype in df_empty.dtypes.items():
+            if column not in existing:
+                conn.execute(text(
+                    f"ALTER TABLE {quote_ident(table)} "
+                    f"ADD COLUMN IF NOT EXISTS {quote_ident(column)} {pg_type(dtype)}"
+                ))
+        for column in index_columns:
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {quote_ident(index_name(table, column))} "
+                f"ON {quote_ident(table)} ({quote_ident(column)})"
+            ))
+
+
+def staging_name(table: str) -> str:
+    return f"{table}__staging"
+
+
+def create_staging_table(table: str, partition: str, engine) -> str:
+    """Create an empty UNLOGGED, index-free table shaped like `table` to load `partition` into."""
+    staging = staging_name(partition)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {quote_ident(staging)}"))
+        conn.execute(text(
+            f"CREATE UNLOGGED TABLE {quote_ident(staging)} "
+            f"(LIKE {quote_ident(table)} INCLUDING DEFAULTS)"
+        ))
+    return staging
+
+
+def add_missing_columns(conn, table: str, target: str):
+    """Add to `target` every column of `table` it lacks, with the same type."""
+    missing = conn.execute(
+        text(
+            "SELECT a.attname, format_type(a.atttypid, a.atttypmod) "
+            "FROM pg_attribute a "
+            "WHERE a.attrelid = to_regclass(:table) AND a.attnum > 0 AND NOT a.attisdropped "
+            "AND a.attname NOT IN ("
+            "  SELECT attname FROM pg_attribute "
+            "  WHERE attrelid = to_regclass(:target) AND attnum > 0 AND NOT attisdropped"
+            ") ORDER BY a.attnum"
+        ),
+        {"table": quote_ident(table), "target": quote_ident(target)},
+    ).fetchall()
+    for column, type_ in missing:
+        conn.execute(text(
+            f"ALTER TABLE {quote_ident(target)} ADD COLUMN {quote_ident(column)} {type_}"
+        ))
+
+
+def swap_in_partition(table: str, partition_column: str, year: int, month: int, engine, index_columns=()):
+    """Index the loaded staging table and make it the month's partition of `table`.
+
+    The staging table is made LOGGED, indexed and given a CHECK constraint
+    matching the month's bounds while readers still see the old partition,
+    so ATTACH PARTITION needs no validation scan and adopts the indexes as
+    they are. The old partition, if any, is detached and dropped in the same
+    transaction as the attach; the other months are untouched.
+
+    Another month may have added columns to `table` since the staging table
+    was cloned from it; they are added to the staging table (all NULL) under
+    the same lock as the attach, so the column sets match.
+    """
+    partition = partition_name(table, year, month)
+    staging = staging_name(partition)
+    start, end = month_bounds(year, month)
+    bounds = f"FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    check = f"{staging}_bounds"
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {quote_ident(staging)} SET LOGGED"))
+        for column in index_columns:
+            conn.execute(text(
+                f"CREATE INDEX {quote_ident(index_name(staging, column))} "
+                f"ON {quote_ident(staging)} ({quote_ident(column)})"
+            ))
+        conn.execute(text(
+            f"ALTER TABLE {quote_ident(staging)} ADD CONSTRAINT {quote_ident(check)} "
+            f"CHECK ({quote_ident(partition_column)} IS NOT NULL "
+            f"AND {quote_ident(partition_column)} >= '{start:%Y-%m-%d}' "
+            f"AND {quote_ident(partition_column)} < '{end:%Y-%m-%d}')"
+        ))
+
+    with engine.begin() as conn:
+        # Held to the commit: no ADD COLUMN on the parent can slip in before the attach
+        conn.execute(text(f"LOCK TABLE {quote_ident(table)} IN ACCESS EXCLUSIVE MODE"))
+        add_missing_columns(conn, table, staging)
+        old = conn.execute(
+            text("SELECT to_regclass(:name) IS NOT NULL"),
+            {"name": quote_ident(partition)},
+        ).scalar()
+        if old:
+            conn.execute(text(f"ALTER TABLE {quote_ident(table)} DETACH PARTITION {quote_ident(partition)}"))
+            conn.execute(text(f"DROP TABLE {quote_ident(partition)}"))
+        conn.execute(text(f"ALTER TABLE {quote_ident(staging)} RENAME TO {quote_ident(partition)}"))
+        conn.execute(text(
+            f"ALTER TABLE {quote_ident(table)} ATTACH PARTITION {quote_ident(partition)} "
+            f"FOR VALUES {bounds}"
+        ))
+        conn.execute(text(f"ALTER TABLE {quote_ident(partition)} DROP CONSTRAINT {quote_ident(check)}"))
+        for column in index_columns:
+            conn.execute(text(
+                f"ALTER INDEX {quote_ident(index_name(staging, column))} "
+                f"RENAME TO {quote_ident(index_name(partition, column))}"
+            ))
+
+
+def filter_month(chunk, column: str, year: int, month: int):
+    """Keep only rows whose `column` falls in the month (others have no partition)."""
+    start, end = month_bounds(year, month)
+    if isinstance(chunk, (pa.Table, pa.RecordBatch)):
+        values = chunk.column(column)
+        mask = pc.and_(
+            pc.greater_equal(values, pa.scalar(start, type=values.type)),
+            pc.less(values, pa.scalar(end, type=values.type)),
+        )
+        return chunk.filter(pc.fill_null(mask, False))
+
+    values = chunk[column]
+    mask = (values >= start) & (values < end)
+    return chunk[mask.fillna(False)]
@@ -1,36 +1,64 @@
 import os
 import sys
-import urllib.request
-from concurrent.futures import ThreadPoolExecutor
-from google.cloud import storage
+from pathlib import Path
 from google.api_core.exceptions import NotFound, Forbidden, Conflict
+import click
 import time
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common import download
+from common.gcs_transfer import (
+    Checksums,
+    SyncManifest,
+    print_report,
+    run_pipeline,
+    run_streams,
+    storage_client,
+    stream_to_gcs,
+    upload_to_gcs,
+)
+
 BUCKET_NAME = "kachi_dezoomcamp_hw3_2026"
 
-# Uses GOOGLE_APPLICATION_CREDENTIALS automatically
-client = storage.Client()
+# Uses GOOGLE_APPLICATION_CREDENTIALS automatically (GCS_LOCAL_DIR: local directory instead)
+client = storage_client()
 
 BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_2024-"
 MONTHS = [f"{i:02d}" for i in range(1, 7)]
 DOWNLOAD_DIR = "."
 CHUNK_SIZE = 8 * 1024 * 1024
+MANIFEST_PATH = os.path.join(DOWNLOAD_DIR, f".{BUCKET_NAME}.sync.json")
 
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 bucket = client.bucket(BUCKET_NAME)
 
+def describe(month):
+    """(filename, url, blob) of one month."""
+    filename = f"yellow_tripdata_2024-{month}.parquet"
+    return filename, f"{BASE_URL}{month}.parquet", bucket.blob(filename)
+
 def download_file(month):
-    url = f"{BASE_URL}{month}.parquet"
-    file_path = os.path.join(DOWNLOAD_DIR, f"yellow_tripdata_2024-{month}.parquet")
+    """Download to DOWNLOAD_DIR; return (path, checksums), hashed as the bytes arrive."""
+    filename, url, _ = describe(month)
+    file_path = os.path.join(DOWNLOAD_DIR, filename)
     try:
         print(f"Downloading {url}...")
-        urllib.request.urlretrieve(url, file_path)
+        # Straight to DOWNLOAD_DIR (not via the TLC cache), so --max-disk-mb covers every byte
+        file_path, checksums = download.to_file_hashed(url, file_path, Checksums)
         print(f"Downloaded: {file_path}")
-        return file_path
+        return file_path, checksums.result()
     except Exception as e:
         print(f"Failed to download {url}: {e}")
         return None
 
+def stream_month(month):
+    """Pipe the download straight into a resumable upload; no local file."""
+    _, url, blob = describe(month)
+    return stream_to_gcs(url, blob, CHUNK_SIZE)
+
+def upload_file(file_path, checksums=None):
+    return upload_to_gcs(file_path, bucket.blob(os.path.basename(file_path)), checksums, CHUNK_SIZE)
+
 def create_bucket(bucket_name):
     try:
         client.get_bucket(bucket_name)
@@ -47,38 +75,29 @@ def create_bucket(bucket_name):
             print(f"No permission to create bucket '{bucket_name}'. Check IAM roles.")
             sys.exit(1)
 
-def verify_gcs_upload(blob_name):
-    return storage.Blob(bucket=bucket, name=blob_name).exists(client)
-
-def upload_to_gcs(file_path, max_retries=3):
-    blob_name = os.path.basename(file_path)
-    blob = bucket.blob(blob_name)
-    blob.chunk_size = CHUNK_SIZE
-
-    for attempt in range(max_retries):
-        try:
-            print(f"Uploading {file_path} to {BUCKET_NAME} (Attempt {attempt + 1})...")
-            blob.upload_from_filename(file_path)
-            print(f"Uploaded: gs://{BUCKET_NAME}/{blob_name}")
-
-            if verify_gcs_upload(blob_name):
-                print(f"Verification successful for {blob_name}")
-                return
-            else:
-                print(f"Verification failed for {blob_name}, retrying...")
-        except Exception as e:
-            print(f"Failed to upload {file_path} to GCS: {e}")
-        time.sleep(5)
-
-    print(f"Giving up on {file_path} after {max_retries} attempts.")
-
-if __name__ == "__main__":
+@click.command()
+@click.option('--stream', is_flag=True, help='Pipe each download straight into GCS without writing it to disk')
+@click.option('--download-workers', default=4, type=int, help='Downloads running at once (with --stream: streams)')
+@click.option('--upload-workers', default=4, type=int, help='Uploads running at once')
+@click.option('--max-disk-mb', default=2048, type=int, help='Cap on downloaded-but-not-yet-uploaded MiB on disk')
+@click.option('--sync', is_flag=True, help='Skip files whose source and bucket object are unchanged since the last run')
+@click.option('--manifest', default=MANIFEST_PATH, help='Local sync manifest (JSON) used by --sync')
+def main(stream, download_workers, upload_workers, max_disk_mb, sync, manifest):
     create_bucket(BUCKET_NAME)
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        file_paths = list(executor.map(download_file, MONTHS))
-
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        list(executor.map(upload_to_gcs, filter(None, file_paths)))
+    t0 = time.perf_counter()
+    if stream:
+        results = run_streams(
+            MONTHS, describe, stream_month, download_workers, SyncManifest(manifest) if sync else None,
+        )
+    else:
+        # Each month is uploaded as soon as it is downloaded, then deleted locally
+        results = run_pipeline(
+            MONTHS, describe, download_file, upload_file,
+            download_workers, upload_workers, max_disk_mb * 1024**2,
+            SyncManifest(manifest) if sync else None,
+        )
+    print_report(results, time.perf_counter() - t0)
 
-    print("All files processed and verified.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
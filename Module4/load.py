@@ -1,15 +1,30 @@
 import os
 import sys
-import urllib.request
-from concurrent.futures import ThreadPoolExecutor
-from google.cloud import storage
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
 from google.api_core.exceptions import NotFound, Forbidden, Conflict
+import click
 import time
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common import download
+from common.gcs_transfer import (
+    Checksums,
+    SyncManifest,
+    print_report,
+    run_pipeline,
+    run_streams,
+    storage_client,
+    stream_to_gcs,
+    upload_to_gcs,
+)
+from common.tlc_parquet import csv_to_parquet, hive_path
+
 BUCKET_NAME = "kachi_dezoomcamp_hw4_2026"
 
-# Uses GOOGLE_APPLICATION_CREDENTIALS automatically
-client = storage.Client()
+# Uses GOOGLE_APPLICATION_CREDENTIALS automatically (GCS_LOCAL_DIR: local directory instead)
+client = storage_client()
 
 # DataTalksClub NYC TLC Data repository (GitHub Releases)
 # Pattern:
@@ -25,6 +40,9 @@ MONTHS = [f"{i:02d}" for i in range(1, 13)]
 
 DOWNLOAD_DIR = "."
 CHUNK_SIZE = 8 * 1024 * 1024
+MANIFEST_PATH = os.path.join(DOWNLOAD_DIR, f".{BUCKET_NAME}.sync.json")
+# --parquet uploads to PARQUET_PREFIX/taxi=<taxi>/year=<year>/month=<month>/
+PARQUET_PREFIX = "trips"
 
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 bucket = client.bucket(BUCKET_NAME)
@@ -36,22 +54,60 @@ def iter_tasks():
             for month in MONTHS:
                 yield taxi, year, month
 
-def download_file(task):
+def blob_name_for(base):
+    """taxi/year/filename, e.g. yellow/2019/yellow_tripdata_2019-01.csv.gz
+
+    Parquet files go to Hive-style partitions instead:
+    trips/taxi=yellow/year=2019/month=01/yellow_tripdata_2019-01.parquet
+    """
+    taxi = base.split("_", 1)[0]
+    year, month = base.split("_tripdata_", 1)[1].split(".", 1)[0].split("-", 1)
+    if base.endswith(".parquet"):
+        return hive_path(taxi, year, month, PARQUET_PREFIX)
+    return f"{taxi}/{year}/{base}"
+
+def describe(task, parquet=False):
+    """(filename, url, blob) of one (taxi, year, month) task."""
     taxi, year, month = task
     url = BASE_URL_TMPL.format(taxi=taxi, year=year, month=month)
-
     filename = f"{taxi}_tripdata_{year}-{month}.csv.gz"
+    blob_file = f"{taxi}_tripdata_{year}-{month}.parquet" if parquet else filename
+    return filename, url, bucket.blob(blob_name_for(blob_file))
+
+def download_file(task, hashed=True):
+    """Download to DOWNLOAD_DIR; return the path, with its checksums if `hashed`.
+
+    Only a file uploaded as downloaded needs them; a converted one is hashed
+    after conversion instead.
+    """
+    filename, url, _ = describe(task)
     file_path = os.path.join(DOWNLOAD_DIR, filename)
 
     try:
         print(f"Downloading {url} ...")
-        urllib.request.urlretrieve(url, file_path)
+        # Straight to DOWNLOAD_DIR (not via the TLC cache), so --max-disk-mb covers every byte
+        if not hashed:
+            download.to_file(url, file_path)
+            print(f"Downloaded: {file_path}")
+            return file_path
+        file_path, checksums = download.to_file_hashed(url, file_path, Checksums)
         print(f"Downloaded: {file_path}")
-        return file_path
+        return file_path, checksums.result()
     except Exception as e:
         print(f"Failed to download {url}: {e}")
         return None
 
+def convert_file(pool, task, file_path):
+    """Convert a downloaded CSV.gz to Parquet on the process pool; return the Parquet path."""
+    parquet_path = file_path.removesuffix(".csv.gz") + ".parquet"
+    try:
+        rows = pool.submit(csv_to_parquet, file_path, parquet_path).result()
+        print(f"Converted: {parquet_path} ({rows:,} rows)")
+        return parquet_path
+    except Exception as e:
+        print(f"Failed to convert {file_path}: {e}")
+        return None
+
 def create_bucket(bucket_name):
     try:
         client.get_bucket(bucket_name)
@@ -68,52 +124,50 @@ def create_bucket(bucket_name):
             print(f"No permission to create bucket '{bucket_name}'. Check IAM roles.")
             sys.exit(1)
 
-def verify_gcs_upload(blob_name):
-    return storage.Blob(bucket=bucket, name=blob_name).exists(client)
-
-def upload_to_gcs(file_path, max_retries=3, delete_local=True):
-    base = os.path.basename(file_path)  # yellow_tripdata_2019-01.csv.gz
-    taxi = base.split("_", 1)[0]        
-    year = base.split("_tripdata_", 1)[1].split("-", 1)[0]
-    blob_name = f"{taxi}/{year}/{base}"
-
-    blob = bucket.blob(blob_name)
-    blob.chunk_size = CHUNK_SIZE
-
-    for attempt in range(max_retries):
-        try:
-            print(f"Uploading {file_path} to gs://{BUCKET_NAME}/{blob_name} (Attempt {attempt + 1})...")
-            blob.upload_from_filename(file_path)
-            print(f"Uploaded: gs://{BUCKET_NAME}/{blob_name}")
-
-            if verify_gcs_upload(blob_name):
-                print(f"Verification successful for {blob_name}")
-
-                # 🔥 SAFE DELETE
-                if delete_local and os.path.exists(file_path):
-                    os.remove(file_path)
-                    print(f"Deleted local file: {file_path}")
-
-                return
-            else:
-                print(f"Verification failed for {blob_name}, retrying...")
-
-        except Exception as e:
-            print(f"Failed to upload {file_path} to GCS: {e}")
-
-        time.sleep(5)
-
-    print(f"Giving up on {file_path} after {max_retries} attempts.")
-
-if __name__ == "__main__":
+def stream_task(task):
+    """Pipe the download straight into a resumable upload; no local file."""
+    _, url, blob = describe(task)
+    return stream_to_gcs(url, blob, CHUNK_SIZE)
+
+def upload_file(file_path, checksums=None):
+    # yellow_tripdata_2019-01.csv.gz; the pipeline deletes the local file afterwards
+    blob = bucket.blob(blob_name_for(os.path.basename(file_path)))
+    return upload_to_gcs(file_path, blob, checksums, CHUNK_SIZE)
+
+@click.command()
+@click.option('--stream', is_flag=True, help='Pipe each download straight into GCS without writing it to disk')
+@click.option('--download-workers', default=4, type=int, help='Downloads running at once (with --stream: streams)')
+@click.option('--upload-workers', default=4, type=int, help='Uploads running at once')
+@click.option('--max-disk-mb', default=2048, type=int, help='Cap on downloaded-but-not-yet-uploaded MiB on disk')
+@click.option('--sync', is_flag=True, help='Skip files whose source and bucket object are unchanged since the last run')
+@click.option('--manifest', default=MANIFEST_PATH, help='Local sync manifest (JSON) used by --sync')
+@click.option('--parquet', is_flag=True, help=f'Convert each CSV.gz to typed Parquet under {PARQUET_PREFIX}/taxi=/year=/month=')
+@click.option('--convert-workers', default=os.cpu_count(), type=int, help='Processes converting CSV.gz to Parquet')
+def main(stream, download_workers, upload_workers, max_disk_mb, sync, manifest, parquet, convert_workers):
+    if stream and parquet:
+        raise click.UsageError("--stream uploads the source bytes as-is; it cannot be combined with --parquet")
     create_bucket(BUCKET_NAME)
 
     tasks = list(iter_tasks())
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        file_paths = list(executor.map(download_file, tasks))
+    if stream:
+        t0 = time.perf_counter()
+        results = run_streams(
+            tasks, describe, stream_task, download_workers, SyncManifest(manifest) if sync else None,
+        )
+        print_report(results, time.perf_counter() - t0)
+        return
 
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        list(executor.map(upload_to_gcs, filter(None, file_paths)))
+    # Each file is uploaded as soon as it is downloaded (and converted), then deleted locally
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=convert_workers if parquet else 1) as pool:
+        results = run_pipeline(
+            tasks, partial(describe, parquet=parquet), partial(download_file, hashed=not parquet), upload_file,
+            download_workers, upload_workers, max_disk_mb * 1024**2,
+            SyncManifest(manifest) if sync else None,
+            partial(convert_file, pool) if parquet else None,
+        )
+    print_report(results, time.perf_counter() - t0)
 
-    print("All files processed and verified.")
+if __name__ == "__main__":
+    main()
@@ -17,10 +17,10 @@ columns:
     type: timestamp
     description: "When the meter was disengaged"
   - name: pickup_location_id
-    type: integer
+    type: smallint
     description: "Pickup TLC Taxi Zone ID"
   - name: dropoff_location_id
-    type: integer
+    type: smallint
     description: "Dropoff TLC Taxi Zone ID"
   - name: fare_amount
     type: double
@@ -29,7 +29,7 @@ columns:
     type: double
     description: "Total amount charged"
   - name: payment_type
-    type: integer
+    type: tinyint
     description: "Payment type code"
   - name: taxi_type
     type: string
@@ -37,17 +37,112 @@ columns:
   - name: extracted_at
     type: timestamp
     description: "UTC timestamp when data was pulled"
+
+# Quality checks on the appended rows live on ingestion.trips_profile, built
+# from the profile each run writes to the `profile_dir` pipeline variable.
 @bruin"""
 
+import email.utils
+import json
 import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from io import BytesIO
+from pathlib import Path
 
+import duckdb
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import requests
+import yaml
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[5]))
+from common.quality_profile import PROFILE_COLUMNS, QualityProfile
+from common.remote_parquet import CONCURRENCY as RANGE_CONCURRENCY, RemoteParquet
 
 BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data"
 
+# Months checked and opened at once; override with the `fetch_concurrency` pipeline variable
+DEFAULT_FETCH_CONCURRENCY = 4
+
+# Row groups read ahead of the one being converted and appended; together
+# with those two, the bound on the row groups held in memory at once
+PREFETCH_ROW_GROUPS = 2
+_DONE = object()
+
+# Per pickup day: rows in ingestion.trips and when they were extracted. Built
+# by the downstream ingestion.trips_state asset, so it only reflects loads
+# Bruin committed; this asset only reads it.
+STATE_TABLE = "ingestion.trips_state"
+
+# Each run's quality profile is written here as one Parquet file, relative to
+# the working directory like the read_parquet() in ingestion.trips_profile;
+# override with the `profile_dir` pipeline variable
+DEFAULT_PROFILE_DIR = "data/trips_profile"
+PROFILE_SCHEMA = pa.schema([
+    ("extracted_at", pa.timestamp("us", tz="UTC")),
+    ("column_name", pa.string()),
+    ("row_count", pa.int64()),
+    ("null_count", pa.int64()),
+    ("min_value", pa.string()),
+    ("max_value", pa.string()),
+    ("negative_count", pa.int64()),
+    ("out_of_window_count", pa.int64()),
+    ("unknown_zone_count", pa.int64()),
+])
+
+# The warehouse is the DuckDB file of this connection in .bruin.yml
+# (TRIPS_WAREHOUSE overrides the path)
+CONNECTION = "duckdb_local"
+# Read attempts while another process holds the warehouse's write lock
+LOCK_RETRIES = 10
+
+# The only source columns the asset emits; nothing else is decoded
+SOURCE_COLUMNS = [
+    "tpep_pickup_datetime",
+    "tpep_dropoff_datetime",
+    "PULocationID",
+    "DOLocationID",
+    "fare_amount",
+    "total_amount",
+    "payment_type",
+]
+
+# Emitted columns (the asset's stable schema) and the source column feeding each.
+# Zone IDs (1-265) and payment codes (0-6) fit small ints; the per-run constants
+# are one-entry dictionaries, so they cost a byte per row instead of a value each.
+# DuckDB scans all of these from the Arrow buffers as SMALLINT/TINYINT/VARCHAR/TIMESTAMPTZ.
+OUTPUT_SCHEMA = pa.schema([
+    ("pickup_datetime", pa.timestamp("us")),
+    ("dropoff_datetime", pa.timestamp("us")),
+    ("pickup_location_id", pa.int16()),
+    ("dropoff_location_id", pa.int16()),
+    ("fare_amount", pa.float64()),
+    ("total_amount", pa.float64()),
+    ("payment_type", pa.int8()),
+    ("taxi_type", pa.dictionary(pa.int8(), pa.string())),
+    ("extracted_at", pa.dictionary(pa.int8(), pa.timestamp("us", tz="UTC"))),
+])
+OUTPUT_SOURCES = {
+    "pickup_datetime": "tpep_pickup_datetime",
+    "dropoff_datetime": "tpep_dropoff_datetime",
+    "pickup_location_id": "PULocationID",
+    "dropoff_location_id": "DOLocationID",
+    "fare_amount": "fare_amount",
+    "total_amount": "total_amount",
+    "payment_type": "payment_type",
+}
+
+# Profiled per run: amounts that should not be negative, TLC zone ID columns
+FARE_COLUMNS = ["fare_amount", "total_amount"]
+ZONE_COLUMNS = ["pickup_location_id", "dropoff_location_id"]
+
 
 def _month_starts(start_date: str, end_date: str) -> list[tuple[int, int]]:
     start = pd.Timestamp(start_date)
@@ -63,81 +158,367 @@ def _month_starts(start_date: str, end_date: str) -> list[tuple[int, int]]:
     return months
 
 
-def _read_parquet_from_url(url: str) -> pd.DataFrame:
-    r = requests.get(url, timeout=120)
-    r.raise_for_status()
-    return pd.read_parquet(BytesIO(r.content))
+def _bruin_vars() -> dict:
+    return json.loads(os.environ.get("BRUIN_VARS") or "{}")
+
+
+def _fetch_concurrency() -> int:
+    return max(1, int(_bruin_vars().get("fetch_concurrency", DEFAULT_FETCH_CONCURRENCY)))
+
+
+def _pooled_session(concurrency: int) -> requests.Session:
+    """One session whose connection pool fits `concurrency` months plus one month's range requests."""
+    session = requests.Session()
+    size = concurrency + RANGE_CONCURRENCY
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _bruin_config():
+    """Path of the project's .bruin.yml (the nearest above this file), or None."""
+    return next(
+        (p / ".bruin.yml" for p in Path(__file__).resolve().parents if (p / ".bruin.yml").exists()),
+        None,
+    )
+
+
+def _warehouse() -> str:
+    """Path of the DuckDB file behind CONNECTION in the project's .bruin.yml.
+
+    The environment is BRUIN_ENVIRONMENT if set, else the file's
+    default_environment; relative paths are relative to .bruin.yml.
+    """
+    if os.environ.get("TRIPS_WAREHOUSE"):
+        return os.environ["TRIPS_WAREHOUSE"]
+    config = _bruin_config()
+    if config is None:
+        raise FileNotFoundError(f"No .bruin.yml above {__file__}; set TRIPS_WAREHOUSE")
+    settings = yaml.safe_load(config.read_text())
+    env = os.environ.get("BRUIN_ENVIRONMENT") or settings.get("default_environment") or "default"
+    for conn in settings["environments"][env]["connections"].get("duckdb", []):
+        if conn["name"] == CONNECTION:
+            return str(config.parent / conn["path"])
+    raise KeyError(f"No duckdb connection {CONNECTION!r} in environment {env!r} of {config}")
+
+
+def _load_state(start_ts, end_ts) -> dict:
+    """{pickup day: extracted_at (epoch seconds)} of the committed days in [start_ts, end_ts).
+
+    The warehouse is opened read-only, retrying while another process (Bruin
+    loading an asset) holds the write lock. No warehouse or no state table
+    yet means nothing is ingested.
+    """
+    path = _warehouse()
+    if not os.path.exists(path):
+        return {}
+    for attempt in range(LOCK_RETRIES):
+        try:
+            con = duckdb.connect(path, read_only=True)
+            break
+        except duckdb.IOException as e:
+            if attempt == LOCK_RETRIES - 1:
+                raise
+            print(f"Warehouse busy ({e}); retrying")
+            time.sleep(min(2 ** attempt, 30))
+    with con:
+        try:
+            rows = con.execute(
+                f"SELECT pickup_date, epoch(extracted_at) FROM {STATE_TABLE} "
+                "WHERE pickup_date >= ? AND pickup_date < ?",
+                [start_ts.date(), end_ts.date()],
+            ).fetchall()
+        except duckdb.CatalogException:
+            return {}
+    return {pd.Timestamp(day): extracted_at for day, extracted_at in rows}
+
+
+def _merge(ranges: list) -> list:
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _uncovered(start, end, covered: list) -> list:
+    """Parts of [start, end) not in any of the `covered` ranges."""
+    gaps = []
+    for cov_start, cov_end in _merge(covered):
+        if cov_end <= start or cov_start >= end:
+            continue
+        if cov_start > start:
+            gaps.append((start, cov_start))
+        start = max(start, cov_end)
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+def _profile_dir() -> Path:
+    return Path(_bruin_vars().get("profile_dir", DEFAULT_PROFILE_DIR))
+
+
+def _save_profile(profile: QualityProfile, extracted_at) -> Path:
+    """Write the run's profile, one row per column, as <profile_dir>/<extracted_at>.parquet.
+
+    A file rather than a warehouse table, so the asset never needs the
+    warehouse's write lock; ingestion.trips_profile loads the files.
+    """
+    records = profile.records()
+    table = pa.Table.from_pydict(
+        {
+            "extracted_at": [extracted_at] * len(records),
+            **{c: [r[c] for r in records] for c in PROFILE_COLUMNS},
+        },
+        schema=PROFILE_SCHEMA,
+    )
+    directory = _profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{extracted_at:%Y%m%dT%H%M%S%fZ}.parquet"
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def _plan_month(session, url: str, window: tuple, state: dict):
+    """Decide what to pull for one month, reading its footer only if something is missing.
 
+    Returns None for unpublished months, else the uncovered parts ("gaps")
+    of the month's share of the run window and, when there are gaps, the
+    opened remote file. A day counts as covered when it was extracted after
+    the file was last modified upstream; days extracted from an older
+    version of the file are ingested again.
+    """
+    resp = session.head(url, allow_redirects=True, timeout=60)
+    # 404 = missing; 403 = commonly returned for not-yet-published months
+    if resp.status_code in (403, 404):
+        return None
+    resp.raise_for_status()
+    last_modified = resp.headers.get("Last-Modified")
+    modified_at = email.utils.parsedate_to_datetime(last_modified).timestamp() if last_modified else None
 
-def materialize() -> pd.DataFrame:
+    start, end = window
+    days = {day: at for day, at in state.items() if start <= day < end}
+    covered = [
+        (day, day + pd.Timedelta(days=1))
+        for day, at in days.items()
+        # Last-Modified has whole seconds: the file may have changed up to 1s after it
+        if modified_at is None or at >= modified_at + 1
+    ]
+    plan = {
+        "url": url,
+        "changed": len(covered) < len(days),
+        "gaps": _uncovered(start, end, covered),
+    }
+    if plan["gaps"]:
+        plan["parquet"] = RemoteParquet(url, session=session)
+    return plan
+
+
+def _row_groups_in_window(pf, column: str, start_ts, end_ts) -> list[int]:
+    """Row groups whose min/max statistics for `column` overlap [start_ts, end_ts)."""
+    idx = pf.schema_arrow.get_field_index(column)
+    keep = []
+    for rg in range(pf.metadata.num_row_groups):
+        stats = pf.metadata.row_group(rg).column(idx).statistics
+        if stats is not None and stats.has_min_max:
+            if pd.Timestamp(stats.max) < start_ts or pd.Timestamp(stats.min) >= end_ts:
+                continue
+        keep.append(rg)
+    return keep
+
+
+def _read_row_groups(rp: RemoteParquet, start_ts, end_ts):
+    """Yield the in-window row groups of a remote month, one Arrow table at a time.
+
+    Only the footer and the needed column chunks are fetched, with range requests.
+    """
+    columns = [c for c in SOURCE_COLUMNS if c in rp.schema_arrow.names]
+    row_groups = _row_groups_in_window(rp, "tpep_pickup_datetime", start_ts, end_ts)
+    print(
+        f"{rp.url}: reading {len(row_groups)} of {rp.metadata.num_row_groups} row group(s), "
+        f"{len(columns)} of {len(rp.schema_arrow.names)} column(s)"
+    )
+    for rg in row_groups:
+        yield rp.read_row_group(rg, columns=columns)
+    print(rp.summary())
+
+
+def _month_tables(plans):
+    """Yield (plan, table) for each in-window row group of the planned months, in month order.
+
+    Each month ends with (plan, None). Months with nothing to read are
+    reported and skipped.
+    """
+    for future in plans:
+        plan = future.result()
+        if plan is None:
+            continue
+        if not plan["gaps"]:
+            print(f"{plan['url']}: window already ingested, skipped")
+            continue
+        if plan["changed"]:
+            print(f"{plan['url']}: changed upstream, re-ingesting days extracted before the change")
+        gaps = plan["gaps"]
+        for table in _read_row_groups(plan["parquet"], gaps[0][0], gaps[-1][1]):
+            yield plan, table
+        yield plan, None
+
+
+def _read_ahead(items, maxsize: int):
+    """Iterate `items` on a worker thread, at most `maxsize` items ahead of the caller.
+
+    An exception in the worker is re-raised here; closing the generator
+    early stops the worker at its next item.
+    """
+    q = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def work():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((None, e))
+        else:
+            put((_DONE, None))
+
+    worker = threading.Thread(target=work, name="prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item, error = q.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+
+def _constant(value, type_: pa.DictionaryType, n: int) -> pa.DictionaryArray:
+    """`n` rows of one value, stored once as a dictionary entry."""
+    indices = pa.repeat(pa.scalar(0, type_.index_type), n)
+    return pa.DictionaryArray.from_arrays(indices, pa.array([value], type_.value_type))
+
+
+def _to_trips(table: pa.Table, taxi_type: str, extracted_at, gaps: list, profile: QualityProfile) -> pa.Table:
+    """Standardize one source row group to OUTPUT_SCHEMA, keeping only rows in `gaps`.
+
+    Only the kept rows, the ones appended, are folded into `profile`.
+    """
+    n = table.num_rows
+    columns = []
+    for field in OUTPUT_SCHEMA:
+        if field.name == "taxi_type":
+            columns.append(_constant(taxi_type, field.type, n))
+        elif field.name == "extracted_at":
+            columns.append(_constant(extracted_at, field.type, n))
+        elif OUTPUT_SOURCES[field.name] in table.column_names:
+            columns.append(table.column(OUTPUT_SOURCES[field.name]).cast(field.type))
+        else:
+            columns.append(pa.nulls(n, field.type))
+    trips = pa.Table.from_arrays(columns, schema=OUTPUT_SCHEMA)
+
+    # Row groups were pruned by statistics; drop the remaining rows outside the gaps
+    pickup = trips.column("pickup_datetime")
+    keep = pa.repeat(pa.scalar(False), n)
+    for start, end in gaps:
+        in_gap = pc.and_(
+            pc.greater_equal(pickup, pa.scalar(start.to_pydatetime(), pickup.type)),
+            pc.less(pickup, pa.scalar(end.to_pydatetime(), pickup.type)),
+        )
+        keep = pc.or_(keep, in_gap)
+    trips = trips.filter(pc.fill_null(keep, False))
+    profile.update(trips)
+    return trips
+
+
+def materialize():
+    """Yield Arrow tables, one source row group at a time, for Bruin to append as they come.
+
+    Peak memory is a few row groups (PREFETCH_ROW_GROUPS ahead of the one
+    being appended) however many months the window spans.
+    Only months that are new or whose file changed upstream are downloaded,
+    and only the days of the window not already ingested are emitted. What
+    counts as ingested comes from ingestion.trips_state, which Bruin builds
+    after this asset's tables are committed, so a failed or killed run is
+    simply ingested again next time (staging deduplicates any overlap).
+    """
     start_date = os.environ["BRUIN_START_DATE"]  # YYYY-MM-DD
     end_date = os.environ["BRUIN_END_DATE"]      # YYYY-MM-DD
 
     extracted_at = datetime.now(timezone.utc)
     taxi_type = "yellow"
 
-    dfs: list[pd.DataFrame] = []
+    # Run window (inclusive start day, exclusive next day after end_date)
+    start_ts = pd.Timestamp(start_date)
+    end_ts = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+
+    months = []
     for year, month in _month_starts(start_date, end_date):
+        month_start = pd.Timestamp(year=year, month=month, day=1)
+        month_end = month_start + pd.offsets.MonthBegin(1)
         url = f"{BASE_URL}/yellow_tripdata_{year}-{month:02d}.parquet"
+        months.append((url, (max(start_ts, month_start), min(end_ts, month_end))))
 
-        try:
-            df = _read_parquet_from_url(url)
-        except requests.HTTPError as e:
-            status = e.response.status_code if e.response is not None else None
-            # 404 = missing; 403 = commonly returned for not-yet-published months
-            if status in (403, 404):
+    state = _load_state(start_ts, end_ts)
+
+    # Profiles the appended rows only; rows outside the gaps (other months,
+    # days already ingested) are dropped before they reach it. Starting from
+    # the empty schema gives every column a row, so a run that appends
+    # nothing still writes a profile (of zero rows).
+    profile = QualityProfile(
+        fare_columns=FARE_COLUMNS,
+        zone_columns=ZONE_COLUMNS,
+        columns=OUTPUT_SCHEMA.names,
+    )
+    profile.update(OUTPUT_SCHEMA.empty_table())
+
+    # Months are checked and their footers fetched concurrently; their column
+    # chunks are then read in month order on a prefetch thread, so the next
+    # row groups (the next month's, at a month boundary) download while the
+    # current one is converted and appended
+    concurrency = _fetch_concurrency()
+    session = _pooled_session(concurrency)
+    emitted = False
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        plans = [pool.submit(_plan_month, session, url, window, state) for url, window in months]
+
+        skipped = 0
+        for plan, table in _read_ahead(_month_tables(plans), PREFETCH_ROW_GROUPS):
+            if table is None:
+                if skipped:
+                    print(f"{plan['url']}: skipped {skipped:,} row(s) outside the window or already ingested")
+                skipped = 0
                 continue
-            raise
-
-        # Yellow schema datetime columns
-        df["pickup_datetime"] = pd.to_datetime(df.get("tpep_pickup_datetime"), errors="coerce")
-        df["dropoff_datetime"] = pd.to_datetime(df.get("tpep_dropoff_datetime"), errors="coerce")
-
-        # Standardize columns that staging expects
-        df["pickup_location_id"] = df.get("PULocationID")
-        df["dropoff_location_id"] = df.get("DOLocationID")
-        df["fare_amount"] = df.get("fare_amount")
-        df["total_amount"] = df.get("total_amount")
-        df["payment_type"] = df.get("payment_type")
-
-        df["taxi_type"] = taxi_type
-        df["extracted_at"] = pd.Timestamp(extracted_at)
-
-        # Filter to run window (inclusive start day, exclusive next day after end_date)
-        start_ts = pd.Timestamp(start_date)
-        end_ts = pd.Timestamp(end_date) + pd.Timedelta(days=1)
-        df = df[(df["pickup_datetime"] >= start_ts) & (df["pickup_datetime"] < end_ts)]
-
-        # Keep ONLY stable schema columns (prevents schema drift)
-        df = df[
-            [
-                "pickup_datetime",
-                "dropoff_datetime",
-                "pickup_location_id",
-                "dropoff_location_id",
-                "fare_amount",
-                "total_amount",
-                "payment_type",
-                "taxi_type",
-                "extracted_at",
-            ]
-        ]
-
-        dfs.append(df)
-
-    if not dfs:
-        return pd.DataFrame(
-            {
-                "pickup_datetime": pd.Series(dtype="datetime64[ns]"),
-                "dropoff_datetime": pd.Series(dtype="datetime64[ns]"),
-                "pickup_location_id": pd.Series(dtype="Int64"),
-                "dropoff_location_id": pd.Series(dtype="Int64"),
-                "fare_amount": pd.Series(dtype="float64"),
-                "total_amount": pd.Series(dtype="float64"),
-                "payment_type": pd.Series(dtype="Int64"),
-                "taxi_type": pd.Series(dtype="object"),
-                "extracted_at": pd.Series(dtype="datetime64[ns]"),
-            }
-        )
+            trips = _to_trips(table, taxi_type, extracted_at, plan["gaps"], profile)
+            skipped += table.num_rows - trips.num_rows
+            if trips.num_rows:
+                emitted = True
+                yield trips
+
+    path = _save_profile(profile, extracted_at)
+    print(profile.summary())
+    print(f"Profile written to {path}")
 
-    return pd.concat(dfs, ignore_index=True)
\ No newline at end of file
+    # Nothing in the window: still hand over the schema
+    if not emitted:
+        yield OUTPUT_SCHEMA.empty_table()
@@ -0,0 +1,45 @@
+/* @bruin
+name: ingestion.trips_profile
+type: duckdb.sql
+
+depends:
+  - ingestion.trips
+
+# The quality profile of every ingestion.trips run (one row per column per
+# run), loaded from the Parquet files the asset writes to `profile_dir`.
+# The checks read the latest run's rows instead of scanning ingestion.trips.
+# A relative `profile_dir` is resolved against the working directory, here and
+# in the asset alike, so both see the same files; run bruin from the project
+# root (the directory holding .bruin.yml).
+materialization:
+  type: table
+
+columns:
+  - name: extracted_at
+    type: timestamp
+    checks:
+      - name: not_null
+  - name: column_name
+    type: string
+    checks:
+      - name: not_null
+
+custom_checks:
+  - name: no_null_pickups_in_last_run
+    query: |
+      SELECT COALESCE(SUM(null_count), 0) FROM ingestion.trips_profile
+      WHERE column_name = 'pickup_datetime'
+        AND extracted_at = (SELECT MAX(extracted_at) FROM ingestion.trips_profile)
+    value: 0
+  # Refunds and voided trips are legitimately negative in the TLC files; fail
+  # only when a fare column is more than 5% negative in the last run
+  - name: negative_fares_below_5_percent_in_last_run
+    query: |
+      SELECT COUNT(*) FROM ingestion.trips_profile
+      WHERE negative_count > 0.05 * row_count
+        AND extracted_at = (SELECT MAX(extracted_at) FROM ingestion.trips_profile)
+    value: 0
+@bruin */
+
+SELECT *
+FROM read_parquet('{{ var.profile_dir }}/*.parquet')
@@ -0,0 +1,32 @@
+/* @bruin
+name: ingestion.trips_state
+type: duckdb.sql
+
+depends:
+  - ingestion.trips
+
+# What ingestion.trips has committed, per pickup day. Built after the load
+# succeeded, so a failed or interrupted ingestion run never marks a day as
+# done; ingestion.trips reads this (read-only) to skip days it already has.
+materialization:
+  type: table
+  strategy: time_interval
+  incremental_key: pickup_date
+  time_granularity: date
+
+columns:
+  - name: pickup_date
+    type: date
+    primary_key: true
+    checks:
+      - name: not_null
+@bruin */
+
+SELECT
+    CAST(pickup_datetime AS DATE) AS pickup_date,
+    COUNT(*) AS trip_count,
+    MAX(extracted_at) AS extracted_at
+FROM ingestion.trips
+WHERE pickup_datetime >= '{{ start_date }}'
+  AND pickup_datetime < CAST('{{ end_date }}' AS DATE) + INTERVAL 1 DAY
+GROUP BY 1
@@ -5,9 +5,13 @@ type: duckdb.sql
 depends:
   - staging.trips
 
+# Only the trip_dates in the run window are recomputed and replaced;
+# earlier days stay as they are. Weekly/monthly rollups are views on this table.
 materialization:
   type: table
-  strategy: create+replace
+  strategy: time_interval
+  incremental_key: trip_date
+  time_granularity: date
 
 columns:
   - name: payment_type_name
@@ -36,5 +40,7 @@ select
   count(*) as trip_count,
   sum(coalesce(fare_amount, 0)) as fare_amount_sum
 from staging.trips
+where pickup_datetime >= '{{ start_date }}'
+  and pickup_datetime < cast('{{ end_date }}' as date) + interval 1 day
 group by 1, 2
 order by trip_date, trip_count desc;
\ No newline at end of file
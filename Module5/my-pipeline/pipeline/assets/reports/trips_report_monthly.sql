@@ -0,0 +1,35 @@
+/* @bruin
+name: reports.trips_report_monthly
+type: duckdb.sql
+
+depends:
+  - reports.trips_report
+
+# Rolled up from the daily report, so it never scans trip-level data
+materialization:
+  type: view
+
+columns:
+  - name: payment_type_name
+    type: string
+    description: Human-readable payment type.
+    primary_key: true
+  - name: month_start
+    type: date
+    description: First day of the month.
+    primary_key: true
+  - name: trip_count
+    type: bigint
+    description: Number of trips.
+  - name: fare_amount_sum
+    type: double
+    description: Sum of fare_amount.
+@bruin */
+
+select
+  payment_type_name,
+  cast(date_trunc('month', trip_date) as date) as month_start,
+  sum(trip_count) as trip_count,
+  sum(fare_amount_sum) as fare_amount_sum
+from reports.trips_report
+group by 1, 2
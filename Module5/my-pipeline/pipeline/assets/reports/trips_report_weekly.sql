@@ -0,0 +1,35 @@
+/* @bruin
+name: reports.trips_report_weekly
+type: duckdb.sql
+
+depends:
+  - reports.trips_report
+
+# Rolled up from the daily report, so it never scans trip-level data
+materialization:
+  type: view
+
+columns:
+  - name: payment_type_name
+    type: string
+    description: Human-readable payment type.
+    primary_key: true
+  - name: week_start
+    type: date
+    description: First day of the week.
+    primary_key: true
+  - name: trip_count
+    type: bigint
+    description: Number of trips.
+  - name: fare_amount_sum
+    type: double
+    description: Sum of fare_amount.
+@bruin */
+
+select
+  payment_type_name,
+  cast(date_trunc('week', trip_date) as date) as week_start,
+  sum(trip_count) as trip_count,
+  sum(fare_amount_sum) as fare_amount_sum
+from reports.trips_report
+group by 1, 2
@@ -6,9 +6,14 @@ depends:
   - ingestion.trips
   - ingestion.payment_lookup
 
+# Each run rebuilds only its own pickup-time window: rows in
+# [start_datetime, end_datetime) are deleted and re-inserted deduplicated,
+# so the cost follows the new data, not the table's history.
 materialization:
   type: table
-  strategy: create+replace
+  strategy: time_interval
+  incremental_key: pickup_datetime
+  time_granularity: timestamp
 
 columns:
   - name: pickup_datetime
@@ -32,14 +37,19 @@ SELECT
     t.dropoff_location_id,
     t.fare_amount,
     t.taxi_type,
-    p.payment_type_name
+    p.payment_type_name,
+    -- DuckDB's hash of the trip key, a compact trip id for consumers
+    hash(t.pickup_datetime, t.dropoff_datetime,
+         t.pickup_location_id, t.dropoff_location_id, t.fare_amount) AS row_hash
 FROM ingestion.trips t
 LEFT JOIN ingestion.payment_lookup p
     ON t.payment_type = p.payment_type_id
 WHERE t.pickup_datetime >= '{{ start_datetime }}'
   AND t.pickup_datetime < '{{ end_datetime }}'
+-- One row per trip key, keeping the most recently extracted copy; the key
+-- columns themselves, not their hash, so distinct trips never collide
 QUALIFY ROW_NUMBER() OVER (
     PARTITION BY t.pickup_datetime, t.dropoff_datetime,
                  t.pickup_location_id, t.dropoff_location_id, t.fare_amount
-    ORDER BY t.pickup_datetime
-) = 1
\ No newline at end of file
+    ORDER BY t.extracted_at DESC
+) = 1
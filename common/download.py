@@ -0,0 +1,279 @@
+"""Resumable HTTP downloads into a local temp file, used by the TLC cache and the GCS transfers.
+
+Failed requests are retried with exponential backoff and full jitter. When
+the server honours Range requests, a download resumes from the bytes already
+on disk instead of starting over (If-Range guards against the file changing
+upstream in between), and large files are split into segments fetched in
+parallel. Progress is kept next to the temp file, so an interrupted process
+picks up where it stopped. The caller renames the finished file into place;
+to_file() does that for a plain download to a path, and to_file_hashed()
+also hashes the bytes as they arrive, so nothing reads the file back.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import urllib3
+
+RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+SEGMENTS = 4
+MIN_SEGMENT_BYTES = 32 * 1024 * 1024
+BLOCK_SIZE = 1024 * 1024
+# Progress is saved at most this often (bytes per segment)
+SAVE_EVERY = 16 * 1024 * 1024
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class SourceChanged(IOError):
+    """The remote file changed during the download; start over."""
+
+
+class Incomplete(IOError):
+    """The response ended before all requested bytes arrived."""
+
+
+# Dropped connections surface from urllib3 directly when the raw body is streamed
+RETRYABLE_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    urllib3.exceptions.HTTPError,
+    Incomplete,
+)
+
+
+def backoff(attempt: int) -> float:
+    """Seconds to wait before retry `attempt` (0-based): full jitter over an exponential cap."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, requests.HTTPError):
+        return exc.response is not None and exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, RETRYABLE_ERRORS)
+
+
+def with_retries(fn, retries: int = RETRIES, what: str = ""):
+    """Call fn() until it succeeds or a non-retryable error / the last retry fails."""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            wait = backoff(attempt)
+            print(f"{what or 'request'} failed ({e}); retrying in {wait:.1f}s")
+            time.sleep(wait)
+
+
+def segment_bounds(size: int, segments: int) -> list:
+    """[start, end) byte ranges splitting `size` into up to `segments` parts."""
+    if size <= 0:
+        return [(0, 0)]
+    n = max(1, min(segments, size // MIN_SEGMENT_BYTES))
+    step = -(-size // n)
+    return [(start, min(start + step, size)) for start in range(0, size, step)]
+
+
+class _Progress:
+    """Bytes done per segment, persisted as JSON beside the temp file.
+
+    Each segment reports only its own count, and only once those bytes are
+    flushed, so a save from any thread never claims another segment's
+    unwritten bytes.
+    """
+
+    def __init__(self, path: str, version: dict, bounds: list):
+        self.path = path + ".progress"
+        self.version = version
+        self.bounds = bounds
+        self.done = [0] * len(bounds)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved["version"] == version and saved["bounds"] == [list(b) for b in bounds]:
+                self.done = saved["done"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+    def save(self, i: int, done: int):
+        """Record segment `i` as `done` bytes in (already flushed to the file) and persist."""
+        with self._lock:
+            self.done[i] = done
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": self.version, "bounds": self.bounds, "done": self.done}, f)
+            os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _fetch_segment(session, url: str, path: str, i: int, progress: _Progress, validator: str, hasher=None):
+    start, end = progress.bounds[i]
+    pos = start + progress.done[i]
+    if pos >= end:
+        return
+    headers = {"Range": f"bytes={pos}-{end - 1}"}
+    if validator:
+        headers["If-Range"] = validator
+    with session.get(url, headers=headers, stream=True, timeout=120) as resp:
+        resp.raise_for_status()
+        if resp.status_code != 206:
+            # If-Range failed (new version upstream) or Range was ignored
+            raise SourceChanged(f"{url} changed upstream during the download")
+        done = progress.done[i]
+        unsaved = 0
+        try:
+            with open(path, "r+b") as f:
+                f.seek(pos)
+                for block in resp.raw.stream(BLOCK_SIZE, decode_content=False):
+                    block = block[:end - pos]
+                    f.write(block)
+                    pos += len(block)
+                    done += len(block)
+                    unsaved += len(block)
+                    if hasher is not None:
+                        hasher.update(block)
+                    if unsaved >= SAVE_EVERY:
+                        f.flush()
+                        progress.save(i, done)
+                        unsaved = 0
+                    if pos >= end:
+                        break
+        finally:
+            # Closing the file flushed everything this segment wrote
+            progress.save(i, done)
+    if pos < end:
+        raise Incomplete(f"Segment {i} of {url} ended at byte {pos}, expected {end}")
+
+
+def _hash_prefix(path: str, n: int, hasher):
+    """Feed the first `n` bytes of `path` (a resumed download's) to `hasher`."""
+    with open(path, "rb") as f:
+        while n > 0:
+            block = f.read(min(BLOCK_SIZE, n))
+            hasher.update(block)
+            n -= len(block)
+
+
+def fetch(url: str, path: str, size: int, etag: str = "", last_modified: str = "",
+          session=None, segments: int = SEGMENTS, retries: int = RETRIES, hasher=None):
+    """Download `url` (of `size` bytes, Range support known) into `path`, resuming earlier progress.
+
+    Retries each segment independently; raises SourceChanged if the remote
+    file changed under the download (the partial file is discarded). A
+    `hasher` (anything with update(bytes)) needs the bytes in order, so it
+    makes the download a single segment.
+    """
+    session = session or requests.Session()
+    version = {"url": url, "etag": etag, "last_modified": last_modified, "size": size}
+    bounds = segment_bounds(size, 1 if hasher is not None else segments)
+    progress = _Progress(path, version, bounds)
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        progress.done = [0] * len(bounds)
+        with open(path, "wb") as f:
+            f.truncate(size)
+    elif any(progress.done):
+        print(f"Resuming {url}: {sum(progress.done):,} of {size:,} bytes already on disk")
+        if hasher is not None:
+            _hash_prefix(path, progress.done[0], hasher)
+
+    # Weak ETags cannot be used with If-Range; fall back to Last-Modified
+    validator = etag if etag and not etag.startswith("W/") else last_modified
+
+    def run(i):
+        with_retries(
+            lambda: _fetch_segment(session, url, path, i, progress, validator, hasher),
+            retries,
+            f"{url} segment {i}",
+        )
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(bounds)) as pool:
+            list(pool.map(run, range(len(bounds))))
+    except SourceChanged:
+        progress.remove()
+        os.remove(path)
+        raise
+    progress.remove()
+
+
+def _get_to(session, url: str, path: str, hasher=None):
+    """One plain GET of `url` written to `path` (raw bytes, as served); return `hasher`, fed the bytes."""
+    with session.get(url, stream=True, timeout=120) as resp:
+        resp.raise_for_status()
+        expected = resp.headers.get("Content-Length")
+        written = 0
+        with open(path, "wb") as f:
+            for block in resp.raw.stream(BLOCK_SIZE, decode_content=False):
+                f.write(block)
+                written += len(block)
+                if hasher is not None:
+                    hasher.update(block)
+    if expected and written != int(expected):
+        raise Incomplete(f"Truncated download of {url}: got {written} of {expected} bytes")
+    return hasher
+
+
+def _download_part(session, url: str, part: str, segments: int, retries: int, new_hasher=None):
+    """Download `url` into `part`; return a hasher from `new_hasher()` fed every byte, if given."""
+    def head():
+        resp = session.head(url, allow_redirects=True, timeout=60)
+        resp.raise_for_status()
+        return resp
+
+    headers = with_retries(head, retries, url).headers
+    size = headers.get("Content-Length")
+    if headers.get("Accept-Ranges") == "bytes" and size and headers.get("Content-Encoding") in (None, "identity"):
+        hasher = new_hasher() if new_hasher else None
+        fetch(url, part, int(size), headers.get("ETag", ""), headers.get("Last-Modified", ""),
+              session=session, segments=segments, retries=retries, hasher=hasher)
+        return hasher
+    # A whole-file retry starts from byte 0, so each attempt gets a fresh hasher
+    return with_retries(
+        lambda: _get_to(session, url, part, new_hasher() if new_hasher else None), retries, url,
+    )
+
+
+def _to_file(url: str, path, session, segments: int, retries: int, new_hasher=None):
+    session = session or requests.Session()
+    part = f"{path}.part"
+    try:
+        hasher = _download_part(session, url, part, segments, retries, new_hasher)
+    except SourceChanged as e:
+        print(f"{e}; downloading again")
+        hasher = _download_part(session, url, part, segments, retries, new_hasher)
+    os.replace(part, path)
+    return str(path), hasher
+
+
+def to_file(url: str, path, session=None, segments: int = SEGMENTS, retries: int = RETRIES) -> str:
+    """Download `url` to `path` directly (no cache); return the path.
+
+    A HEAD decides how: servers that support Range requests get fetch()
+    into `path`.part, so a rerun resumes it; others get one GET, retried as
+    a whole. `path` appears only once the download is complete.
+    """
+    return _to_file(url, path, session, segments, retries)[0]
+
+
+def to_file_hashed(url: str, path, new_hasher, session=None, retries: int = RETRIES):
+    """to_file() that hashes the bytes as they are written; return (path, hasher).
+
+    `new_hasher()` makes the hasher (anything with update(bytes)), again
+    whenever the download starts over. Hashing needs the bytes in order,
+    so a ranged download runs as one segment; a resumed one hashes the part
+    already on disk first.
+    """
+    return _to_file(url, path, session, 1, retries, new_hasher)
@@ -0,0 +1,441 @@
+"""Moving TLC source files into GCS, shared by Module3/HW3.py and Module4/load.py.
+
+run_pipeline moves each file through download -> verify -> [convert ->]
+upload -> cleanup on its own, with separate concurrency limits for downloads and uploads and a
+cap on the bytes waiting on local disk. Downloads should go straight to the
+local path (common/download.py to_file_hashed, with Checksums, so the
+checksums come from the download itself), not through the TLC cache, whose
+copies the cap would not see. stream_to_blob pipes an HTTP response body
+straight into a resumable upload: memory holds one upload chunk plus one
+read block, and nothing is written to local disk; run_streams schedules
+those. upload_to_gcs and stream_to_gcs retry either kind of upload until
+the object verifies.
+
+Uploads are verified by size, CRC32C and MD5 against the object's metadata.
+With a SyncManifest, files whose source and object are unchanged since the
+last run are skipped without being downloaded.
+
+Configuration (environment):
+    GCS_LOCAL_DIR          use a directory instead of GCS (see common/local_storage.py)
+    STORAGE_EMULATOR_HOST  GCS emulator endpoint, read by google-cloud-storage itself
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import google_crc32c
+import requests
+from google.api_core.exceptions import NotFound
+from google.cloud import storage
+
+from common.download import RETRIES, with_retries
+from common.local_storage import LocalClient
+
+# Resumable uploads send whole chunks; GCS wants multiples of 256 KiB
+CHUNK_SIZE = 8 * 1024 * 1024
+READ_BLOCK = 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 2 * 1024**3
+# Attempts at one upload, and the pause after a failed one
+UPLOAD_ATTEMPTS = 3
+UPLOAD_PAUSE_S = 5
+
+
+def storage_client():
+    """GCS client (GOOGLE_APPLICATION_CREDENTIALS), or the local stand-in if GCS_LOCAL_DIR is set."""
+    root = os.environ.get("GCS_LOCAL_DIR")
+    if root:
+        return LocalClient(root)
+    return storage.Client()
+
+
+class Checksums:
+    """Size, MD5 and CRC32C of a byte stream, base64-encoded the way GCS reports them."""
+
+    def __init__(self):
+        self.size = 0
+        self._md5 = hashlib.md5()
+        self._crc32c = google_crc32c.Checksum()
+
+    def update(self, block: bytes):
+        self.size += len(block)
+        self._md5.update(block)
+        self._crc32c.update(block)
+
+    def result(self) -> dict:
+        return {
+            "size": self.size,
+            "md5_hash": base64.b64encode(self._md5.digest()).decode(),
+            "crc32c": base64.b64encode(self._crc32c.digest()).decode(),
+        }
+
+
+def file_checksums(path) -> dict:
+    checksums = Checksums()
+    with open(path, "rb") as f:
+        while block := f.read(READ_BLOCK):
+            checksums.update(block)
+    return checksums.result()
+
+
+def blob_matches(blob, checksums: dict) -> bool:
+    """True if the object exists with these size and CRC32C (and MD5, when GCS has one)."""
+    try:
+        blob.reload()
+    except NotFound:
+        return False
+    if blob.size != checksums["size"] or blob.crc32c != checksums["crc32c"]:
+        return False
+    # Composite objects carry no MD5
+    return blob.md5_hash is None or blob.md5_hash == checksums["md5_hash"]
+
+
+class SyncManifest:
+    """Local JSON record of the source version and checksums each URL was last uploaded as.
+
+    {url: {"etag", "source_size", "blob", "size", "md5_hash", "crc32c"}}. A
+    file counts as unchanged when the source still has the recorded ETag and
+    size and the object still has the recorded checksums; neither needs a
+    download. The object may differ from the source (e.g. converted to Parquet).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            self.entries = {}
+        self._lock = threading.Lock()
+
+    def unchanged(self, url: str, version: dict, blob) -> bool:
+        entry = self.entries.get(url)
+        return (
+            entry is not None
+            and bool(version["etag"])
+            and (entry["etag"], entry.get("source_size"), entry["blob"]) == (version["etag"], version["size"], blob.name)
+            and blob_matches(blob, entry)
+        )
+
+    def record(self, url: str, version: dict, blob, checksums: dict):
+        with self._lock:
+            self.entries[url] = {
+                **checksums, "etag": version["etag"], "source_size": version["size"], "blob": blob.name,
+            }
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(self.entries, indent=1, sort_keys=True))
+            os.replace(tmp, self.path)
+
+
+def stream_to_blob(url: str, blob, chunk_size: int = CHUNK_SIZE, session=None) -> dict:
+    """Upload the body of `url` to `blob` as it downloads; return its checksums.
+
+    The upload is finalized only if the whole body arrived, so a dropped or
+    truncated download never leaves a partial object behind.
+    """
+    session = session or requests.Session()
+    checksums = Checksums()
+    with session.get(url, stream=True, timeout=120) as resp:
+        resp.raise_for_status()
+        expected = resp.headers.get("Content-Length")
+        with blob.open("wb", chunk_size=chunk_size) as out:
+            # Raw bytes: the object must match the source file, not a decoded body
+            for block in resp.raw.stream(READ_BLOCK, decode_content=False):
+                out.write(block)
+                checksums.update(block)
+            if expected and checksums.size != int(expected):
+                raise IOError(f"Truncated download of {url}: got {checksums.size} of {expected} bytes")
+    return checksums.result()
+
+
+def _gs_url(blob) -> str:
+    return f"gs://{blob.bucket.name}/{blob.name}"
+
+
+def upload_to_gcs(file_path, blob, checksums=None, chunk_size: int = CHUNK_SIZE,
+                  max_retries: int = UPLOAD_ATTEMPTS) -> bool:
+    """Upload a local file to `blob` until the object matches `checksums` (default: the file's).
+
+    Returns False after `max_retries` failed or unverified attempts.
+    """
+    blob.chunk_size = chunk_size
+    checksums = checksums or file_checksums(file_path)
+
+    for attempt in range(max_retries):
+        try:
+            print(f"Uploading {file_path} to {_gs_url(blob)} (Attempt {attempt + 1})...")
+            blob.upload_from_filename(file_path)
+            print(f"Uploaded: {_gs_url(blob)}")
+
+            if blob_matches(blob, checksums):
+                print(f"Verification successful for {blob.name}")
+                return True
+            print(f"Verification failed for {blob.name}, retrying...")
+        except Exception as e:
+            print(f"Failed to upload {file_path} to GCS: {e}")
+        time.sleep(UPLOAD_PAUSE_S)
+
+    print(f"Giving up on {file_path} after {max_retries} attempts.")
+    return False
+
+
+def stream_to_gcs(url: str, blob, chunk_size: int = CHUNK_SIZE, max_retries: int = UPLOAD_ATTEMPTS):
+    """stream_to_blob() until the object verifies; return its checksums, or None after `max_retries`."""
+    for attempt in range(max_retries):
+        try:
+            print(f"Streaming {url} to {_gs_url(blob)} (Attempt {attempt + 1})...")
+            checksums = stream_to_blob(url, blob, chunk_size)
+            print(f"Uploaded: {_gs_url(blob)} ({checksums['size'] / 1024**2:,.1f} MiB)")
+
+            if blob_matches(blob, checksums):
+                print(f"Verification successful for {blob.name}")
+                return checksums
+            print(f"Verification failed for {blob.name}, retrying...")
+        except Exception as e:
+            print(f"Failed to stream {url} to GCS: {e}")
+        time.sleep(UPLOAD_PAUSE_S)
+
+    print(f"Giving up on {url} after {max_retries} attempts.")
+    return None
+
+
+class ByteBudget:
+    """Caps the bytes held on local disk; reserve() blocks until `n` more fit.
+
+    A file larger than the whole budget is still let through once nothing
+    else is reserved, so it cannot wait forever.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def reserve(self, n: int):
+        with self._cond:
+            self._cond.wait_for(lambda: self.used == 0 or self.used + n <= self.max_bytes)
+            self.used += n
+
+    def release(self, n: int):
+        with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+
+def source_version(url: str, session=None, retries: int = RETRIES) -> dict:
+    """ETag (else Last-Modified) and Content-Length from a HEAD request; empty/0 if missing."""
+    def head():
+        resp = (session or requests).head(url, allow_redirects=True, timeout=60)
+        resp.raise_for_status()
+        return resp
+
+    resp = with_retries(head, retries, url)
+    return {
+        "etag": resp.headers.get("ETag") or resp.headers.get("Last-Modified", ""),
+        "size": int(resp.headers.get("Content-Length", 0)),
+    }
+
+
+def _new_result(name: str) -> dict:
+    return {"name": name, "bytes": 0, "download_s": 0.0, "convert_s": 0.0, "upload_s": 0.0, "status": "failed"}
+
+
+def transfer_file(
+    task, name, url, blob, download, upload, download_slots, upload_slots, budget, manifest=None, convert=None,
+):
+    """Move one file through download -> verify -> [convert ->] upload -> cleanup.
+
+    `download(task)` returns the local path, or (path, checksums) if it
+    hashed the bytes as they arrived (None on failure), and
+    `upload(path, checksums)` returns True once the object is verified in
+    the bucket. `convert(task, path)`, if given, turns the download into the
+    file that is uploaded and returns its path. Each stage waits only for
+    its own slot, so one slow file holds up nothing but itself. With a
+    `manifest`, unchanged files are skipped before the download, or before
+    the upload if the object already matches the bytes to upload.
+    """
+    result = _new_result(name)
+    version = source_version(url)
+    if manifest is not None and manifest.unchanged(url, version, blob):
+        result["status"] = "unchanged"
+        return result
+
+    size = version["size"]
+    # A conversion holds the download and its output on disk at once
+    reserved = size * 2 if convert else size
+    budget.reserve(reserved)
+    path = converted = None
+    try:
+        t0 = time.perf_counter()
+        with download_slots:
+            downloaded = download(task)
+        result["download_s"] = time.perf_counter() - t0
+        if downloaded is None:
+            return result
+        path, checksums = downloaded if isinstance(downloaded, tuple) else (downloaded, None)
+
+        # Verify: the local copy is the whole file
+        result["bytes"] = os.path.getsize(path)
+        if size and result["bytes"] != size:
+            print(f"{name}: expected {size:,} bytes, got {result['bytes']:,}; not uploading")
+            return result
+
+        if convert is not None:
+            t1 = time.perf_counter()
+            converted = convert(task, path)
+            result["convert_s"] = time.perf_counter() - t1
+            os.remove(path)
+            path, checksums = converted, None
+            if path is None:
+                return result
+        # Checksums of the bytes to upload verify the upload; a download that
+        # hashed its bytes already has them, a converted file is read once here
+        if checksums is None:
+            checksums = file_checksums(path)
+
+        if manifest is not None and blob_matches(blob, checksums):
+            result["status"] = "unchanged"
+        else:
+            t1 = time.perf_counter()
+            with upload_slots:
+                uploaded = upload(path, checksums)
+            result["upload_s"] = time.perf_counter() - t1
+            if not uploaded:
+                return result
+            result["status"] = "uploaded"
+
+        if manifest is not None:
+            manifest.record(url, version, blob, checksums)
+        return result
+    finally:
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+        budget.release(reserved)
+
+
+def run_pipeline(
+    tasks,
+    describe,
+    download,
+    upload,
+    download_workers=4,
+    upload_workers=4,
+    max_disk_bytes=DEFAULT_MAX_DISK_BYTES,
+    manifest=None,
+    convert=None,
+):
+    """Transfer every task, each file independently; return the per-file results.
+
+    `describe(task)` gives (name, url, blob). At most `download_workers`
+    downloads and `upload_workers` uploads run at once, and files on local
+    disk never add up to more than `max_disk_bytes`. Pass a SyncManifest to
+    skip unchanged files, and `convert` to upload a transformed file instead
+    of the download (see transfer_file).
+    """
+    download_slots = threading.BoundedSemaphore(download_workers)
+    upload_slots = threading.BoundedSemaphore(upload_workers)
+    budget = ByteBudget(max_disk_bytes)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=download_workers + upload_workers) as pool:
+        futures = {
+            pool.submit(
+                transfer_file, task, *describe(task),
+                download, upload, download_slots, upload_slots, budget, manifest, convert,
+            ): task
+            for task in tasks
+        }
+        for future in as_completed(futures):
+            name = describe(futures[future])[0]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"{name}: {e}")
+                results.append(_new_result(name))
+    return results
+
+
+def stream_file(task, name, url, blob, stream, manifest=None):
+    """Move one file with `stream(task)`, which returns the verified upload's checksums or None.
+
+    The download and upload overlap, so the whole time counts as upload.
+    """
+    result = _new_result(name)
+    version = source_version(url)
+    if manifest is not None and manifest.unchanged(url, version, blob):
+        result["status"] = "unchanged"
+        return result
+
+    t0 = time.perf_counter()
+    checksums = stream(task)
+    result["upload_s"] = time.perf_counter() - t0
+    if checksums is None:
+        return result
+    result["bytes"] = checksums["size"]
+    result["status"] = "uploaded"
+    if manifest is not None:
+        manifest.record(url, version, blob, checksums)
+    return result
+
+
+def run_streams(tasks, describe, stream, workers=4, manifest=None):
+    """Stream every task (see stream_file), `workers` at a time; return the per-file results.
+
+    Results have the run_pipeline() shape, so print_report() covers both.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(stream_file, task, *describe(task), stream, manifest): task for task in tasks}
+        for future in as_completed(futures):
+            name = describe(futures[future])[0]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"{name}: {e}")
+                results.append(_new_result(name))
+    return results
+
+
+def _stage(mib: float, seconds: float) -> str:
+    """Time and MiB/s of one stage, or '-' if it did not run."""
+    if not seconds:
+        return f"{'-':>17}"
+    return f"{seconds:>6.1f}s {mib / seconds:>6,.1f} MiB/s"
+
+
+def print_report(results, wall: float):
+    """Per-file and aggregate throughput of a run_pipeline() or run_streams() run."""
+    converted = any(r["convert_s"] for r in results)
+    print("\n=== Transfer report ===")
+    print(
+        f"{'file':<36} {'MiB':>8} {'download':>17} "
+        + (f"{'convert':>17} " if converted else "")
+        + f"{'upload':>17}  status"
+    )
+    for r in sorted(results, key=lambda r: r["name"]):
+        mib = r["bytes"] / 1024**2
+        print(
+            f"{r['name']:<36} {mib:>8,.1f} {_stage(mib, r['download_s'])} "
+            + (f"{_stage(mib, r['convert_s'])} " if converted else "")
+            + f"{_stage(mib, r['upload_s'])}  {r['status']}"
+        )
+
+    done = [r for r in results if r["status"] == "uploaded"]
+    mib = sum(r["bytes"] for r in done) / 1024**2
+    print(
+        f"total: {len(done)} of {len(results)} file(s), {mib:,.1f} MiB in {wall:.1f}s "
+        f"({mib / max(wall, 1e-9):,.1f} MiB/s); time in stages: "
+        f"download {sum(r['download_s'] for r in results):.1f}s, "
+        + (f"convert {sum(r['convert_s'] for r in results):.1f}s, " if converted else "")
+        + f"upload {sum(r['upload_s'] for r in results):.1f}s (summed over files)"
+    )
+    unchanged = [r for r in results if r["status"] == "unchanged"]
+    if unchanged:
+        print(f"unchanged: {len(unchanged)} file(s) already in the bucket, skipped")
+    failed = [r["name"] for r in results if r["status"] == "failed"]
+    if failed:
+        print("FAILED: " + ", ".join(sorted(failed)))
@@ -0,0 +1,134 @@
+"""Directory-backed stand-in for the parts of google.cloud.storage the upload scripts use.
+
+Each bucket is a subdirectory of the root and each object a file under it
+(`taxi/year/filename` blob names become nested directories). Objects are
+written to a temp file and renamed into place on close, so, as on GCS, a
+failed upload leaves no object behind. Blobs report the metadata GCS does
+(size, generation, base64 md5_hash and crc32c).
+
+Module3/HW3.py and Module4/load.py use it when GCS_LOCAL_DIR is set. For an
+emulator such as fake-gcs-server, set STORAGE_EMULATOR_HOST instead;
+google-cloud-storage picks that up by itself.
+"""
+
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import google_crc32c
+from google.api_core.exceptions import Conflict, NotFound
+
+BLOCK_SIZE = 8 * 1024 * 1024
+
+
+class LocalClient:
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def bucket(self, name: str) -> "LocalBucket":
+        return LocalBucket(self, name)
+
+    def get_bucket(self, name: str) -> "LocalBucket":
+        bucket = self.bucket(name)
+        if not bucket.path.is_dir():
+            raise NotFound(f"bucket {name} not found")
+        return bucket
+
+    def create_bucket(self, name: str) -> "LocalBucket":
+        bucket = self.bucket(name)
+        try:
+            bucket.path.mkdir()
+        except FileExistsError:
+            raise Conflict(f"bucket {name} already exists")
+        return bucket
+
+
+class LocalBucket:
+    def __init__(self, client: LocalClient, name: str):
+        self.client = client
+        self.name = name
+        self.path = client.root / name
+
+    def blob(self, name: str) -> "LocalBlob":
+        return LocalBlob(self, name)
+
+
+class _AtomicWriter(io.RawIOBase):
+    """Write-only file that appears at `dest` on close; discarded if the block raises."""
+
+    def __init__(self, dest: Path):
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        self._dest = dest
+        fd, self._tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.")
+        self._file = os.fdopen(fd, "wb")
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self._file.write(b)
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+            os.chmod(self._tmp, 0o644)  # mkstemp creates 0600
+            os.replace(self._tmp, self._dest)
+        super().close()
+
+    def terminate(self):
+        self._file.close()
+        os.remove(self._tmp)
+        super().close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.terminate()
+        else:
+            self.close()
+
+
+class LocalBlob:
+    def __init__(self, bucket: LocalBucket, name: str):
+        self.bucket = bucket
+        self.name = name
+        self.path = bucket.path / name
+        self.chunk_size = None
+        self.size = None
+        self.generation = None
+        self.md5_hash = None
+        self.crc32c = None
+
+    def exists(self, client=None) -> bool:
+        return self.path.is_file()
+
+    def reload(self, client=None):
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            raise NotFound(f"{self.bucket.name}/{self.name} not found")
+        md5 = hashlib.md5()
+        crc = google_crc32c.Checksum()
+        with open(self.path, "rb") as f:
+            while block := f.read(BLOCK_SIZE):
+                md5.update(block)
+                crc.update(block)
+        self.size = st.st_size
+        self.generation = st.st_mtime_ns
+        self.md5_hash = base64.b64encode(md5.digest()).decode()
+        self.crc32c = base64.b64encode(crc.digest()).decode()
+
+    def open(self, mode: str = "rb", chunk_size=None, **kwargs):
+        if mode == "rb":
+            return open(self.path, "rb")
+        if mode == "wb":
+            return _AtomicWriter(self.path)
+        raise ValueError(f"unsupported mode {mode!r}")
+
+    def upload_from_filename(self, filename, **kwargs):
+        with self.open("wb") as out, open(filename, "rb") as f:
+            shutil.copyfileobj(f, out, BLOCK_SIZE)
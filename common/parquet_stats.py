@@ -0,0 +1,230 @@
+"""Row counts and column statistics of Parquet files, read from their footers only.
+
+A Parquet footer holds the row count, the row-group layout and per column
+chunk min/max/null counts, so none of the data pages need to be read. Each
+file costs one small ranged read of its tail (two if the footer is larger
+than FOOTER_GUESS), and files are read in parallel. Works on local paths and
+any fsspec URL (gs://, s3://, memory://, ...); a directory or prefix
+covers every .parquet file under it, and globs are expanded.
+
+Results are cached in a JSON file keyed by the object's generation (GCS),
+ETag or mtime, so asking again about files that have not changed reads
+nothing but the listing.
+
+    stats = collect(["gs://bucket/yellow/"])
+    print(summary(stats))
+    sum(s["num_rows"] for s in stats)
+
+Configuration (environment):
+    PARQUET_STATS_CACHE  cache file (default ~/.cache/tlc/parquet_stats.json)
+"""
+
+import datetime
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import fsspec
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FOOTER_GUESS = 64 * 1024
+CONCURRENCY = 16
+
+
+def _default_cache_path() -> Path:
+    path = os.environ.get("PARQUET_STATS_CACHE")
+    return Path(path) if path else Path.home() / ".cache" / "tlc" / "parquet_stats.json"
+
+
+def object_version(info: dict):
+    """Identity of one version of an object from its fsspec info, or None if unknown."""
+    for key in ("generation", "etag", "ETag", "version_id", "VersionId"):
+        if info.get(key):
+            return str(info[key])
+    mtime = info.get("mtime") or info.get("LastModified") or info.get("updated") or info.get("created")
+    if mtime:
+        return f"{mtime}-{info.get('size')}"
+    return None
+
+
+class StatsCache:
+    """JSON file of {url: {"version", "stats"}}; entries for an older version are misses."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else _default_cache_path()
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, version):
+        entry = self.entries.get(url)
+        if version is None or entry is None or entry["version"] != version:
+            return None
+        return entry["stats"]
+
+    def put(self, url: str, version, stats: dict):
+        if version is None:
+            return
+        with self._lock:
+            self.entries[url] = {"version": version, "stats": stats}
+
+    def save(self):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(self.entries, indent=1, sort_keys=True))
+            os.replace(tmp, self.path)
+
+
+def read_footer(fs, path: str, size: int) -> pq.FileMetaData:
+    """FileMetaData of a Parquet file, fetching only its tail."""
+    tail = fs.cat_file(path, start=max(0, size - FOOTER_GUESS), end=size)
+    if tail[-4:] != b"PAR1":
+        raise ValueError(f"{path} is not a Parquet file")
+    footer_size = int.from_bytes(tail[-8:-4], "little") + 8
+    if footer_size > len(tail):
+        tail = fs.cat_file(path, start=size - footer_size, end=size - len(tail)) + tail
+    # The footer is self-contained: offsets in it are never followed
+    return pq.read_metadata(pa.BufferReader(tail[-footer_size:]))
+
+
+def _text(value):
+    """Statistics values as JSON-friendly text (timestamps in ISO format)."""
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value if isinstance(value, (int, float, str, bool)) else str(value)
+
+
+def file_stats(metadata: pq.FileMetaData) -> dict:
+    """Row count, row-group layout and per-column min/max/nulls from a footer.
+
+    null_count is None for a column when any row group lacks it, and
+    min/max when a row group with non-null values lacks them.
+    """
+    columns = {}
+    row_groups = []
+    for i in range(metadata.num_row_groups):
+        rg = metadata.row_group(i)
+        row_groups.append({
+            "num_rows": rg.num_rows,
+            "total_byte_size": rg.total_byte_size,
+            "compressed_size": sum(rg.column(j).total_compressed_size for j in range(rg.num_columns)),
+        })
+        for j in range(rg.num_columns):
+            chunk = rg.column(j)
+            col = columns.setdefault(chunk.path_in_schema, {
+                "min": None, "max": None, "null_count": 0,
+                "compressed_size": 0, "uncompressed_size": 0,
+                "min_max_known": True, "nulls_known": True,
+            })
+            col["compressed_size"] += chunk.total_compressed_size
+            col["uncompressed_size"] += chunk.total_uncompressed_size
+            st = chunk.statistics
+            nulls = st.null_count if st is not None and st.has_null_count else None
+            if nulls is None:
+                col["nulls_known"] = False
+            else:
+                col["null_count"] += nulls
+            if st is not None and st.has_min_max:
+                if col["min"] is None or st.min < col["min"]:
+                    col["min"] = st.min
+                if col["max"] is None or st.max > col["max"]:
+                    col["max"] = st.max
+            elif nulls is None or nulls < chunk.num_values:
+                col["min_max_known"] = False  # an all-null chunk has no min/max to miss
+
+    for col in columns.values():
+        min_max_known = col.pop("min_max_known")
+        col["min"] = _text(col["min"]) if min_max_known else None
+        col["max"] = _text(col["max"]) if min_max_known else None
+        if not col.pop("nulls_known"):
+            col["null_count"] = None
+    return {
+        "num_rows": metadata.num_rows,
+        "num_row_groups": metadata.num_row_groups,
+        "created_by": metadata.created_by,
+        "columns": columns,
+        "row_groups": row_groups,
+    }
+
+
+def _resolve(target: str, filesystem=None) -> list:
+    """(fs, path, info) of every Parquet file a path, prefix or glob names."""
+    fs, path = (filesystem, target) if filesystem is not None else fsspec.core.url_to_fs(target)
+    if fs.isdir(path):
+        found = fs.find(path, detail=True)
+    elif any(ch in path for ch in "*?["):
+        found = fs.glob(path, detail=True)
+    elif fs.exists(path):
+        return [(fs, path, fs.info(path))]
+    else:
+        # A plain key prefix (gs://bucket/yellow_tripdata_2024-) names what starts with it
+        found = fs.glob(path + "*", detail=True)
+        if not found:
+            raise FileNotFoundError(target)
+    return [
+        (fs, p, info) for p, info in sorted(found.items())
+        if info.get("type") == "file" and p.endswith(".parquet")
+    ]
+
+
+def collect(targets, filesystem=None, cache=None, concurrency: int = CONCURRENCY) -> list:
+    """Footer stats of every Parquet file in `targets` (paths, prefixes or globs).
+
+    Returns one dict per file, in target order: file_stats() plus "path",
+    "size", "version" and "cached" (True if served from the cache). Pass
+    cache=False to skip the cache.
+    """
+    if isinstance(targets, str):
+        targets = [targets]
+    if cache is None:
+        cache = StatsCache()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        files = [f for resolved in pool.map(lambda t: _resolve(t, filesystem), targets) for f in resolved]
+
+        def one(file):
+            fs, path, info = file
+            url = fs.unstrip_protocol(path)
+            version = object_version(info)
+            stats = cache.get(url, version) if cache else None
+            cached = stats is not None
+            if not cached:
+                stats = file_stats(read_footer(fs, path, info["size"]))
+                if cache:
+                    cache.put(url, version, stats)
+            return {"path": url, "size": info["size"], "version": version, "cached": cached, **stats}
+
+        results = list(pool.map(one, files))
+    if cache:
+        cache.save()
+    return results
+
+
+def summary(stats, columns: bool = False) -> str:
+    """Per-file rows and row groups plus totals; with `columns`, each file's column stats."""
+    width = max([len(s["path"]) for s in stats] + [4])
+    lines = [f"{'file':<{width}} {'rows':>12} {'row groups':>10} {'MiB':>8}"]
+    for s in stats:
+        lines.append(
+            f"{s['path']:<{width}} {s['num_rows']:>12,} {s['num_row_groups']:>10} "
+            f"{s['size'] / 1024**2:>8,.1f}{' (cached)' if s['cached'] else ''}"
+        )
+        if columns:
+            for name, col in s["columns"].items():
+                lines.append(
+                    f"    {name:<28} nulls={col['null_count']} min={col['min']} max={col['max']} "
+                    f"compressed={col['compressed_size']:,}"
+                )
+    total = sum(s["num_rows"] for s in stats)
+    cached = sum(s["cached"] for s in stats)
+    lines.append(f"total: {total:,} rows in {len(stats)} file(s), {cached} from cache")
+    return "\n".join(lines)
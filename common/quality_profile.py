@@ -0,0 +1,179 @@
+"""Data quality stats gathered while chunks stream through a loader.
+
+Each chunk is profiled once, with vectorized Arrow kernels, as it passes to
+the writer: per column null counts and min/max, plus negative amounts,
+timestamps outside the load window and zone IDs missing from the TLC zone
+lookup (Module1/pipelines/taxi_zone_lookup.csv unless given). Stats from all chunks fold into one profile per run. Saving it to
+the warehouse lets the usual checks (not null, non negative, row count) be
+answered without scanning the loaded table again.
+
+    profile = QualityProfile("lpep_pickup_datetime", window, FARE_COLUMNS, ZONE_COLUMNS)
+    for chunk in chunks:
+        profile.update(chunk)
+    print(profile.failed_checks(not_null=["lpep_pickup_datetime"]))
+"""
+
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+# The TLC zone lookup kept with the Module 1 loaders; its LocationIDs are the known zones
+ZONE_LOOKUP = Path(__file__).resolve().parents[1] / "Module1" / "pipelines" / "taxi_zone_lookup.csv"
+
+# Columns of a saved profile (one row per profiled column)
+PROFILE_COLUMNS = [
+    "column_name",
+    "row_count",
+    "null_count",
+    "min_value",
+    "max_value",
+    "negative_count",
+    "out_of_window_count",
+    "unknown_zone_count",
+]
+
+
+@lru_cache(maxsize=None)
+def load_zones(path=ZONE_LOOKUP) -> pa.Array:
+    """The LocationID column of a taxi_zone_lookup.csv, as int64."""
+    table = pacsv.read_csv(
+        path,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=["LocationID"],
+            column_types={"LocationID": pa.int64()},
+        ),
+    )
+    return table.column("LocationID").combine_chunks()
+
+
+def _as_arrow(chunk) -> pa.Table:
+    if isinstance(chunk, pd.DataFrame):
+        return pa.Table.from_pandas(chunk, preserve_index=False)
+    return chunk
+
+
+def _plain(values):
+    """Dictionary-encoded columns are profiled by their values."""
+    if pa.types.is_dictionary(values.type):
+        return values.cast(values.type.value_type)
+    return values
+
+
+class QualityProfile:
+    """Running stats over every chunk passed to update().
+
+    `window` is a list of [start, end) ranges `time_column` should fall in;
+    non-null values outside all of them count as out of window. Values of
+    `zone_columns` not in `known_zones` (default: the IDs in ZONE_LOOKUP)
+    count as unknown zones.
+    """
+
+    def __init__(self, time_column=None, window=(), fare_columns=(), zone_columns=(), columns=None,
+                 known_zones=None):
+        self.time_column = time_column
+        self.window = list(window)
+        self.fare_columns = set(fare_columns)
+        self.zone_columns = set(zone_columns)
+        if known_zones is not None:
+            self.known_zones = pa.array(known_zones, pa.int64())
+        else:
+            self.known_zones = load_zones() if self.zone_columns else None
+        self.only = None if columns is None else set(columns)
+        self.rows = 0
+        self.stats = {}
+
+    def _column(self, name: str) -> dict:
+        return self.stats.setdefault(name, {
+            "null_count": 0,
+            "min_value": None,
+            "max_value": None,
+            "negative_count": 0 if name in self.fare_columns else None,
+            "out_of_window_count": 0 if name == self.time_column else None,
+            "unknown_zone_count": 0 if name in self.zone_columns else None,
+        })
+
+    def _out_of_window(self, values) -> int:
+        inside = pa.repeat(pa.scalar(False), len(values))
+        for start, end in self.window:
+            inside = pc.or_(inside, pc.and_(
+                pc.greater_equal(values, pa.scalar(start, values.type)),
+                pc.less(values, pa.scalar(end, values.type)),
+            ))
+        # Nulls are counted as nulls, not as out of window
+        return pc.sum(pc.invert(inside)).as_py() or 0
+
+    def update(self, chunk):
+        """Fold one chunk (pandas or Arrow) into the profile."""
+        table = _as_arrow(chunk)
+        self.rows += table.num_rows
+        for name in table.column_names:
+            if self.only is not None and name not in self.only:
+                continue
+            values = _plain(table.column(name))
+            stats = self._column(name)
+            stats["null_count"] += values.null_count
+            if values.null_count < len(values) and not pa.types.is_null(values.type):
+                low, high = pc.min_max(values).values()
+                self._extend(stats, low.as_py(), high.as_py())
+            if name in self.fare_columns:
+                stats["negative_count"] += pc.sum(pc.less(values, 0)).as_py() or 0
+            if name == self.time_column and self.window:
+                stats["out_of_window_count"] += self._out_of_window(values)
+            if name in self.zone_columns:
+                known = pc.is_in(values.cast(pa.int64()), value_set=self.known_zones)
+                unknown = pc.and_(pc.is_valid(values), pc.invert(known))
+                stats["unknown_zone_count"] += pc.sum(unknown).as_py() or 0
+
+    @staticmethod
+    def _extend(stats: dict, low, high):
+        if low is not None and (stats["min_value"] is None or low < stats["min_value"]):
+            stats["min_value"] = low
+        if high is not None and (stats["max_value"] is None or high > stats["max_value"]):
+            stats["max_value"] = high
+
+    def records(self) -> list:
+        """One dict per column with PROFILE_COLUMNS keys; min/max as text."""
+        return [
+            {
+                "column_name": name,
+                "row_count": self.rows,
+                **stats,
+                "min_value": None if stats["min_value"] is None else str(stats["min_value"]),
+                "max_value": None if stats["max_value"] is None else str(stats["max_value"]),
+            }
+            for name, stats in self.stats.items()
+        ]
+
+    def failed_checks(self, not_null=(), non_negative=()) -> list:
+        """Descriptions of the checks this profile fails; empty if all pass."""
+        failed = []
+        if self.rows == 0:
+            failed.append("row count is zero")
+        for name in not_null:
+            if self.stats.get(name, {}).get("null_count"):
+                failed.append(f"{name}: {self.stats[name]['null_count']:,} null(s)")
+        for name in non_negative:
+            if self.stats.get(name, {}).get("negative_count"):
+                failed.append(f"{name}: {self.stats[name]['negative_count']:,} negative value(s)")
+        return failed
+
+    def summary(self) -> str:
+        lines = [f"Quality profile: {self.rows:,} rows, {len(self.stats)} column(s)"]
+        for name, stats in self.stats.items():
+            flags = [
+                f"{stats[key]:,} {label}"
+                for key, label in (
+                    ("null_count", "null"),
+                    ("negative_count", "negative"),
+                    ("out_of_window_count", "out of window"),
+                    ("unknown_zone_count", "unknown zone"),
+                )
+                if stats[key]
+            ]
+            if flags:
+                lines.append(f"  {name}: " + ", ".join(flags))
+        return "\n".join(lines)
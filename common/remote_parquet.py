@@ -0,0 +1,228 @@
+"""Read remote Parquet files with HTTP range requests instead of downloading them.
+
+Only the footer and the column chunks a read actually needs are fetched.
+Chunk byte ranges that lie close together are coalesced into one request,
+and the requests for a read are issued in parallel. Works against any
+server that honours Range headers; one that ignores them still works, it
+just sends the whole file.
+
+    rp = RemoteParquet(url)
+    table = rp.read_row_groups([0, 3], columns=["PULocationID", "fare_amount"])
+    print(rp.summary())
+"""
+
+import bisect
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow.parquet as pq
+import requests
+
+FOOTER_GUESS = 64 * 1024
+MAX_GAP = 1024 * 1024
+MAX_REQUEST = 32 * 1024 * 1024
+CONCURRENCY = 8
+
+
+def coalesce(ranges, max_gap: int = MAX_GAP, max_request: int = MAX_REQUEST) -> list:
+    """Merge (start, end) byte ranges less than `max_gap` apart, up to `max_request` bytes each."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start - merged[-1][1] <= max_gap and end - merged[-1][0] <= max_request:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class _SparseFile(io.RawIOBase):
+    """Seekable read-only view over the byte ranges fetched so far.
+
+    Reads that touch bytes not fetched yet fetch them on demand, so pyarrow
+    never fails on an unplanned read; planned reads are served from memory.
+    """
+
+    def __init__(self, size: int, fetch):
+        self._size = size
+        self._fetch = fetch
+        self._pos = 0
+        self._starts = []
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self._size
+        self._pos = offset
+        return self._pos
+
+    def add(self, start: int, data: bytes):
+        with self._lock:
+            if start not in self._blocks:
+                bisect.insort(self._starts, start)
+            self._blocks[start] = data
+
+    def has(self, start: int, end: int) -> bool:
+        """True if [start, end) lies within one fetched block."""
+        with self._lock:
+            i = bisect.bisect_right(self._starts, start) - 1
+            return i >= 0 and self._starts[i] + len(self._blocks[self._starts[i]]) >= end
+
+    def drop(self, keep_from: int):
+        """Forget fetched blocks that start before `keep_from`."""
+        with self._lock:
+            for start in [s for s in self._starts if s < keep_from]:
+                del self._blocks[start]
+            self._starts = [s for s in self._starts if s >= keep_from]
+
+    def _read_at(self, pos: int, n: int) -> bytes:
+        out = bytearray()
+        end = pos + n
+        while pos < end:
+            with self._lock:
+                i = bisect.bisect_right(self._starts, pos) - 1
+                block_start = self._starts[i] if i >= 0 else None
+                block = self._blocks[block_start] if i >= 0 else b""
+                next_start = self._starts[i + 1] if i + 1 < len(self._starts) else end
+            if block_start is not None and pos < block_start + len(block):
+                piece = block[pos - block_start:end - block_start]
+            else:
+                piece = self._fetch(pos, min(end, next_start))
+                self.add(pos, piece)
+            out += piece
+            pos += len(piece)
+        return bytes(out)
+
+    def readinto(self, b):
+        n = min(len(b), self._size - self._pos)
+        if n <= 0:
+            return 0
+        data = self._read_at(self._pos, n)
+        b[:n] = data
+        self._pos += n
+        return n
+
+
+class RemoteParquet:
+    """Parquet file behind a URL, read with ranged GETs of only the needed column chunks.
+
+    Offers the parts of pyarrow.parquet.ParquetFile the loaders use
+    (metadata, schema_arrow, iter_batches, read_row_group(s)). Column
+    chunks are fetched per read and released after it, so memory holds
+    one read's compressed bytes at a time.
+    """
+
+    def __init__(self, url: str, session=None, concurrency: int = CONCURRENCY, max_gap: int = MAX_GAP):
+        self.url = url
+        self.session = session or requests.Session()
+        self.concurrency = concurrency
+        self.max_gap = max_gap
+        self.bytes_fetched = 0
+        self.requests = 0
+        self._stats_lock = threading.Lock()
+
+        # Suffix range: the footer length and magic are the last 8 bytes
+        tail, self.size = self._get(f"bytes=-{FOOTER_GUESS}")
+        if tail[-4:] != b"PAR1":
+            raise ValueError(f"{url} is not a Parquet file")
+        footer_start = self.size - int.from_bytes(tail[-8:-4], "little") - 8
+        tail_start = self.size - len(tail)
+
+        self._file = _SparseFile(self.size, self._fetch)
+        self._file.add(tail_start, tail)
+        if footer_start < tail_start:
+            self._file.add(footer_start, self._fetch(footer_start, tail_start))
+        self._footer_start = min(footer_start, tail_start)
+
+        self._pf = pq.ParquetFile(self._file)
+        self.metadata = self._pf.metadata
+        self.schema_arrow = self._pf.schema_arrow
+
+    def _get(self, byte_range: str):
+        """GET one byte range; return (body, total file size)."""
+        resp = self.session.get(self.url, headers={"Range": byte_range}, timeout=120)
+        resp.raise_for_status()
+        with self._stats_lock:
+            self.bytes_fetched += len(resp.content)
+            self.requests += 1
+        if resp.status_code == 206:
+            return resp.content, int(resp.headers["Content-Range"].rsplit("/", 1)[1])
+        # Range ignored: the whole file came back
+        return resp.content, len(resp.content)
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        body, _ = self._get(f"bytes={start}-{end - 1}")
+        if len(body) != end - start:
+            body = body[start:end]
+        return body
+
+    def column_ranges(self, row_groups, columns=None) -> list:
+        """Byte ranges of the column chunks a read of these row groups/columns touches."""
+        ranges = []
+        for rg in row_groups:
+            rg_meta = self.metadata.row_group(rg)
+            for i in range(rg_meta.num_columns):
+                col = rg_meta.column(i)
+                if columns is not None and col.path_in_schema.split(".")[0] not in columns:
+                    continue
+                start = col.data_page_offset
+                if col.has_dictionary_page and col.dictionary_page_offset:
+                    start = min(start, col.dictionary_page_offset)
+                ranges.append((start, start + col.total_compressed_size))
+        return ranges
+
+    def prefetch(self, row_groups, columns=None):
+        """Fetch the coalesced column chunk ranges for a read, in parallel."""
+        ranges = [r for r in self.column_ranges(row_groups, columns) if not self._file.has(*r)]
+        ranges = coalesce(ranges, self.max_gap)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for (start, _), data in zip(ranges, pool.map(lambda r: self._fetch(*r), ranges)):
+                self._file.add(start, data)
+
+    def release(self):
+        """Drop fetched column chunks, keeping the footer."""
+        self._file.drop(self._footer_start)
+
+    def read_row_groups(self, row_groups, columns=None):
+        self.prefetch(row_groups, columns)
+        try:
+            # Decoding threads would call back into the Python file object
+            # concurrently (and can abort the interpreter at exit)
+            return self._pf.read_row_groups(row_groups, columns=columns, use_threads=False)
+        finally:
+            self.release()
+
+    def read_row_group(self, row_group: int, columns=None):
+        return self.read_row_groups([row_group], columns)
+
+    def iter_batches(self, batch_size: int = 65536, row_groups=None, columns=None):
+        """Like ParquetFile.iter_batches, fetching one row group's chunks at a time."""
+        if row_groups is None:
+            row_groups = range(self.metadata.num_row_groups)
+        for rg in row_groups:
+            self.prefetch([rg], columns)
+            try:
+                yield from self._pf.iter_batches(
+                    batch_size=batch_size, row_groups=[rg], columns=columns, use_threads=False
+                )
+            finally:
+                self.release()
+
+    def summary(self) -> str:
+        return (
+            f"{self.url}: fetched {self.bytes_fetched:,} of {self.size:,} bytes "
+            f"({self.bytes_fetched / max(self.size, 1):.1%}) in {self.requests} range request(s)"
+        )
@@ -0,0 +1,400 @@
+"""Local on-disk cache for TLC source files, shared by the ingestion scripts.
+
+Files are stored content-addressed under objects/<key>/<filename>, where the
+key hashes the URL together with the server's ETag and Content-Length, so a
+changed upstream file gets a new entry instead of overwriting one in use.
+Cached entries are revalidated with conditional requests, written atomically
+(temp file + rename), and evicted least-recently-used once the cache grows
+past `max_bytes`. File locks make it safe for several processes to share one
+cache directory.
+
+A get() starts with one HEAD, conditional on the cached validators. On a
+miss from a server that supports Range requests the body is fetched with
+common/download.py: large files download in parallel segments, and an
+interrupted download resumes from the bytes already under tmp/ instead of
+starting over. Other servers get one plain GET. Every request is retried
+with backoff on its own; nothing retries around those retries. Partial
+downloads count towards `max_bytes` and are dropped by eviction like
+objects, or once they have not been touched for a week.
+
+Configuration (environment):
+    TLC_CACHE_DIR          cache root (default ~/.cache/tlc)
+    TLC_CACHE_MAX_BYTES    size bound in bytes (default 20 GiB)
+    TLC_DOWNLOAD_SEGMENTS  parallel range requests per file (default 4)
+    TLC_DOWNLOAD_RETRIES   retries per request before giving up (default 5)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+from common import download
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+DEFAULT_MAX_BYTES = 20 * 1024**3
+BLOCK_SIZE = 8 * 1024 * 1024
+# Files under tmp/ untouched for this long belong to abandoned downloads
+STALE_SECONDS = 7 * 24 * 3600
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _consume(gen):
+    """Run a generator to the end and return its return value."""
+    while True:
+        try:
+            next(gen)
+        except StopIteration as stop:
+            return stop.value
+
+
+@contextmanager
+def _flock(path: Path, shared: bool = False, blocking: bool = True):
+    """Hold an flock on `path`; yields False if non-blocking and already held."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is None:
+            yield True
+            return
+        mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            mode |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(f, mode)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class TLCCache:
+    """Size-bounded LRU cache of remote files keyed by URL + ETag/Content-Length."""
+
+    def __init__(self, root=None, max_bytes=None, session=None, segments=None, retries=None):
+        root = root or os.environ.get("TLC_CACHE_DIR") or Path.home() / ".cache" / "tlc"
+        self.root = Path(root)
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("TLC_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.max_bytes = max_bytes
+        if segments is None:
+            segments = int(os.environ.get("TLC_DOWNLOAD_SEGMENTS", download.SEGMENTS))
+        self.segments = segments
+        if retries is None:
+            retries = int(os.environ.get("TLC_DOWNLOAD_RETRIES", download.RETRIES))
+        self.retries = retries
+        self.session = session or requests.Session()
+        for sub in ("objects", "index", "locks", "tmp"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    # -- index ---------------------------------------------------------------
+
+    def _index_path(self, url: str) -> Path:
+        return self.root / "index" / f"{_sha(url)}.json"
+
+    def _read_index(self, url: str):
+        try:
+            entry = json.loads(self._index_path(url).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        if not (self.root / entry["path"]).exists():
+            return None
+        return entry
+
+    def _write_index(self, url: str, entry: dict):
+        fd, tmp = tempfile.mkstemp(dir=self.root / "tmp", suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._index_path(url))
+
+    def _object_lock(self, key: str) -> Path:
+        return self.root / "locks" / f"{key}.lock"
+
+    def _url_lock(self, url_sha: str) -> Path:
+        return self.root / "locks" / f"url-{url_sha}.lock"
+
+    # -- fetching ------------------------------------------------------------
+
+    def _request(self, url: str, entry, method: str = "GET"):
+        """GET or HEAD `url`, conditional on the cached validators when there is an entry."""
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        resp = self.session.request(
+            method, url, headers=headers, stream=True, timeout=120, allow_redirects=True
+        )
+        if resp.status_code == 304:
+            return resp
+        resp.raise_for_status()
+        return resp
+
+    def _revalidate(self, url: str, entry, method: str):
+        """Send the (retried) conditional request; None if the cached entry is still good.
+
+        An unreachable server also returns None when there is a cached copy.
+        """
+        try:
+            resp = download.with_retries(lambda: self._request(url, entry, method), self.retries, url)
+        except requests.ConnectionError:
+            if entry is None:
+                raise
+            print(f"Cache: {url} unreachable, using cached copy")
+            return None
+        if resp.status_code == 304:
+            resp.close()
+            os.utime(self.root / entry["path"])
+            return None
+        return resp
+
+    def _commit(self, url: str, tmp: str, etag: str, last_modified: str, size: str) -> str:
+        """Move a complete download into objects/ and index it; return its key."""
+        if size and os.path.getsize(tmp) != int(size):
+            raise download.Incomplete(
+                f"Truncated download of {url}: got {os.path.getsize(tmp)} of {size} bytes"
+            )
+        key = _sha(f"{url}\n{etag or last_modified}\n{size}")
+        filename = os.path.basename(urlparse(url).path) or "data"
+        dest = self.root / "objects" / key / filename
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, dest)
+
+        self._write_index(url, {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": int(size) if size else os.path.getsize(dest),
+            "key": key,
+            "path": str(dest.relative_to(self.root)),
+        })
+        return key
+
+    def _store(self, url: str, resp, block_size: int):
+        """Stream a 200 response into the cache, yielding each block as it is written.
+
+        The body goes to a temp file first and is renamed into place only when
+        complete, so readers never see a partial object.
+        """
+        fd, tmp = tempfile.mkstemp(dir=self.root / "tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for block in resp.iter_content(chunk_size=block_size):
+                    f.write(block)
+                    yield block
+            return self._commit(
+                url, tmp, resp.headers.get("ETag", ""), resp.headers.get("Last-Modified", ""),
+                resp.headers.get("Content-Length", ""),
+            )
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _store_ranged(self, url: str, resp) -> str:
+        """Fetch the file a HEAD response describes with resumable range requests.
+
+        The partial file lives at a fixed path under tmp/, so a later attempt
+        (in this process or the next) continues where this one stopped.
+        """
+        etag = resp.headers.get("ETag", "")
+        last_modified = resp.headers.get("Last-Modified", "")
+        size = resp.headers["Content-Length"]
+        part = str(self.root / "tmp" / f"{_sha(url)}.part")
+        download.fetch(
+            url, part, int(size), etag, last_modified,
+            session=self.session, segments=self.segments, retries=self.retries,
+        )
+        return self._commit(url, part, etag, last_modified, size)
+
+    def _ensure(self, url: str):
+        """Make sure an up-to-date copy of `url` is cached; return its index entry."""
+        try:
+            self._download(url)
+        except download.SourceChanged as e:
+            print(f"Cache: {e}; downloading again")
+            self._download(url)
+        return self._read_index(url)
+
+    def _download(self, url: str):
+        """Revalidate `url` with a HEAD and fetch it on a miss, without streaming it out.
+
+        Servers that support Range requests get the resumable segmented
+        download (retried per segment); others get one GET streamed into the
+        cache, retried as a whole.
+        """
+        key = None
+        with _flock(self._url_lock(_sha(url))):
+            entry = self._read_index(url)
+            head = self._revalidate(url, entry, "HEAD")
+            if head is None:
+                return
+            head.close()
+            ranged = (
+                head.headers.get("Accept-Ranges") == "bytes"
+                and head.headers.get("Content-Length")
+                and head.headers.get("Content-Encoding") in (None, "identity")
+            )
+            if ranged:
+                key = self._store_ranged(url, head)
+            else:
+                def get():
+                    with self._request(url, None) as resp:
+                        return _consume(self._store(url, resp, BLOCK_SIZE))
+
+                key = download.with_retries(get, self.retries, url)
+        self.evict(keep=key)
+
+    def _ensure_streaming(self, url: str, block_size: int):
+        """Like _ensure, but yield the body blocks while downloading (nothing on a hit).
+
+        The conditional GET is retried until it answers; a failure after
+        blocks have been yielded is raised to the caller.
+        """
+        key = None
+        with _flock(self._url_lock(_sha(url))):
+            resp = self._revalidate(url, self._read_index(url), "GET")
+            if resp is None:
+                return
+            with resp:
+                key = yield from self._store(url, resp, block_size)
+        self.evict(keep=key)
+
+    @contextmanager
+    def _pinned(self, url: str, entry):
+        """Hold a shared lock on the entry's object so eviction skips it."""
+        with _flock(self._object_lock(entry["key"]), shared=True):
+            path = self.root / entry["path"]
+            if not path.exists():  # evicted before the pin was taken
+                with self._pinned(url, self._ensure(url)) as path:
+                    yield path
+                return
+            os.utime(path)
+            yield path
+
+    @contextmanager
+    def get(self, url: str):
+        """Yield the local path of an up-to-date cached copy of `url`.
+
+        The entry is pinned for the duration of the block, so another
+        process cannot evict it while it is being read.
+        """
+        with self._pinned(url, self._ensure(url)) as path:
+            yield path
+
+    def iter_content(self, url: str, block_size: int = BLOCK_SIZE):
+        """Yield the bytes of `url` in blocks, teeing a miss into the cache as it streams."""
+        downloaded = False
+        for block in self._ensure_streaming(url, block_size):
+            downloaded = True
+            yield block
+        if downloaded:
+            return
+
+        with self._pinned(url, self._read_index(url)) as path, open(path, "rb") as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                yield block
+
+    def link_to(self, url: str, dest) -> str:
+        """Place a copy of `url` at `dest` (hard link when possible) and return its path."""
+        with self.get(url) as path:
+            if os.path.exists(dest):
+                os.remove(dest)
+            try:
+                os.link(path, dest)
+            except OSError:
+                shutil.copyfile(path, dest)
+        return str(dest)
+
+    # -- eviction ------------------------------------------------------------
+
+    def _partials(self) -> list:
+        """(mtime, size, files, lock) per download under tmp/; lock is None for one-shot temp files.
+
+        A resumable download is its .part file plus the .progress files
+        beside it, and is in use while its URL lock is held.
+        """
+        groups = {}
+        for path in (self.root / "tmp").iterdir():
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue  # committed or removed meanwhile
+            name = path.name.split(".")[0] if ".part" in path.name else path.name
+            group = groups.setdefault(name, [0, 0, [], None])
+            group[0] = max(group[0], st.st_mtime)
+            group[1] += st.st_size
+            group[2].append(path)
+            if ".part" in path.name:
+                group[3] = self._url_lock(name)
+        return [tuple(group) for group in groups.values()]
+
+    def evict(self, keep=None):
+        """Drop least recently used objects and partial downloads until the cache fits in max_bytes.
+
+        `keep` is the key of an object that was just stored and is never
+        evicted. Downloads untouched for STALE_SECONDS are dropped whatever
+        the size.
+        """
+        with _flock(self.root / "locks" / "evict.lock", blocking=False) as acquired:
+            if not acquired:
+                return  # another process is already evicting
+
+            total = 0
+            stale, candidates = [], []
+            for path in (self.root / "objects").glob("*/*"):
+                st = path.stat()
+                total += st.st_size
+                if path.parent.name != keep:
+                    candidates.append((st.st_mtime, st.st_size, [path.parent], self._object_lock(path.parent.name)))
+
+            stale_before = time.time() - STALE_SECONDS
+            for mtime, size, files, lock in self._partials():
+                total += size
+                if mtime < stale_before:
+                    stale.append((mtime, size, files, lock))
+                elif lock is not None:  # one-shot temp files belong to a running download
+                    candidates.append((mtime, size, files, lock))
+
+            for i, (_, size, files, lock) in enumerate(stale + sorted(candidates, key=lambda c: c[0])):
+                if i >= len(stale) and total <= self.max_bytes:
+                    break
+                with _flock(lock, blocking=False) if lock else nullcontext(True) as free:
+                    if not free:
+                        continue  # pinned by a reader, or still downloading
+                    for path in files:
+                        if path.is_dir():
+                            shutil.rmtree(path, ignore_errors=True)
+                        else:
+                            path.unlink(missing_ok=True)
+                    total -= size
+
+
+_default = None
+
+
+def default_cache() -> TLCCache:
+    """Process-wide cache configured from the environment."""
+    global _default
+    if _default is None:
+        _default = TLCCache()
+    return _default
@@ -0,0 +1,131 @@
+"""Convert TLC trip CSV.gz files to typed Parquet with one schema for yellow and green.
+
+The CSV is parsed with pyarrow's streaming reader and written one row group
+at a time, so memory holds about one row group whatever the file size.
+Yellow (tpep_*) and green (lpep_*) pickup/dropoff columns become
+pickup_datetime/dropoff_datetime, and columns only one taxi type has
+(ehail_fee, trip_type) are null for the other, so every file has exactly
+TRIP_SCHEMA. Files are laid out under Hive-style taxi=/year=/month=
+directories, which BigQuery, DuckDB and Spark read as partition columns.
+
+    rows = csv_to_parquet("green_tripdata_2020-01.csv.gz", "out.parquet")
+    hive_path("green", 2020, "01")  # trips/taxi=green/year=2020/month=01/green_tripdata_2020-01.parquet
+"""
+
+import os
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+# ~1M rows (100-150 MB uncompressed) per row group: large enough for efficient
+# column scans, small enough that a month of yellow trips splits into several
+# groups that engines read in parallel and skip by their statistics
+ROW_GROUP_ROWS = 1_000_000
+COMPRESSION = "zstd"
+READ_BLOCK = 16 * 1024 * 1024
+
+TRIP_SCHEMA = pa.schema([
+    ("VendorID", pa.int64()),
+    ("pickup_datetime", pa.timestamp("us")),
+    ("dropoff_datetime", pa.timestamp("us")),
+    ("passenger_count", pa.int64()),
+    ("trip_distance", pa.float64()),
+    ("RatecodeID", pa.int64()),
+    ("store_and_fwd_flag", pa.string()),
+    ("PULocationID", pa.int64()),
+    ("DOLocationID", pa.int64()),
+    ("payment_type", pa.int64()),
+    ("fare_amount", pa.float64()),
+    ("extra", pa.float64()),
+    ("mta_tax", pa.float64()),
+    ("tip_amount", pa.float64()),
+    ("tolls_amount", pa.float64()),
+    ("ehail_fee", pa.float64()),
+    ("improvement_surcharge", pa.float64()),
+    ("total_amount", pa.float64()),
+    ("trip_type", pa.int64()),
+    ("congestion_surcharge", pa.float64()),
+])
+
+# Source CSV column -> TRIP_SCHEMA column, where the names differ
+RENAMES = {
+    "tpep_pickup_datetime": "pickup_datetime",
+    "tpep_dropoff_datetime": "dropoff_datetime",
+    "lpep_pickup_datetime": "pickup_datetime",
+    "lpep_dropoff_datetime": "dropoff_datetime",
+}
+
+
+def hive_path(taxi: str, year, month: str, prefix: str = "trips") -> str:
+    """Object path of one month, e.g. trips/taxi=yellow/year=2019/month=01/yellow_tripdata_2019-01.parquet"""
+    return f"{prefix}/taxi={taxi}/year={year}/month={month}/{taxi}_tripdata_{year}-{month}.parquet"
+
+
+def _column_types() -> dict:
+    """Parse types per source column name.
+
+    Integer columns are parsed as float64 and cast afterwards: some TLC
+    months write them as "1.0".
+    """
+    types = {}
+    for field in TRIP_SCHEMA:
+        parse_as = pa.float64() if pa.types.is_integer(field.type) else field.type
+        types[field.name] = parse_as
+    for source, target in RENAMES.items():
+        types[source] = types[target]
+    return types
+
+
+def _conform(batch: pa.RecordBatch) -> pa.Table:
+    """Rename, cast and null-fill one parsed batch to TRIP_SCHEMA."""
+    names = [RENAMES.get(name, name) for name in batch.schema.names]
+    table = pa.Table.from_batches([batch]).rename_columns(names)
+    columns = [
+        table.column(field.name).cast(field.type)
+        if field.name in table.column_names
+        else pa.nulls(table.num_rows, field.type)
+        for field in TRIP_SCHEMA
+    ]
+    return pa.Table.from_arrays(columns, schema=TRIP_SCHEMA)
+
+
+def csv_to_parquet(src, dest, row_group_rows: int = ROW_GROUP_ROWS) -> int:
+    """Stream the (optionally gzipped) CSV at `src` into Parquet at `dest`; return the row count.
+
+    Written to a temp file and renamed, so `dest` never holds a partial file.
+    """
+    reader = pacsv.open_csv(
+        src,
+        read_options=pacsv.ReadOptions(block_size=READ_BLOCK),
+        convert_options=pacsv.ConvertOptions(
+            column_types=_column_types(),
+            strings_can_be_null=True,
+        ),
+    )
+    tmp = f"{dest}.tmp"
+    rows = 0
+    pending, pending_rows = [], 0
+    try:
+        with pq.ParquetWriter(
+            tmp,
+            TRIP_SCHEMA,
+            compression=COMPRESSION,
+            write_statistics=True,
+        ) as writer:
+            for batch in reader:
+                pending.append(_conform(batch))
+                pending_rows += batch.num_rows
+                while pending_rows >= row_group_rows:
+                    group = pa.concat_tables(pending)
+                    writer.write_table(group.slice(0, row_group_rows), row_group_size=row_group_rows)
+                    pending, pending_rows = [group.slice(row_group_rows)], pending_rows - row_group_rows
+                    rows += row_group_rows
+            if pending_rows:
+                writer.write_table(pa.concat_tables(pending), row_group_size=row_group_rows)
+                rows += pending_rows
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return rows
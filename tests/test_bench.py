@@ -0,0 +1,11 @@
+import os
+
+import pytest
+
+from bench.suite import in_fresh_process
+
+
+def test_child_dying_without_a_result_raises_instead_of_hanging():
+    # os._exit(3, out) fails in the child before anything is put on the queue
+    with pytest.raises(RuntimeError, match="exit code 1"):
+        in_fresh_process(os._exit, (3,), "crashing child")
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import time
+
+import pytest
+import requests
+
+from common import download
+from common.tlc_cache import STALE_SECONDS, TLCCache
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(download, "backoff", lambda attempt: 0)
+
+
+@pytest.fixture
+def data():
+    return os.urandom(200_000)
+
+
+def _ranges(server, method="GET"):
+    return [headers.get("Range") for command, _, headers in server.requests if command == method]
+
+
+def _read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_fetch_retries_server_errors(http_server, data, tmp_path):
+    url = http_server.write("a.bin", data)
+    http_server.faults = [("status", 503), ("status", 503)]
+    dest = str(tmp_path / "a.part")
+    download.fetch(url, dest, len(data), retries=2)
+    assert _read(dest) == data
+    assert len(http_server.requests) == 3
+    assert not os.path.exists(dest + ".progress")
+
+
+def test_fetch_gives_up_on_client_errors(http_server, data, tmp_path):
+    http_server.faults = [("status", 404)]
+    with pytest.raises(requests.HTTPError):
+        download.fetch(http_server.url("missing.bin"), str(tmp_path / "m.part"), 10, retries=5)
+    assert len(http_server.requests) == 1
+
+
+def test_dropped_connection_resumes_where_it_stopped(http_server, data, tmp_path, monkeypatch):
+    monkeypatch.setattr(download, "BLOCK_SIZE", 4096)
+    url = http_server.write("a.bin", data)
+    http_server.faults = [("drop", 50_000)]
+    dest = str(tmp_path / "a.part")
+    download.fetch(url, dest, len(data), retries=1)
+    assert _read(dest) == data
+    first, second = _ranges(http_server)
+    assert first == f"bytes=0-{len(data) - 1}"
+    assert int(second[len("bytes="):].split("-")[0]) >= 40_000
+
+
+def test_interrupted_download_resumes_in_a_new_call(http_server, data, tmp_path, monkeypatch):
+    monkeypatch.setattr(download, "BLOCK_SIZE", 4096)
+    monkeypatch.setattr(download, "SAVE_EVERY", 4096)
+    url = http_server.write("a.bin", data)
+    dest = str(tmp_path / "a.part")
+    http_server.faults = [("drop", 50_000)]
+    with pytest.raises(download.RETRYABLE_ERRORS):
+        download.fetch(url, dest, len(data), retries=0)
+    assert os.path.exists(dest + ".progress")
+
+    download.fetch(url, dest, len(data), retries=0)
+    assert _read(dest) == data
+    assert int(_ranges(http_server)[-1][len("bytes="):].split("-")[0]) >= 40_000
+    assert not os.path.exists(dest + ".progress")
+
+
+def test_saved_progress_only_counts_bytes_on_disk(http_server, data, tmp_path, monkeypatch):
+    monkeypatch.setattr(download, "BLOCK_SIZE", 4096)
+    monkeypatch.setattr(download, "SAVE_EVERY", 4096)
+    url = http_server.write("a.bin", data)
+    dest = str(tmp_path / "a.part")
+    http_server.faults = [("drop", 30_000)]
+    with pytest.raises(download.RETRYABLE_ERRORS):
+        download.fetch(url, dest, len(data), segments=2, retries=0)
+
+    with open(dest + ".progress") as f:
+        saved = json.load(f)
+    written = _read(dest)
+    assert 0 < sum(saved["done"]) < len(data)
+    for (start, _), done in zip(saved["bounds"], saved["done"]):
+        assert written[start:start + done] == data[start:start + done]
+
+
+@pytest.mark.parametrize("ranges", [True, False], ids=["ranged", "plain"])
+def test_to_file_hashed_hashes_each_byte_once(http_server, data, tmp_path, monkeypatch, ranges):
+    monkeypatch.setattr(download, "BLOCK_SIZE", 4096)
+    http_server.ranges = ranges
+    url = http_server.write("a.bin", data)
+    http_server.faults = [None, ("drop", 50_000)]
+    path, hasher = download.to_file_hashed(url, tmp_path / "a.bin", hashlib.sha256, retries=1)
+    assert _read(path) == data
+    assert hasher.digest() == hashlib.sha256(data).digest()
+
+
+def test_changed_source_discards_the_partial_file(http_server, data, tmp_path):
+    url = http_server.write("a.bin", data)
+    dest = str(tmp_path / "a.part")
+    with pytest.raises(download.SourceChanged):
+        download.fetch(url, dest, len(data), etag='"stale"')
+    assert not os.path.exists(dest)
+
+
+def test_cache_miss_probes_with_head(http_server, data, tmp_path):
+    cache = TLCCache(tmp_path / "cache")
+    url = http_server.write("a.bin", data)
+    with cache.get(url) as path:
+        assert _read(path) == data
+    assert http_server.requests[0][0] == "HEAD"
+    # No full-body GET is opened and thrown away: every GET is ranged
+    assert all(_ranges(http_server))
+    assert http_server.bytes_sent == len(data)
+
+
+def test_cache_retries_at_one_level(http_server, data, tmp_path):
+    cache = TLCCache(tmp_path / "cache", retries=2)
+    url = http_server.write("a.bin", data)
+    http_server.faults = [("status", 503)] * 20
+    with pytest.raises(requests.HTTPError):
+        with cache.get(url):
+            pass
+    assert len(http_server.requests) == 3
+
+
+def test_cache_retries_a_dropped_plain_get(http_server, data, tmp_path):
+    http_server.ranges = False
+    cache = TLCCache(tmp_path / "cache", retries=1)
+    url = http_server.write("a.bin", data)
+    http_server.faults = [None, ("drop", 10_000)]
+    with cache.get(url) as path:
+        assert _read(path) == data
+    assert [command for command, _, _ in http_server.requests] == ["HEAD", "GET", "GET"]
+    assert os.listdir(tmp_path / "cache" / "tmp") == []
+
+
+def test_evict_drops_abandoned_partial_downloads(tmp_path):
+    cache = TLCCache(tmp_path / "cache", max_bytes=10_000)
+    tmp = tmp_path / "cache" / "tmp"
+    abandoned = time.time() - STALE_SECONDS - 60
+    for name in ("old.part", "old.part.progress", "tmpabandoned"):
+        (tmp / name).write_bytes(b"x" * 100)
+        os.utime(tmp / name, (abandoned, abandoned))
+    (tmp / "new.part").write_bytes(b"x" * 100)
+    (tmp / "new.part.progress").write_bytes(b"{}")
+    cache.evict()
+    assert sorted(os.listdir(tmp)) == ["new.part", "new.part.progress"]
+
+
+def test_partial_downloads_count_towards_max_bytes(http_server, tmp_path):
+    cache = TLCCache(tmp_path / "cache", max_bytes=1_500)
+    url = http_server.write("a.bin", b"a" * 1_000)
+    other = tmp_path / "cache" / "tmp" / "other.part"
+    other.write_bytes(b"x" * 1_000)
+    os.utime(other, (time.time() - 60, time.time() - 60))
+    with cache.get(url) as path:
+        assert _read(path) == b"a" * 1_000
+    # The unfinished download was older and unlocked, so it made room
+    assert not other.exists()
+
+
+def test_to_file_ranged_and_plain(http_server, data, tmp_path):
+    url = http_server.write("a.bin", data)
+    http_server.faults = [None, ("drop", 10_000)]
+    assert _read(download.to_file(url, tmp_path / "a.bin", retries=1)) == data
+
+    http_server.ranges = False
+    http_server.faults = [None, ("drop", 10_000)]
+    assert _read(download.to_file(url, tmp_path / "b.bin", retries=1)) == data
+    assert sorted(os.listdir(tmp_path)) == ["a.bin", "b.bin", "srv"]
@@ -0,0 +1,196 @@
+import json
+import os
+
+import pytest
+
+from common import download, gcs_transfer
+from common.gcs_transfer import (
+    Checksums,
+    SyncManifest,
+    blob_matches,
+    file_checksums,
+    print_report,
+    run_pipeline,
+    run_streams,
+    source_version,
+    stream_to_blob,
+    stream_to_gcs,
+    upload_to_gcs,
+)
+from common.local_storage import LocalClient
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(download, "backoff", lambda attempt: 0)
+
+
+def _describe(server, bucket):
+    def describe(name):
+        return name, server.url(name), bucket.blob(f"raw/{name}")
+    return describe
+
+
+def _hashed_download(describe, work):
+    def download_file(name):
+        path, checksums = download.to_file_hashed(describe(name)[1], work / name, Checksums)
+        return path, checksums.result()
+    return download_file
+
+
+def _verified_upload(bucket, corrupt=False):
+    def upload(path, checksums):
+        blob = bucket.blob(f"raw/{os.path.basename(path)}")
+        if corrupt:
+            with blob.open("wb") as f:
+                f.write(b"not the downloaded bytes")
+        else:
+            blob.upload_from_filename(path)
+        return blob_matches(blob, checksums)
+    return upload
+
+
+def _gets(server):
+    return sum(command == "GET" for command, _, _ in server.requests)
+
+
+def test_pipeline_downloads_outside_the_cache(http_server, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("TLC_CACHE_DIR", str(tmp_path / "cache"))
+    names = [f"f{i}.csv.gz" for i in range(3)]
+    for name in names:
+        http_server.write(name, os.urandom(50_000))
+    bucket = LocalClient(tmp_path / "gcs").bucket("b")
+    describe = _describe(http_server, bucket)
+    work = tmp_path / "work"
+    work.mkdir()
+
+    def upload(path, checksums):
+        bucket.blob(f"raw/{os.path.basename(path)}").upload_from_filename(path)
+        return True
+
+    results = run_pipeline(
+        names, describe, lambda name: download.to_file(describe(name)[1], work / name), upload,
+        download_workers=2, upload_workers=2, max_disk_bytes=60_000,
+    )
+    assert sorted(r["status"] for r in results) == ["uploaded"] * 3
+    assert os.listdir(work) == []
+    assert not (tmp_path / "cache").exists()
+
+    print_report(results, 1.0)
+    assert "total: 3 of 3 file(s)" in capsys.readouterr().out
+
+
+def test_run_streams_reports_each_file(http_server, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(gcs_transfer, "UPLOAD_PAUSE_S", 0)
+    http_server.write("a.csv.gz", b"a" * 1000)
+    http_server.write("b.csv.gz", b"b" * 2000)
+    http_server.write("gone.csv.gz", b"g" * 3000)
+    bucket = LocalClient(tmp_path / "gcs").bucket("b")
+    describe = _describe(http_server, bucket)
+
+    def stream(name):
+        _, url, blob = describe(name)
+        if name == "gone.csv.gz":
+            # The HEAD found it; the body fetch then 404s and the stream gives up
+            os.remove(os.path.join(http_server.root, name))
+            return stream_to_gcs(url, blob, max_retries=1)
+        return stream_to_blob(url, blob)
+
+    names = ["a.csv.gz", "b.csv.gz", "gone.csv.gz", "missing.csv.gz"]
+    results = run_streams(names, describe, stream, workers=2)
+    by_name = {r["name"]: r for r in results}
+    assert by_name["b.csv.gz"]["bytes"] == 2000
+    assert by_name["a.csv.gz"]["status"] == "uploaded"
+    # Fails at the HEAD, before stream() runs
+    assert by_name["missing.csv.gz"]["status"] == "failed"
+    # stream() returned None
+    assert (by_name["gone.csv.gz"]["status"], by_name["gone.csv.gz"]["bytes"]) == ("failed", 0)
+    assert by_name["gone.csv.gz"]["upload_s"] > 0
+    assert [path for command, path, _ in http_server.requests if command == "GET"].count("/gone.csv.gz") == 1
+    assert not bucket.blob("raw/gone.csv.gz").exists()
+
+    print_report(results, 1.0)
+    out = capsys.readouterr().out
+    assert "total: 2 of 4 file(s)" in out
+    assert "FAILED: gone.csv.gz, missing.csv.gz" in out
+
+
+@pytest.fixture
+def synced(http_server, tmp_path):
+    """One file uploaded through run_pipeline with a SyncManifest; returns a rerun function."""
+    http_server.write("a.csv.gz", os.urandom(50_000))
+    bucket = LocalClient(tmp_path / "gcs").bucket("b")
+    describe = _describe(http_server, bucket)
+    work = tmp_path / "work"
+    work.mkdir()
+    manifest_path = tmp_path / "sync.json"
+
+    def run(upload=None):
+        return run_pipeline(
+            ["a.csv.gz"], describe, _hashed_download(describe, work), upload or _verified_upload(bucket),
+            manifest=SyncManifest(manifest_path),
+        )[0]["status"]
+
+    assert run() == "uploaded"
+    return run, bucket, manifest_path
+
+
+def test_manifest_hit_skips_download_and_upload(synced, http_server):
+    run, bucket, manifest_path = synced
+    entry = json.loads(manifest_path.read_text())[http_server.url("a.csv.gz")]
+    # Checksums taken during the download match the file itself
+    source = os.path.join(http_server.root, "a.csv.gz")
+    assert {k: entry[k] for k in ("size", "md5_hash", "crc32c")} == file_checksums(source)
+
+    gets = _gets(http_server)
+    assert run() == "unchanged"
+    assert _gets(http_server) == gets
+
+
+@pytest.mark.parametrize("size", [50_000, 60_000], ids=["etag", "size"])
+def test_changed_source_is_uploaded_again(synced, http_server, size):
+    run, bucket, _ = synced
+    data = os.urandom(size)
+    http_server.write("a.csv.gz", data)
+
+    assert run() == "uploaded"
+    with bucket.blob("raw/a.csv.gz").open("rb") as f:
+        assert f.read() == data
+
+
+def test_crc32c_mismatch_fails_the_transfer(synced, http_server, tmp_path):
+    run, bucket, manifest_path = synced
+    blob = bucket.blob("raw/a.csv.gz")
+    checksums = file_checksums(os.path.join(http_server.root, "a.csv.gz"))
+    assert blob_matches(blob, checksums)
+    assert not blob_matches(blob, {**checksums, "crc32c": "AAAAAA=="})
+    assert not blob_matches(bucket.blob("raw/missing.csv.gz"), checksums)
+
+    # A changed source whose upload does not verify is not recorded as synced
+    http_server.write("a.csv.gz", os.urandom(40_000))
+    assert run(_verified_upload(bucket, corrupt=True)) == "failed"
+    entry = json.loads(manifest_path.read_text())[http_server.url("a.csv.gz")]
+    assert entry["size"] == 50_000
+
+
+def test_source_version_retries_the_head(http_server):
+    url = http_server.write("a.csv.gz", b"x" * 100)
+    http_server.faults = [("status", 503)]
+    assert source_version(url, retries=1)["size"] == 100
+    assert [command for command, _, _ in http_server.requests] == ["HEAD", "HEAD"]
+
+
+def test_uploads_retry_until_the_object_verifies(http_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(gcs_transfer, "UPLOAD_PAUSE_S", 0)
+    bucket = LocalClient(tmp_path / "gcs").bucket("b")
+    data = os.urandom(10_000)
+    path = tmp_path / "a.csv.gz"
+    path.write_bytes(data)
+
+    assert upload_to_gcs(path, bucket.blob("raw/a.csv.gz"))
+    assert not upload_to_gcs(path, bucket.blob("raw/a.csv.gz"), {**file_checksums(path), "size": 1}, max_retries=2)
+
+    url = http_server.write("b.csv.gz", data)
+    assert stream_to_gcs(url, bucket.blob("raw/b.csv.gz")) == file_checksums(path)
+    assert stream_to_gcs(http_server.url("missing.csv.gz"), bucket.blob("raw/c.csv.gz"), max_retries=2) is None
+    assert sorted(os.listdir(tmp_path / "gcs" / "b" / "raw")) == ["a.csv.gz", "b.csv.gz"]
@@ -0,0 +1,75 @@
+import io
+
+import fsspec
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from common.parquet_stats import StatsCache, collect, summary
+
+
+def _write(fs, path, rows):
+    buf = io.BytesIO()
+    pq.write_table(pa.table({"x": list(range(rows))}), buf, row_group_size=100)
+    with fs.open(path, "wb") as f:
+        f.write(buf.getvalue())
+
+
+@pytest.fixture
+def files(tmp_path):
+    fs = fsspec.filesystem("file")
+    (tmp_path / "sub").mkdir()
+    _write(fs, str(tmp_path / "yellow_tripdata_2024-01.parquet"), 250)
+    _write(fs, str(tmp_path / "yellow_tripdata_2024-02.parquet"), 100)
+    _write(fs, str(tmp_path / "sub" / "green_tripdata_2024-01.parquet"), 30)
+    (tmp_path / "notes.txt").write_text("not parquet")
+    return tmp_path
+
+
+def test_file_dir_glob_and_prefix(files):
+    def rows(target):
+        return [s["num_rows"] for s in collect([str(target)], cache=False)]
+
+    assert rows(files / "yellow_tripdata_2024-01.parquet") == [250]
+    assert rows(files) == [30, 250, 100]
+    assert rows(files / "yellow_*.parquet") == [250, 100]
+    assert rows(f"{files}/yellow_tripdata_2024-") == [250, 100]
+
+
+def test_missing_target_raises(files):
+    with pytest.raises(FileNotFoundError):
+        collect([str(files / "fhv_")], cache=False)
+
+
+def test_footer_stats(files):
+    (stats,) = collect([str(files / "yellow_tripdata_2024-01.parquet")], cache=False)
+    assert stats["num_row_groups"] == 3
+    assert stats["columns"]["x"] == {
+        "min": 0, "max": 249, "null_count": 0,
+        "compressed_size": stats["columns"]["x"]["compressed_size"],
+        "uncompressed_size": stats["columns"]["x"]["uncompressed_size"],
+    }
+    assert "total: 250 rows in 1 file(s), 0 from cache" in summary([stats])
+
+
+def test_cache_hit_until_file_changes(files, tmp_path):
+    target = str(files / "yellow_tripdata_2024-02.parquet")
+    cache_path = tmp_path / "stats.json"
+    assert not collect([target], cache=StatsCache(cache_path))[0]["cached"]
+    assert collect([target], cache=StatsCache(cache_path))[0]["cached"]
+
+    _write(fsspec.filesystem("file"), target, 120)
+    (stats,) = collect([target], cache=StatsCache(cache_path))
+    assert not stats["cached"] and stats["num_rows"] == 120
+
+
+def test_fsspec_memory_prefix():
+    fs = fsspec.filesystem("memory")
+    _write(fs, "/bucket/yellow_tripdata_2024-01.parquet", 10)
+    _write(fs, "/bucket/yellow_tripdata_2024-02.parquet", 20)
+    try:
+        stats = collect(["memory://bucket/yellow_tripdata_2024-"], cache=False)
+    finally:
+        fs.rm("/bucket", recursive=True)
+    assert [s["num_rows"] for s in stats] == [10, 20]
+    assert stats[0]["path"].endswith("/bucket/yellow_tripdata_2024-01.parquet")
@@ -0,0 +1,90 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+from sqlalchemy import text
+
+from pg_load import (
+    as_frame,
+    create_staging_table,
+    ensure_partitioned_table,
+    partition_name,
+    quote_ident,
+    swap_in_partition,
+    write_chunk,
+)
+
+TABLE = "test_pg_load_trips"
+
+
+@pytest.fixture
+def engine(pg_engine):
+    def drop():
+        with pg_engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {quote_ident(TABLE)} CASCADE"))
+            for month in (1, 2):
+                staging = partition_name(TABLE, 2025, month) + "__staging"
+                conn.execute(text(f"DROP TABLE IF EXISTS {quote_ident(staging)}"))
+
+    drop()
+    yield pg_engine
+    drop()
+
+
+def _month(month: int, extra: bool) -> pd.DataFrame:
+    df = pd.DataFrame({
+        "pickup": pd.to_datetime([f"2025-{month:02d}-01 10:00", f"2025-{month:02d}-02 11:00"]),
+        "fare": [10.5, 7.25],
+    })
+    if extra:
+        df["cbd_congestion_fee"] = [0.75, None]
+    return df
+
+
+def test_months_with_different_columns_loaded_at_once(engine):
+    jan, feb = _month(1, extra=False), _month(2, extra=True)
+
+    # Interleaved as two DB slots run them: January's staging table is cloned
+    # before February adds its column to the parent
+    ensure_partitioned_table(jan.head(0), TABLE, engine, "pickup")
+    jan_staging = create_staging_table(TABLE, partition_name(TABLE, 2025, 1), engine)
+    ensure_partitioned_table(feb.head(0), TABLE, engine, "pickup")
+    feb_staging = create_staging_table(TABLE, partition_name(TABLE, 2025, 2), engine)
+    write_chunk(jan, jan_staging, engine)
+    write_chunk(feb, feb_staging, engine)
+
+    swap_in_partition(TABLE, "pickup", 2025, 1, engine)
+    swap_in_partition(TABLE, "pickup", 2025, 2, engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            f"SELECT date_trunc('month', pickup)::date, COUNT(*), COUNT(cbd_congestion_fee) "
+            f"FROM {quote_ident(TABLE)} GROUP BY 1 ORDER BY 1"
+        )).fetchall()
+    assert [(str(m), n, fees) for m, n, fees in rows] == [("2025-01-01", 2, 0), ("2025-02-01", 2, 1)]
+
+
+def test_reloading_a_month_replaces_its_partition(engine):
+    jan = _month(1, extra=False)
+    for _ in range(2):
+        ensure_partitioned_table(jan.head(0), TABLE, engine, "pickup", ["pickup"])
+        staging = create_staging_table(TABLE, partition_name(TABLE, 2025, 1), engine)
+        write_chunk(jan, staging, engine)
+        swap_in_partition(TABLE, "pickup", 2025, 1, engine, ["pickup"])
+    with engine.connect() as conn:
+        assert conn.execute(text(f"SELECT COUNT(*) FROM {quote_ident(TABLE)}")).scalar() == 2
+
+
+@pytest.mark.parametrize("method", ["copy", "insert"])
+def test_arrow_chunks_load_with_either_method(engine, method):
+    chunk = pa.table({
+        "pickup": pa.array([pd.Timestamp("2025-01-01 10:00"), None], pa.timestamp("us")),
+        "zone": pa.array([7, None], pa.int64()),
+        "flag": pa.array(["", None]),
+    })
+    # Nullable dtypes keep the DDL's zone column an integer, nulls or not
+    as_frame(chunk).head(0).to_sql(TABLE, engine, index=False)
+
+    write_chunk(chunk, TABLE, engine, method)
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT zone, flag FROM {quote_ident(TABLE)} ORDER BY zone")).fetchall()
+    assert [tuple(r) for r in rows] == [(7, ""), (None, None)]
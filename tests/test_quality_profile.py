@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+
+from common.quality_profile import PROFILE_COLUMNS, QualityProfile, load_zones
+
+WINDOW = [(datetime(2024, 1, 1), datetime(2024, 2, 1))]
+
+
+def _chunk():
+    return pa.table({
+        "pickup": pa.array(
+            [datetime(2024, 1, 5), None, datetime(2024, 2, 3), datetime(2023, 12, 31)],
+            pa.timestamp("us"),
+        ),
+        "pu_zone": pa.array([1, 265, 266, None], pa.int16()),
+        "fare": pa.array([12.5, -3.0, None, -0.5]),
+    })
+
+
+def _profile(**kwargs):
+    return QualityProfile("pickup", WINDOW, ["fare"], ["pu_zone"], **kwargs)
+
+
+def test_counts_nulls_negatives_and_unknown_zones():
+    profile = _profile()
+    profile.update(_chunk())
+
+    stats = profile.stats
+    assert profile.rows == 4
+    assert [stats[c]["null_count"] for c in ("pickup", "pu_zone", "fare")] == [1, 1, 1]
+    assert stats["fare"]["negative_count"] == 2
+    assert (stats["fare"]["min_value"], stats["fare"]["max_value"]) == (-3.0, 12.5)
+    # 266 is past the lookup's last LocationID; the null is a null, not unknown
+    assert stats["pu_zone"]["unknown_zone_count"] == 1
+    assert stats["pickup"]["out_of_window_count"] == 2
+    # Stats only apply to the columns they were asked for
+    assert stats["pu_zone"]["negative_count"] is None
+    assert stats["fare"]["unknown_zone_count"] is None
+
+
+def test_chunks_fold_into_one_profile():
+    profile = _profile()
+    profile.update(_chunk())
+    profile.update(_chunk().to_pandas())
+
+    assert profile.rows == 8
+    assert profile.stats["fare"]["negative_count"] == 4
+    assert profile.stats["pu_zone"]["unknown_zone_count"] == 2
+    assert profile.failed_checks(not_null=["pickup"], non_negative=["fare"]) == [
+        "pickup: 2 null(s)",
+        "fare: 4 negative value(s)",
+    ]
+    assert all(set(r) == set(PROFILE_COLUMNS) for r in profile.records())
+
+
+def test_known_zones_come_from_the_lookup_or_the_caller():
+    assert load_zones().to_pylist() == list(range(1, 266))
+
+    profile = _profile(known_zones=[1, 2])
+    profile.update(_chunk())
+    assert profile.stats["pu_zone"]["unknown_zone_count"] == 2
+
+
+def test_empty_profile_fails_row_count():
+    profile = _profile(columns=["fare"])
+    profile.update(pd.DataFrame({"fare": pd.Series([], dtype="float64"), "other": []}))
+
+    assert list(profile.stats) == ["fare"]
+    assert profile.failed_checks() == ["row count is zero"]
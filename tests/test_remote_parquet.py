@@ -0,0 +1,73 @@
+import io
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from common.remote_parquet import RemoteParquet, coalesce
+
+
+def _parquet(rows=20_000, row_group_size=5_000) -> bytes:
+    rng = np.random.default_rng(0)
+    table = pa.table({
+        "PULocationID": pa.array(rng.integers(1, 266, rows), pa.int64()),
+        "fare_amount": rng.normal(15, 5, rows),
+        "note": pa.array([f"trip {i}" for i in range(rows)]),
+        "blob": pa.array([rng.bytes(64) for _ in range(rows)]),
+    })
+    buf = io.BytesIO()
+    pq.write_table(table, buf, row_group_size=row_group_size, compression="none")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def data():
+    return _parquet()
+
+
+def test_coalesce():
+    assert coalesce([(50, 60), (0, 10), (12, 20)], max_gap=5) == [(0, 20), (50, 60)]
+    assert coalesce([(0, 10), (12, 20)], max_gap=5, max_request=15) == [(0, 10), (12, 20)]
+
+
+def test_reads_only_requested_columns(http_server, data):
+    url = http_server.write("t.parquet", data)
+    # No coalescing across the unread columns between the requested chunks
+    rp = RemoteParquet(url, max_gap=0)
+    expected = pq.read_table(io.BytesIO(data), columns=["fare_amount"])
+
+    table = rp.read_row_groups([0, 2], columns=["fare_amount"])
+    assert table.column("fare_amount").to_pylist() == (
+        expected.slice(0, 5_000).column("fare_amount").to_pylist()
+        + expected.slice(10_000, 5_000).column("fare_amount").to_pylist()
+    )
+    assert rp.bytes_fetched < len(data) / 5
+    assert all(req[2].get("Range") for req in http_server.requests)
+
+
+def test_iter_batches_matches_local_read(http_server, data):
+    url = http_server.write("t.parquet", data)
+    rp = RemoteParquet(url, concurrency=4, max_gap=0)
+    batches = list(rp.iter_batches(batch_size=1_000, row_groups=[1, 3], columns=["PULocationID", "note"]))
+    assert all(b.num_rows == 1_000 for b in batches)
+
+    local = pq.ParquetFile(io.BytesIO(data))
+    expected = pa.Table.from_batches(
+        list(local.iter_batches(batch_size=1_000, row_groups=[1, 3], columns=["PULocationID", "note"]))
+    )
+    assert pa.Table.from_batches(batches).equals(expected)
+
+
+def test_server_without_range_support(http_server, data):
+    http_server.ranges = False
+    url = http_server.write("t.parquet", data)
+    rp = RemoteParquet(url)
+    assert rp.size == len(data)
+    assert rp.read_row_group(1, columns=["note"]).column("note")[0].as_py() == "trip 5000"
+
+
+def test_not_parquet(http_server):
+    url = http_server.write("t.csv", b"a,b\n1,2\n")
+    with pytest.raises(ValueError):
+        RemoteParquet(url)
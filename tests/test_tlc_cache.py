@@ -0,0 +1,86 @@
+import os
+
+import pytest
+import requests
+
+from common.tlc_cache import TLCCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TLCCache(tmp_path / "cache", max_bytes=10 * 1024**2)
+
+
+def _read(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_miss_then_revalidated_hit(http_server, cache):
+    url = http_server.write("a.parquet", b"x" * 1000)
+    with cache.get(url) as path:
+        assert _read(path) == b"x" * 1000
+
+    sent = http_server.bytes_sent
+    with cache.get(url) as path:
+        assert _read(path) == b"x" * 1000
+    # The second get is a conditional request answered with 304
+    assert http_server.bytes_sent == sent
+    assert http_server.requests[-1][2].get("If-None-Match")
+
+
+def test_changed_upstream_gets_new_entry(http_server, cache):
+    url = http_server.write("a.parquet", b"old")
+    with cache.get(url) as old_path:
+        pass
+    http_server.write("a.parquet", b"new!")
+    with cache.get(url) as new_path:
+        assert _read(new_path) == b"new!"
+    assert new_path != old_path
+
+
+def test_iter_content_tees_a_miss_into_the_cache(http_server, cache):
+    http_server.ranges = False
+    url = http_server.write("b.csv.gz", os.urandom(300_000))
+    streamed = b"".join(cache.iter_content(url, block_size=4096))
+    with cache.get(url) as path:
+        assert _read(path) == streamed
+    assert b"".join(cache.iter_content(url)) == streamed
+
+
+def test_link_to(http_server, cache, tmp_path):
+    url = http_server.write("c.parquet", b"data")
+    dest = cache.link_to(url, tmp_path / "c.parquet")
+    assert _read(dest) == b"data"
+
+
+def test_unreachable_server_uses_cached_copy(http_server, cache):
+    url = http_server.write("d.parquet", b"cached")
+    with cache.get(url):
+        pass
+    http_server.shutdown()
+    http_server.server_close()
+    cache.retries = 0
+    with cache.get(url) as path:
+        assert _read(path) == b"cached"
+
+
+def test_unreachable_server_without_copy_raises(cache):
+    cache.retries = 0
+    with pytest.raises(requests.ConnectionError):
+        with cache.get("http://127.0.0.1:9/missing.parquet"):
+            pass
+
+
+def test_evicts_least_recently_used_but_not_pinned(http_server, tmp_path):
+    cache = TLCCache(tmp_path / "small", max_bytes=2500)
+    urls = [http_server.write(f"{name}.parquet", name.encode() * 1000) for name in "abc"]
+    with cache.get(urls[0]) as pinned:
+        with cache.get(urls[1]):
+            pass
+        with cache.get(urls[2]):
+            pass
+        # a is older but pinned, so b goes
+        assert os.path.exists(pinned)
+    objects = sorted(p.name for p in (tmp_path / "small" / "objects").glob("*/*"))
+    assert objects == ["a.parquet", "c.parquet"]
@@ -0,0 +1,41 @@
+import gzip
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from common.tlc_parquet import TRIP_SCHEMA, csv_to_parquet, hive_path
+
+# Green trips: integer columns written as "1" or "1.0", some fields empty
+GREEN_CSV = """\
+VendorID,lpep_pickup_datetime,lpep_dropoff_datetime,store_and_fwd_flag,RatecodeID,PULocationID,DOLocationID,passenger_count,trip_distance,fare_amount,extra,mta_tax,tip_amount,tolls_amount,ehail_fee,improvement_surcharge,total_amount,payment_type,trip_type,congestion_surcharge
+2,2020-01-01 00:15:00,2020-01-01 00:30:00,N,1,42,74,1,2.5,11,0.5,0.5,0,0,,0.3,12.3,2,1,0
+1.0,2020-01-02 08:00:00,2020-01-02 08:10:00,,1.0,75,,2.0,1.25,-5.5,0,0.5,1.5,0,,0.3,-3.2,1.0,1.0,
+,2020-01-03 12:00:00,2020-01-03 12:45:00,Y,5,264,265,,10,40,,,,,,0.3,40.3,,2,2.75
+"""
+
+
+def test_csv_to_parquet_writes_trip_schema_under_hive_layout(tmp_path):
+    src = tmp_path / "green_tripdata_2020-01.csv.gz"
+    src.write_bytes(gzip.compress(GREEN_CSV.encode()))
+    dest = tmp_path / hive_path("green", 2020, "01")
+    dest.parent.mkdir(parents=True)
+
+    assert csv_to_parquet(src, dest, row_group_rows=2) == 3
+    assert not list(dest.parent.glob("*.tmp"))
+
+    # The file alone, without the partition columns its directories imply
+    table = pq.ParquetFile(dest).read()
+    assert table.schema == TRIP_SCHEMA
+    assert pq.ParquetFile(dest).metadata.num_row_groups == 2
+    assert table.column("VendorID").to_pylist() == [2, 1, None]
+    assert table.column("passenger_count").to_pylist() == [1, 2, None]
+    assert table.column("DOLocationID").to_pylist() == [74, None, 265]
+    assert table.column("fare_amount").to_pylist() == [11.0, -5.5, 40.0]
+    assert table.column("store_and_fwd_flag").to_pylist() == ["N", None, "Y"]
+    assert table.column("ehail_fee").null_count == 3
+    assert table.column("pickup_datetime").type == pa.timestamp("us")
+
+    dataset = ds.dataset(tmp_path / "trips", format="parquet", partitioning="hive")
+    partitions = dataset.to_table(columns=["taxi", "year", "month"]).to_pylist()
+    assert partitions == [{"taxi": "green", "year": 2020, "month": 1}] * 3